@@ -179,3 +179,41 @@ WEBPACK_LOADER = {
         'STATS_FILE': os.path.join(FRONTEND_DIR, 'webpack-stats.json'),
     }
 }
+
+
+# Cache for the results of the get_counts API. The 'django' backend uses the cache ALIAS of the CACHES setting, which
+# is shared by all workers, while the 'local' backend keeps the MAX_SIZE most recently used results in each worker.
+RESULT_CACHE = {
+    'BACKEND': 'local',
+    'MAX_SIZE': 4096,
+    'TTL': 24 * 60 * 60,
+    'ALIAS': 'default',
+}
+
+# Cache of the tokens, paragraphs and sentences of articles, used to load the context of tasks. Each worker keeps the
+# MAX_SIZE most recently used articles. Responses can be reused by browsers and proxies for CONTEXT_MAX_AGE seconds.
+CONTEXT_CACHE = {
+    'MAX_SIZE': 512,
+    'TTL': 24 * 60 * 60,
+}
+CONTEXT_MAX_AGE = 24 * 60 * 60
+
+# If the get_counts API only runs the whole language model on the paragraphs that contain quotes. The other paragraphs
+# are only tokenized and processed by the named entity recognizer.
+TWO_TIER_NLP = True
+
+# If the memory allocated while loading each resource is measured when the workers start. Tracing the allocations makes
+# loading the resources much slower.
+PROFILE_RESOURCE_MEMORY = False
+
+# Directory of the cache of the paragraphs of articles processed by the language model, which are used for training
+# and evaluation instead of processing the articles again.
+DOC_CACHE_DIR = 'data/doc_cache'
+
+# Directory of the store of the features and labels extracted from each article, which are reused as long as the
+# article, its labels and the feature extraction don't change.
+FEATURE_STORE_DIR = 'data/feature_store'
+
+# Path of the watermark of the trained models, which records the labels each model was trained on, so that
+# `train --incremental` only trains them on newly labeled articles.
+TRAINING_WATERMARK_PATH = 'data/training_watermark.json'
@@ -1,7 +1,10 @@
 from django.contrib import admin
 
-from .models import Article, UserLabel
+from .models import Article, UserLabel, SentenceConsensus, LabellingTask, TaskLease
 
 # Register your models here.
 admin.site.register(Article)
 admin.site.register(UserLabel)
+admin.site.register(SentenceConsensus)
+admin.site.register(LabellingTask)
+admin.site.register(TaskLease)
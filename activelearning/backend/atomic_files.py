@@ -0,0 +1,41 @@
+import os
+
+""" File containing the writing of files that are read by other processes at the same time. """
+
+
+def write_atomic(path, write, binary=True, prune=False):
+    """
+    Writes a file to a temporary file first, which then replaces the file, so that other processes never read a
+    partially written file.
+
+    :param path: string.
+        The path of the file. Its directory is created if it doesn't exist.
+    :param write: function
+        The function, with the opened temporary file as parameter, that writes the content of the file.
+    :param binary: boolean.
+        Whether the file is written in binary mode.
+    :param prune: boolean.
+        Whether the other files of the directory are removed once the file is written, for directories that only hold
+        the current version of some content. The temporary files of other processes are kept.
+    :raises OSError: if the file can't be written.
+    """
+    directory, filename = os.path.split(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb' if binary else 'w') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if prune:
+        for other in os.listdir(directory):
+            if other != filename and not other.endswith('.tmp'):
+                # Another process may have removed it first.
+                try:
+                    os.remove(os.path.join(directory, other))
+                except FileNotFoundError:
+                    pass
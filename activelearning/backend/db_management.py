@@ -1,13 +1,21 @@
+from datetime import timedelta
+from functools import reduce
+import operator
 import random
 import logging
 
 import numpy as np
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
 
 from backend.frontend_parsing.postgre_to_frontend import form_paragraph_json, form_sentence_json
-from backend.helpers import quote_end_sentence, label_consensus, aggregate_label
-from backend.models import Article, UserLabel
-from backend.xml_parsing.xml_to_postgre import process_article, extract_sentence_spans
+from backend.helpers import load_consensus, load_sentence_tallies, store_sentences_consensus, \
+    refresh_labelling_tasks
+from backend.doc_cache import LazySentenceDocs, cached_parsed_article, serialize_docs, store_serialized_docs
+from backend.models import Article, UserLabel, LabellingTask, TaskLease
+from backend.xml_parsing.xml_to_postgre import ParsedArticle, parse_paragraphs
 
 """ File containing all methods used for database management """
 
@@ -25,8 +33,14 @@ COUNT_THRESHOLD = 4
 """ The minimum consensus required for a sentence to be considered labelled. """
 CONSENSUS_THRESHOLD = 0.75
 
-""" The minimum confidence required for an a full paragraph to be labeled at once. """
-CONFIDENCE_THRESHOLD = 0.8
+""" The newspapers in which the articles were published. """
+SOURCES = ['Heidi.News', 'Parisien', 'Republique']
+
+""" The number of seconds during which a task given to a user isn't given to other users. """
+TASK_LEASE_DURATION = 5 * 60
+
+""" The number of tasks sent to users in advance, after the task they need to label. """
+PREFETCH_TASKS = 3
 
 
 def add_user_label_to_db(user_id, article_id, sentence_index, labels, author_index, admin):
@@ -53,46 +67,86 @@ def add_user_label_to_db(user_id, article_id, sentence_index, labels, author_ind
     :return: UserLabel.
         The UserLabel created
     """
-    # Get the article to which these labels belong
-    try:
-        article = Article.objects.get(id=article_id)
-    except ObjectDoesNotExist:
+    userlabels = add_user_labels_to_db(
+        user_id, article_id, [{'index': sentence_index, 'labels': labels, 'authors': author_index}], admin)
+    if userlabels is None:
         return None
+    return userlabels[0]
 
-    labeled = article.labeled['labeled']
 
-    if labels != []:
-        # User knew how to annotate: recompute consensus to see if sentence is fully labeled.
-        if admin:
-            labeled[sentence_index] = 1
-        else:
-            other_userlabels = UserLabel.objects.filter(article=article, sentence_index=sentence_index)
-            # Only keep valid user labels
-            other_userlabels = other_userlabels.exclude(labels__labels=[])
-            other_labels = [userlabel.labels['labels'] for userlabel in other_userlabels]
-            other_authors = [userlabel.author_index['author_index'] for userlabel in other_userlabels]
-
-            all_labels = other_labels + [labels]
-            all_authors = other_authors + [author_index]
-
-            _, _, consensus = label_consensus(all_labels, all_authors)
-            labeled[sentence_index] = int(consensus >= CONSENSUS_THRESHOLD and len(all_labels) >= COUNT_THRESHOLD)
-
-        fully_labeled = int(sum(labeled) == len(labeled))
-        article.labeled = {
-                'labeled': labeled,
-                'fully_labeled': fully_labeled,
-        }
-        article.save()
-
-    return UserLabel.objects.create(
-            article=article,
-            session_id=user_id,
-            labels={'labels': labels},
-            sentence_index=sentence_index,
-            author_index={'author_index': author_index},
-            admin_label=admin,
-    )
+def add_user_labels_to_db(user_id, article_id, sentence_labels, admin):
+    """
+    Adds the user labels of several sentences of an article to the database at once, as add_user_label_to_db does for
+    a single sentence. The article is locked until all labels are added, so that concurrent submissions for the same
+    article can't overwrite each other's labeled values. The number of queries doesn't depend on the number of
+    sentences.
+
+    :param user_id: int.
+        The users session id
+    :param article_id: int.
+        The key of the article that was annotated
+    :param sentence_labels: list(dict).
+        The labels of each sentence, as returned by clean_user_labels, with keys 'index' (the index of the sentence),
+        'labels' (the labels the user created for the sentence) and 'authors' (the indices of the tokens that are
+        authors for this sentence).
+    :param admin: bool.
+        If the user is an admin.
+    :return: list(UserLabel).
+        The UserLabels created, or None if the article doesn't exist.
+    """
+    with transaction.atomic():
+        # Get the article to which these labels belong
+        try:
+            # The encoded in_quotes are only loaded if the labelling tasks of the article need to be refreshed.
+            article = Article.objects.select_for_update().defer(*Article.PAYLOAD_FIELDS).get(id=article_id)
+        except ObjectDoesNotExist:
+            return None
+
+        # User knew how to annotate: recompute consensus to see if sentences are fully labeled.
+        labelled_sentences = {sentence['index'] for sentence in sentence_labels if sentence['labels'] != []}
+        if len(labelled_sentences) > 0:
+            # The tallies of the valid user labels of the sentences, to which the new labels are added
+            sentence_tallies = load_sentence_tallies(article, labelled_sentences)
+
+            labeled = article.labeled['labeled']
+            for sentence in sentence_labels:
+                if sentence['labels'] == []:
+                    continue
+                tally, has_admin = sentence_tallies[sentence['index']]
+                tally.add(sentence['labels'], sentence['authors'])
+                sentence_tallies[sentence['index']] = (tally, has_admin or admin)
+                if admin:
+                    labeled[sentence['index']] = 1
+                else:
+                    _, _, consensus = tally.consensus()
+                    labeled[sentence['index']] = int(consensus >= CONSENSUS_THRESHOLD and
+                                                     tally.count >= COUNT_THRESHOLD)
+
+            fully_labeled = int(sum(labeled) == len(labeled))
+            article.labeled = {
+                    'labeled': labeled,
+                    'fully_labeled': fully_labeled,
+            }
+            article.save(update_fields=['labeled'])
+            store_sentences_consensus(article, sentence_tallies)
+            refresh_labelling_tasks(article, labelled_sentences)
+
+        # The tasks of the sentences can be given to other users again.
+        TaskLease.objects.filter(
+            article=article, session_id=user_id, sentence_index__in=[sentence['index'] for sentence in sentence_labels]
+        ).delete()
+
+        return UserLabel.objects.bulk_create([
+            UserLabel(
+                article=article,
+                session_id=user_id,
+                labels={'labels': sentence['labels']},
+                sentence_index=sentence['index'],
+                author_index={'author_index': sentence['authors']},
+                admin_label=admin,
+            )
+            for sentence in sentence_labels
+        ])
 
 
 def add_article_to_db(path, nlp, source, admin_article=False):
@@ -116,25 +170,24 @@ def add_article_to_db(path, nlp, source, admin_article=False):
 
     article_text = article_text.replace('&', '&amp;')
     # Process the file
-    data = process_article(article_text, nlp)
-    labeled = len(data['s']) * [0]
-    confidence = len(data['s']) * [0]
-    predictions = len(data['s']) * [0]
-    return Article.objects.create(
-        name=data['name'],
+    paragraph_docs = parse_paragraphs(article_text, nlp)
+    # The paragraphs are serialized for the cache before ParsedArticle corrects their named entities.
+    serialized_docs = serialize_docs(paragraph_docs)
+    parsed = ParsedArticle(article_text, nlp, paragraph_docs=paragraph_docs)
+    labeled = len(parsed.sentences) * [0]
+    confidence = len(parsed.sentences) * [0]
+    predictions = len(parsed.sentences) * [0]
+    article = Article.objects.create(
+        name=parsed.name,
         text=article_text,
         people={
-            'people': list(data['people']),
-            'mentions': data['mentions'],
+            'people': list(parsed.people),
+            'mentions': parsed.mentions,
         },
-        tokens={'tokens': data['tokens']},
-        paragraphs={'paragraphs': data['p']},
-        sentences={'sentences': data['s']},
         labeled={
             'labeled': labeled,
             'fully_labeled': 0,
         },
-        in_quotes={'in_quotes': data['in_quotes']},
         confidence={
             'confidence': confidence,
             'predictions': predictions,
@@ -142,88 +195,143 @@ def add_article_to_db(path, nlp, source, admin_article=False):
         },
         admin_article=admin_article,
         source=source,
+        **Article.encode_arrays(parsed.tokens, parsed.paragraphs, parsed.sentences, parsed.in_quotes),
     )
+    store_serialized_docs(article.id, article_text, serialized_docs, nlp)
+    refresh_labelling_tasks(article)
+    return article
 
 
-def load_hardest_articles(n=None):
+def request_labelling_task(session_id):
     """
-    Loads the hardest articles to classify in the database, in terms of the confidence in the
-    answers.
-
-    :param n: int.
-        If None, all articles are returned.
-        Otherwise, limited to n articles.
-    :return: list(Article).
-        The n hardest articles to classify.
+    Finds a sentence or paragraph that needs to be labelled, and that doesn't already have a label with the given
+    session_id, as in request_labelling_tasks.
+
+    :param session_id: int.
+        The user's session id
+    :return: dict.
+        A dict containing article_id, paragraph_id, sentence_id, data and task keys
     """
-    unlabeled_articles = Article.objects.filter(labeled__fully_labeled=0)
-    # Randomly select an article source, load all of its unlabeled articles
-    r = random.random()
-    if r < 1/3:
-        filtered_by_source = unlabeled_articles.filter(source='Heidi.News')
-    elif r > 2/3:
-        filtered_by_source = unlabeled_articles.filter(source='Parisien')
-    else:
-        filtered_by_source = unlabeled_articles.filter(source='Republique')
-    # If it has at least one unlabeled article, return those. Otherwise return from all sources.
-    if len(filtered_by_source) > 0:
-        unlabeled_articles = filtered_by_source
-    if n is None:
-        return unlabeled_articles.order_by('confidence__min_confidence', 'id')
-    else:
-        return unlabeled_articles.order_by('confidence__min_confidence', 'id')[:n]
+    tasks = request_labelling_tasks(session_id, 1)
+    if len(tasks) == 0:
+        return None
+    return tasks[0]
 
 
-def request_labelling_task(session_id):
+def request_labelling_tasks(session_id, n_tasks):
     """
-    Finds a sentence or paragraph that needs to be labelled, and that doesn't already have a label with the given
-    session_id. If the list of sentence_indices is empty, then the whole paragraph needs to be labelled. Otherwise,
-    the sentence(s) need to be labelled.
+    Finds the next sentences or paragraphs that need to be labelled by a user, that don't already have a label with
+    the given session_id, and that aren't leased by other users. The tasks are taken from the queue of labelling tasks,
+    in the articles with the lowest confidence of a randomly selected source, or of all sources if there aren't enough
+    tasks left for the user in this source.
+
+    The tasks are leased to the user for TASK_LEASE_DURATION seconds, replacing the previous leases of the user, so that
+    they aren't given to other users in the meantime.
 
     :param session_id: int.
         The user's session id
+    :param n_tasks: int.
+        The maximum number of tasks.
+    :return: list(dict).
+        For each task, a dict containing article_id, paragraph_id, sentence_id, data and task keys
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # After this, all leases are held by other users.
+        TaskLease.objects.filter(Q(expires_at__lte=now) | Q(session_id=session_id)).delete()
+
+        # Tasks whose first sentence was already labelled by the user, or with a leased sentence, are skipped.
+        session_labels = UserLabel.objects.filter(
+            session_id=session_id, article=OuterRef('article'), sentence_index=OuterRef('first_sentence'))
+        leases = TaskLease.objects.filter(article=OuterRef('article'), sentence_index__gte=OuterRef('first_sentence'),
+                                          sentence_index__lte=OuterRef('last_sentence'))
+        tasks = LabellingTask.objects.annotate(annotated=Exists(session_labels), leased=Exists(leases))
+        tasks = tasks.filter(annotated=False, leased=False)
+        tasks = tasks.select_related('article').defer(*[f'article__{field}' for field in Article.PAYLOAD_FIELDS])
+        # Tasks that are being leased by other users are skipped instead of waiting for them.
+        tasks = tasks.order_by('priority', 'article_id', 'first_sentence', 'task_type')
+        tasks = tasks.select_for_update(skip_locked=True, of=('self',))
+
+        # A paragraph task and the sentence tasks of its sentences are never given together.
+        leased_sentences = set()
+        selected = []
+        for candidates in [tasks.filter(source=random.choice(SOURCES)), tasks]:
+            for task in non_overlapping_tasks(candidates, leased_sentences, n_tasks - len(selected)):
+                leased_sentences.update(task_sentences(task))
+                selected.append(task)
+
+        TaskLease.objects.bulk_create([
+            TaskLease(
+                article_id=article_id,
+                sentence_index=sentence_index,
+                session_id=session_id,
+                expires_at=now + timedelta(seconds=TASK_LEASE_DURATION),
+            )
+            for article_id, sentence_index in leased_sentences
+        ], ignore_conflicts=True)
+
+        # Leases taken by other users in the meantime were ignored, so only the tasks whose sentences are all leased to
+        # the user are given, and the other leases are released.
+        held = set(TaskLease.objects.filter(session_id=session_id).values_list('article_id', 'sentence_index'))
+        leased_tasks = [task for task in selected if held.issuperset(task_sentences(task))]
+        released = held - {sentence for task in leased_tasks for sentence in task_sentences(task)}
+        if released:
+            released_leases = reduce(operator.or_, [Q(article_id=article_id, sentence_index=sentence_index)
+                                                    for article_id, sentence_index in released])
+            TaskLease.objects.filter(released_leases, session_id=session_id).delete()
+
+    return [form_task_json(task) for task in leased_tasks]
+
+
+def task_sentences(task):
+    """
+    :param task: models.LabellingTask.
+        The labelling task.
+    :return: list((int, int)).
+        The article id and index of each sentence of the task.
+    """
+    return [(task.article_id, index) for index in range(task.first_sentence, task.last_sentence + 1)]
+
+
+def non_overlapping_tasks(tasks, leased_sentences, n_tasks, batch_size=50):
+    """
+    Reads tasks in order until enough of them don't contain sentences that are leased or in previous tasks. The tasks
+    are read through a single cursor, so that only the rows that are read are locked.
+
+    :param tasks: QuerySet(models.LabellingTask).
+        The candidate tasks, in the order in which they are given.
+    :param leased_sentences: set((int, int)).
+        The article id and index of the sentences already leased to the user.
+    :param n_tasks: int.
+        The maximum number of tasks.
+    :param batch_size: int.
+        The number of candidate tasks fetched from the cursor at once.
+    :return: list(models.LabellingTask).
+        The tasks, which don't overlap each other or the leased sentences.
+    """
+    sentences = set(leased_sentences)
+    selected = []
+    if n_tasks <= 0:
+        return selected
+    for task in tasks.iterator(chunk_size=max(batch_size, n_tasks)):
+        if sentences.isdisjoint(task_sentences(task)):
+            sentences.update(task_sentences(task))
+            selected.append(task)
+            if len(selected) == n_tasks:
+                break
+    return selected
+
+
+def form_task_json(task):
+    """
+    :param task: models.LabellingTask.
+        The labelling task, with its article.
     :return: dict.
         A dict containing article_id, paragraph_id, sentence_id, data and task keys
     """
-    session_labels = UserLabel.objects.filter(session_id=session_id)
-    articles = load_hardest_articles(ARTICLE_LOADS)
-    for article in articles:
-        annotated_sentences = [user_label.sentence_index for user_label in session_labels.filter(article=article)]
-        labeled = article.labeled['labeled']
-        confidences = article.confidence['confidence']
-        sentence_ends = article.sentences['sentences']
-        prev_par_end = -1
-        # p is the index of the last sentence in paragraph i
-        for (i, p) in enumerate(article.paragraphs['paragraphs']):
-            # Lowest confidence in the whole paragraph
-            min_conf = min([conf for conf in confidences[prev_par_end + 1:p + 1]])
-            par_predictions = article.confidence['predictions'][prev_par_end + 1:p + 1]
-            # For high enough confidences, annotate the whole paragraph
-            if min_conf >= CONFIDENCE_THRESHOLD \
-                    and max(par_predictions) == 0 \
-                    and labeled[prev_par_end + 1] == 0 \
-                    and (prev_par_end + 1) not in annotated_sentences\
-                    and p - prev_par_end > 2:
-                return form_paragraph_json(article, i)
-
-            # For all sentences in the paragraph, check if they can be annotated by the user
-            for j in range(prev_par_end + 1, p + 1):
-                if not article.labeled['labeled'][j] == 1 and j not in annotated_sentences:
-                    # List of sentence indices to label
-                    labelling_task = [j]
-                    # Checks that the sentence's last token is inside quotes, in which case the next sentence would
-                    # also need to be returned
-                    sent_end = sentence_ends[j]
-                    if article.in_quotes['in_quotes'][sent_end] == 1:
-                        last_sent = quote_end_sentence(sentence_ends, article.in_quotes['in_quotes'], sent_end)
-                        labelling_task = list(range(labelling_task[0], min(last_sent + 1, len(sentence_ends))))
-
-                    print()
-                    print('confidences', confidences[j])
-                    print('predictions', article.confidence['predictions'][j])
-                    return form_sentence_json(article, labelling_task)
-            prev_par_end = p
-    return None
+    if task.task_type == LabellingTask.PARAGRAPH:
+        return form_paragraph_json(task.article, task.paragraph_index)
+    return form_sentence_json(task.article, list(range(task.first_sentence, task.last_sentence + 1)))
 
 
 def load_sentence_labels(nlp):
@@ -242,7 +350,8 @@ def load_sentence_labels(nlp):
         * the list of all testing labels
         * the list of in_quote values for each test sentence
     """
-    articles = Article.objects.filter(labeled__fully_labeled=1)
+    articles = list(Article.objects.filter(labeled__fully_labeled=1))
+    consensus = load_consensus(articles)
     train_sentences = []
     train_labels = []
     train_in_quotes = []
@@ -256,17 +365,18 @@ def load_sentence_labels(nlp):
             article.labeled['test_set'] = int(np.random.random() > 0.9)
             article.save()
         # The spaCy.Doc object for each sentence in the article.
-        article_sentence_docs = extract_sentence_spans(article.text, nlp)
+        article_sentence_docs = cached_parsed_article(article, nlp).sentence_docs
         # The in_quotes list for each sentence in the article
         article_in_quotes = []
         # The label for each sentence in the article
         article_labels = []
-        for sentence_index, end in enumerate(article.sentences['sentences']):
+        token_in_quotes = article.in_quotes_array().tolist()
+        for sentence_index, end in enumerate(article.sentences_array().tolist()):
             # Extract the in_quote list for the sentence
-            in_quotes = article.in_quotes['in_quotes'][start:end + 1]
+            in_quotes = token_in_quotes[start:end + 1]
             article_in_quotes.append(in_quotes)
-            # Compute consensus labels
-            sentence_labels, sentence_authors, _ = aggregate_label(article, sentence_index)
+            # Consensus labels
+            sentence_labels, sentence_authors, _ = consensus[article.id][sentence_index]
             article_labels.append(int(sum(sentence_labels) > 0))
             start = end + 1
 
@@ -283,10 +393,14 @@ def load_sentence_labels(nlp):
     return train_sentences, train_labels, train_in_quotes, test_sentences, test_labels, test_in_quotes
 
 
-def load_labeled_articles(nlp):
+def load_labeled_articles(nlp, lazy=False):
     """
     Finds all fully labeled articles, and assigns unassigned articles to the test or training set.
 
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text.
+    :param lazy: boolean.
+        If True, the sentences of each article are only parsed the first time they are needed.
     :return: list(models.Article), list(list(spaCy.Doc)), list(models.Article), list(list(spaCy.Doc))
         * the list of all training articles
         * the list of docs for each sentence for each training article
@@ -304,7 +418,10 @@ def load_labeled_articles(nlp):
             article.labeled['test_set'] = int(np.random.random() > 0.9)
             article.save()
         # The spaCy.Doc object for each sentence in the article.
-        article_sentence_docs = extract_sentence_spans(article.text, nlp)
+        if lazy:
+            article_sentence_docs = LazySentenceDocs(article, nlp)
+        else:
+            article_sentence_docs = cached_parsed_article(article, nlp).sentence_docs
         if article.labeled['test_set'] == 0:
             train_articles.append(article)
             train_sentences.append(article_sentence_docs)
@@ -315,40 +432,47 @@ def load_labeled_articles(nlp):
     return train_articles, train_sentences, test_articles, test_sentences
 
 
-def load_unlabeled_sentences(nlp):
+def load_unlabeled_sentences(nlp, article_filter=None):
     """
     Finds all articles that aren't fully labeled, and extracts all sentences from each.
 
     :param nlp: spaCy.Language
         The language model used to tokenize the text.
+    :param article_filter: function
+        If defined, only the articles for which it returns True are loaded.
     :return: list(backend.models.Article), list(list(spaCy.Doc)), list(list(int))
         * the list of all articles that aren't fully labeled.
         * the list of the list of docs for each sentence in each article.
         * the list of in_quotes values for each sentence in each article.
     """
     articles = list(Article.objects.filter(labeled__fully_labeled=0))
+    if article_filter is not None:
+        articles = [article for article in articles if article_filter(article)]
     sentences = []
     in_quotes = []
     for article in articles:
         start = 0
-        article_sentence_docs = extract_sentence_spans(article.text, nlp)
+        article_sentence_docs = cached_parsed_article(article, nlp).sentence_docs
         article_in_quotes = []
         sentences.append(article_sentence_docs)
-        for sentence_index, end in enumerate(article.sentences['sentences']):
+        token_in_quotes = article.in_quotes_array().tolist()
+        for sentence_index, end in enumerate(article.sentences_array().tolist()):
             # Extract in_quotes values
-            article_in_quotes.append(article.in_quotes['in_quotes'][start:end + 1])
+            article_in_quotes.append(token_in_quotes[start:end + 1])
             start = end + 1
         in_quotes.append(article_in_quotes)
 
     return articles, sentences, in_quotes
 
 
-def load_quote_authors(nlp):
+def load_quote_authors(nlp, lazy=False):
     """
     Finds all sentences containing quotes, and the author of each quote.
 
     :param nlp: spaCy.Language
         The language model used to tokenize the text.
+    :param lazy: boolean.
+        If True, the sentences of each article are only parsed the first time they are needed.
     :return: list(dict), list(dict)
         Lists of dicts containing training and test quotes, respectively. Keys:
             * 'article': models.Article, the article containing the quote
@@ -356,7 +480,8 @@ def load_quote_authors(nlp):
             * 'quotes': list(int), the indices of sentences that contain quotes in the article.
             * 'author': list(list(int)), the indices of the tokens of the author of the quote.
     """
-    articles = Article.objects.filter(labeled__fully_labeled=1)
+    articles = list(Article.objects.filter(labeled__fully_labeled=1))
+    consensus = load_consensus(articles)
     # list of training articles
     train_articles = []
     # list of test quotes
@@ -367,12 +492,15 @@ def load_quote_authors(nlp):
             article.labeled['test_set'] = int(np.random.random() > 0.9)
             article.save()
         # The spaCy.Doc object for each sentence in the article.
-        article_sentence_docs = extract_sentence_spans(article.text, nlp)
+        if lazy:
+            article_sentence_docs = LazySentenceDocs(article, nlp)
+        else:
+            article_sentence_docs = cached_parsed_article(article, nlp).sentence_docs
         quotes = []
         authors = []
-        for sentence_index, end in enumerate(article.sentences['sentences']):
-            # Compute consensus labels
-            sentence_labels, sentence_authors, _ = aggregate_label(article, sentence_index)
+        for sentence_index in range(len(article.sentences_array())):
+            # Consensus labels
+            sentence_labels, sentence_authors, _ = consensus[article.id][sentence_index]
             # Check if the sentence contains reported speech. If it does, add to the training or test set.
             if int(sum(sentence_labels) > 0):
                 quotes.append(sentence_index)
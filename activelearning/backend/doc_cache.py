@@ -0,0 +1,237 @@
+from collections.abc import Sequence
+import hashlib
+import logging
+import os
+import re
+
+from django.conf import settings
+from spacy.tokens import Doc
+import srsly
+
+from backend.atomic_files import write_atomic
+from backend.xml_parsing.xml_to_postgre import ParsedArticle, parse_paragraphs
+
+""" File containing the on-disk cache of the paragraphs of articles processed by the language model. """
+
+logger = logging.getLogger(__name__)
+
+
+""" The default directory of the cache, which can be overridden with DOC_CACHE_DIR in the settings. """
+path_doc_cache = 'data/doc_cache'
+
+
+""" The version of the format of cached files. Files with another version are ignored. """
+CACHE_VERSION = 1
+
+
+def cache_directory():
+    """
+    :return: string.
+        The directory of the cache described by the DOC_CACHE_DIR setting.
+    """
+    return getattr(settings, 'DOC_CACHE_DIR', path_doc_cache)
+
+
+def model_version(nlp):
+    """
+    Identifies a language model, so that docs processed by another model or another pipeline are never reused.
+
+    :param nlp: spaCy.Language
+        The language model.
+    :return: string.
+        The name and version of the model, followed by the names of the components of its pipeline.
+    """
+    meta = nlp.meta
+    version = '-'.join([f'{meta.get("lang", "")}_{meta.get("name", "")}', meta.get('version', '')] + nlp.pipe_names)
+    return re.sub(r'[^\w.-]', '_', version)
+
+
+def text_hash(article_text):
+    """
+    :param article_text: string.
+        The article in XML format stored as a string.
+    :return: string.
+        The hash of the text of the article.
+    """
+    return hashlib.sha1(article_text.encode('utf-8')).hexdigest()
+
+
+def cache_path(article_id, article_text, nlp, directory=None):
+    """
+    :param article_id: int.
+        The key of the article.
+    :param article_text: string.
+        The article in XML format stored as a string.
+    :param nlp: spaCy.Language
+        The language model used to process the article.
+    :param directory: string.
+        The directory of the cache. If None, the directory of the settings is used.
+    :return: string.
+        The file containing the cached paragraphs of the article, keyed by its id, the hash of its text and the model.
+        Each article has its own directory, so that the files cached for its previous texts are found without listing
+        the whole cache.
+    """
+    if directory is None:
+        directory = cache_directory()
+    return os.path.join(directory, model_version(nlp), str(article_id), f'{text_hash(article_text)}.msg')
+
+
+def serialize_docs(docs):
+    """
+    Serializes docs, together with the strings they use. spaCy 2.1 doesn't save the strings of a doc with it, and
+    they would be missing from the vocabulary of a newly loaded model.
+
+    :param docs: list(spaCy.Doc).
+        The docs to serialize.
+    :return: bytes.
+        The serialized docs.
+    """
+    strings = set()
+    for doc in docs:
+        for token in doc:
+            strings.update((token.text, token.lemma_, token.tag_, token.dep_, token.ent_type_))
+    return srsly.msgpack_dumps({
+        'version': CACHE_VERSION,
+        'strings': sorted(strings),
+        'docs': [doc.to_bytes() for doc in docs],
+    })
+
+
+def deserialize_docs(data, vocab):
+    """
+    :param data: bytes.
+        Docs serialized by serialize_docs.
+    :param vocab: spaCy.Vocab
+        The vocabulary of the language model that processed the docs.
+    :return: list(spaCy.Doc).
+        The docs, or None if they were serialized in another version of the format.
+    """
+    msg = srsly.msgpack_loads(data)
+    if msg.get('version') != CACHE_VERSION:
+        return None
+    for string in msg['strings']:
+        vocab.strings.add(string)
+    return [Doc(vocab).from_bytes(doc_bytes) for doc_bytes in msg['docs']]
+
+
+def store_paragraph_docs(article_id, article_text, paragraph_docs, nlp, directory=None):
+    """
+    Saves the processed paragraphs of an article in the cache.
+
+    :param article_id: int.
+        The key of the article.
+    :param article_text: string.
+        The article in XML format stored as a string.
+    :param paragraph_docs: list(spaCy.Doc).
+        The paragraphs of the article processed by the language model, before any change is made to them.
+    :param nlp: spaCy.Language
+        The language model used to process the article.
+    :param directory: string.
+        The directory of the cache. If None, the directory of the settings is used.
+    """
+    store_serialized_docs(article_id, article_text, serialize_docs(paragraph_docs), nlp, directory)
+
+
+def store_serialized_docs(article_id, article_text, data, nlp, directory=None):
+    """
+    Saves the serialized paragraphs of an article in the cache, and removes the paragraphs cached for previous texts
+    of the article. Failing to write the cache only means that the article will be processed again.
+
+    :param article_id: int.
+        The key of the article.
+    :param article_text: string.
+        The article in XML format stored as a string.
+    :param data: bytes.
+        The paragraphs of the article, serialized by serialize_docs.
+    :param nlp: spaCy.Language
+        The language model used to process the article.
+    :param directory: string.
+        The directory of the cache. If None, the directory of the settings is used.
+    """
+    path = cache_path(article_id, article_text, nlp, directory)
+    try:
+        write_atomic(path, lambda f: f.write(data), prune=True)
+    except OSError:
+        logger.warning(f'Could not cache the parsed paragraphs of article {article_id} in {path}', exc_info=True)
+
+
+def load_paragraph_docs(article_id, article_text, nlp, directory=None):
+    """
+    :param article_id: int.
+        The key of the article.
+    :param article_text: string.
+        The article in XML format stored as a string.
+    :param nlp: spaCy.Language
+        The language model used to process the article.
+    :param directory: string.
+        The directory of the cache. If None, the directory of the settings is used.
+    :return: list(spaCy.Doc).
+        The cached paragraphs of the article, or None if they aren't cached for this text and this model.
+    """
+    path = cache_path(article_id, article_text, nlp, directory)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return deserialize_docs(f.read(), nlp.vocab)
+    except Exception:
+        logger.warning(f'Could not load the cached paragraphs of article {article_id} from {path}', exc_info=True)
+        return None
+
+
+def cached_parsed_article(article, nlp, directory=None):
+    """
+    Parses an article from its cached paragraphs. Only if they aren't cached are the paragraphs processed by the
+    language model, and then added to the cache.
+
+    :param article: models.Article.
+        The article to parse.
+    :param nlp: spaCy.Language
+        The language model used to process the article.
+    :param directory: string.
+        The directory of the cache. If None, the directory of the settings is used.
+    :return: ParsedArticle.
+        The parsed article.
+    """
+    paragraph_docs = load_paragraph_docs(article.id, article.text, nlp, directory)
+    if paragraph_docs is None:
+        paragraph_docs = parse_paragraphs(article.text, nlp)
+        store_paragraph_docs(article.id, article.text, paragraph_docs, nlp, directory)
+    return ParsedArticle(article.text, nlp, paragraph_docs=paragraph_docs)
+
+
+class LazySentenceDocs(Sequence):
+    """
+    The spaCy.Doc for each sentence of an article, which are only parsed, from the cache if possible, the first time
+    they are needed. Used when the features of articles may already be stored, and the docs not needed at all.
+    """
+
+    def __init__(self, article, nlp, directory=None):
+        """
+        :param article: models.Article.
+            The article whose sentences are parsed.
+        :param nlp: spaCy.Language
+            The language model used to process the article.
+        :param directory: string.
+            The directory of the cache. If None, the directory of the settings is used.
+        """
+        self.article = article
+        self.nlp = nlp
+        self.directory = directory
+        self._docs = None
+
+    @property
+    def docs(self):
+        """
+        :return: list(spaCy.Doc).
+            The doc of each sentence of the article, parsed the first time they are needed.
+        """
+        if self._docs is None:
+            self._docs = cached_parsed_article(self.article, self.nlp, self.directory).sentence_docs
+        return self._docs
+
+    def __getitem__(self, index):
+        return self.docs[index]
+
+    def __len__(self):
+        return len(self.docs)
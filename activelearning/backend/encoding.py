@@ -0,0 +1,110 @@
+import numpy as np
+
+""" File containing the compact binary encodings of the arrays stored for each article. """
+
+
+""" The type of the integers in encoded arrays and buffers (little-endian 32 bits). """
+INT_TYPE = np.dtype('<i4')
+
+
+""" The type of the floats in encoded arrays (little-endian 32 bits). """
+FLOAT_TYPE = np.dtype('<f4')
+
+
+def encode_ints(values):
+    """
+    :param values: list(int).
+        The integers to encode.
+    :return: bytes.
+        The integers, as 32-bit integers.
+    """
+    return np.asarray(values, dtype=INT_TYPE).tobytes()
+
+
+def decode_ints(buffer):
+    """
+    :param buffer: bytes.
+        Integers encoded by encode_ints.
+    :return: np.array.
+        The integers, which are a read-only view of the buffer.
+    """
+    return np.frombuffer(buffer, dtype=INT_TYPE)
+
+
+def encode_floats(values):
+    """
+    :param values: list(float).
+        The floats to encode.
+    :return: bytes.
+        The floats, as 32-bit floats.
+    """
+    return np.asarray(values, dtype=FLOAT_TYPE).tobytes()
+
+
+def decode_floats(buffer):
+    """
+    :param buffer: bytes.
+        Floats encoded by encode_floats.
+    :return: np.array.
+        The floats, which are a read-only view of the buffer.
+    """
+    return np.frombuffer(buffer, dtype=FLOAT_TYPE)
+
+
+def encode_bits(values):
+    """
+    :param values: list(int).
+        Values in {0, 1} to encode.
+    :return: bytes.
+        The number of values, followed by the values packed 8 per byte.
+    """
+    return encode_ints([len(values)]) + np.packbits(np.asarray(values, dtype=np.uint8)).tobytes()
+
+
+def decode_bits(buffer):
+    """
+    :param buffer: bytes.
+        Values encoded by encode_bits.
+    :return: np.array.
+        The values in {0, 1}.
+    """
+    length = int(decode_ints(buffer[:INT_TYPE.itemsize])[0])
+    bits = np.frombuffer(buffer, dtype=np.uint8, offset=INT_TYPE.itemsize)
+    return np.unpackbits(bits)[:length]
+
+
+def encode_tokens(tokens):
+    """
+    :param tokens: list(string).
+        The tokens to encode.
+    :return: bytes.
+        The number of tokens, followed by the length in bytes of each token, followed by all tokens encoded in UTF-8.
+    """
+    encoded = [token.encode('utf-8') for token in tokens]
+    return encode_ints([len(encoded)]) + encode_ints([len(token) for token in encoded]) + b''.join(encoded)
+
+
+def decode_tokens(buffer, start=0, end=None):
+    """
+    Decodes some of the tokens in a buffer. Only the requested tokens are decoded, directly from the buffer, which
+    isn't copied.
+
+    :param buffer: bytes.
+        Tokens encoded by encode_tokens, or a memoryview of them.
+    :param start: int.
+        The index of the first token to decode.
+    :param end: int.
+        The index after the last token to decode. If None, all tokens until the last one are decoded.
+    :return: list(string).
+        The tokens, as in tokens[start:end].
+    """
+    buffer = memoryview(buffer)
+    n_tokens = int(np.frombuffer(buffer, dtype=INT_TYPE, count=1)[0])
+    lengths = np.frombuffer(buffer, dtype=INT_TYPE, count=n_tokens, offset=INT_TYPE.itemsize)
+    start, end, _ = slice(start, end).indices(n_tokens)
+    if start >= end:
+        return []
+    # The tokens follow the lengths, and the first decoded token follows all previous tokens.
+    first_offset = INT_TYPE.itemsize * (n_tokens + 1) + int(lengths[:start].sum())
+    offsets = (first_offset + np.concatenate([[0], np.cumsum(lengths[start:end])])).tolist()
+    return [str(buffer[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(end - start)]
@@ -1,14 +1,12 @@
-import csv
-
-import numpy as np
 from sklearn.preprocessing import PolynomialFeatures
 
-from backend.ml.author_prediction_feature_extraction import attribution_features_baseline_no_db
+from backend import resources
+from backend.ml.author_prediction_feature_extraction import attribution_feature_matrix
 from backend.ml.baseline import predict_sentence, attribute_quote_lazy
+from backend.ml.feature_expansion import expand_features
 from backend.ml.helpers import load_model, author_full_name_no_db, find_true_author_index
 from backend.ml.quote_detection import predict_quotes
-from backend.xml_parsing.xml_to_postgre import process_article, extract_sentence_spans
-from backend.xml_parsing.helpers import load_nlp
+from backend.xml_parsing.xml_to_postgre import ParsedArticle, parse_articles, PARAGRAPH_BATCH_SIZE
 
 """
 Pipeline the names of people cited from an article
@@ -31,7 +29,17 @@ path_author_attribution_weights = "backend/ml/author_prediction_weights.joblib"
 author_prediction_poly_degree = 5
 
 
-def extract_people_quoted(article_text, nlp, cue_verbs, lazy_baseline=True):
+resources.register('quote_detection_model', lambda: load_model(path_quote_detection_weights),
+                   path=path_quote_detection_weights)
+resources.register('author_prediction_model', lambda: load_model(path_author_attribution_weights),
+                   path=path_author_attribution_weights)
+resources.register('quote_detection_poly',
+                   lambda: PolynomialFeatures(quote_detection_poly_degree, interaction_only=True, include_bias=True))
+resources.register('author_prediction_poly',
+                   lambda: PolynomialFeatures(author_prediction_poly_degree, interaction_only=True, include_bias=True))
+
+
+def extract_people_quoted(article_text, nlp, cue_verbs, lazy_baseline=True, two_tier=False):
     """
     Uses
 
@@ -43,33 +51,75 @@ def extract_people_quoted(article_text, nlp, cue_verbs, lazy_baseline=True):
         The list of all "cue verbs", which are verbs that often introduce reported speech.
     :param lazy_baseline: bool.
         If the lazy abseline should be used instead of the ML model.
+    :param two_tier: bool.
+        If only the paragraphs containing quotes should be processed by the whole language model. Only used with the
+        lazy baseline, which finds the same people either way.
     :return: list(String)
         The names of all people that are predicted to have been cited in the article.
     """
     if lazy_baseline:
-        return extract_people_quoted_baseline(article_text, nlp, cue_verbs)
-        
+        return extract_people_quoted_baseline(article_text, nlp, cue_verbs, two_tier=two_tier)
+
     # Parses the article
     article_text = article_text.replace('&', '&amp;')
-    data = process_article(article_text, nlp)
-    article_mentions = data['mentions']
-    article_sentences = data['s']
-    article_in_quotes = data['in_quotes']
-    article_sentence_docs = extract_sentence_spans(article_text, nlp)
+    parsed = ParsedArticle(article_text, nlp)
+    return people_quoted_in_article(parsed, cue_verbs)
+
+
+def extract_people_quoted_many(article_texts, nlp, cue_verbs, lazy_baseline=True, batch_size=PARAGRAPH_BATCH_SIZE,
+                               two_tier=False):
+    """
+    Extracts the names of people cited in many articles at once. The paragraphs of all articles are processed by the
+    language model in batches.
+
+    :param article_texts: list(string)
+        The articles, in XML format (as extracted from websites).
+    :param nlp: spaCy.Language.
+        The language model used to tokenize the text.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param lazy_baseline: bool.
+        If the lazy abseline should be used instead of the ML model.
+    :param batch_size: int.
+        The number of paragraphs the language model processes at once.
+    :param two_tier: bool.
+        If only the paragraphs containing quotes should be processed by the whole language model. Only used with the
+        lazy baseline, which finds the same people either way.
+    :return: list(list(String))
+        For each article, the names of all people that are predicted to have been cited in it.
+    """
+    article_texts = [article_text.replace('&', '&amp;') for article_text in article_texts]
+    parsed_articles = parse_articles(article_texts, nlp, batch_size=batch_size, two_tier=two_tier and lazy_baseline)
+    if lazy_baseline:
+        return [people_quoted_in_article_baseline(parsed, cue_verbs) for parsed in parsed_articles]
+    return [people_quoted_in_article(parsed, cue_verbs) for parsed in parsed_articles]
+
+
+def people_quoted_in_article(parsed, cue_verbs):
+    """
+    Uses the trained quote detection and author prediction models to find the people cited in a parsed article.
+
+    :param parsed: backend.xml_parsing.xml_to_postgre.ParsedArticle
+        The parsed article.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :return: list(String)
+        The names of all people that are predicted to have been cited in the article.
+    """
+    article_mentions = parsed.mentions
+    article_sentences = parsed.sentences
+    article_in_quotes = parsed.in_quotes
+    article_sentence_docs = parsed.sentence_docs
 
     # Loads quote detection model and author extraction model
-    quote_detection_model = load_model(path_quote_detection_weights)
-    author_extraction_model = load_model(path_author_attribution_weights)
+    quote_detection_model = resources.get('quote_detection_model')
+    author_extraction_model = resources.get('author_prediction_model')
 
     # Computes the in_quotes value for each sentence
-    sentence_in_quotes = []
-    sentence_start = 0
-    for sentence_index, end in enumerate(article_sentences):
-        sentence_in_quotes.append(article_in_quotes[sentence_start:end + 1])
-        sentence_start = end + 1
+    sentence_in_quotes = parsed.sentence_in_quotes()
 
     # Predict if each sentence contains a quote or not
-    qd_poly = PolynomialFeatures(quote_detection_poly_degree, interaction_only=True, include_bias=True)
+    qd_poly = resources.get('quote_detection_poly')
     sentence_predictions = predict_quotes(
         quote_detection_model,
         article_sentence_docs,
@@ -97,24 +147,18 @@ def extract_people_quoted(article_text, nlp, cue_verbs, lazy_baseline=True):
                                            if contains_quote == 1]
 
     # Determining authors
-    ap_poly = PolynomialFeatures(author_prediction_poly_degree, interaction_only=True, include_bias=True)
-    ap_features = []
-    for i, speaker in enumerate(article_mentions):
-        speaker_features = attribution_features_baseline_no_db(
-            article_sentences,
-            article_in_quotes,
-            article_sentence_docs,
-            indices_sentences_containing_quotes,
-            speaker,
-            article_mentions[:i] + article_mentions[i + 1:],
-            cue_verbs
-        )
-        speaker_features = ap_poly.fit_transform(speaker_features.reshape((-1, 1))).reshape((-1,))
-        ap_features.append(
-            speaker_features
-        )
-
-    predicted_labels = author_extraction_model.predict(np.array(ap_features))
+    ap_poly = resources.get('author_prediction_poly')
+    speakers_features = attribution_feature_matrix(
+        article_sentences,
+        article_in_quotes,
+        article_sentence_docs,
+        indices_sentences_containing_quotes,
+        article_mentions,
+        cue_verbs
+    )
+    ap_features = expand_features(speakers_features, ap_poly)
+
+    predicted_labels = author_extraction_model.predict(ap_features)
 
     # DEBUGGING CODE
     """
@@ -145,17 +189,15 @@ def test():
         article_text = file.read()
 
     print(f'Loading language model...')
-    nlp = load_nlp()
+    nlp = resources.get('nlp')
 
     print(f'Loading cue verbs...\n\n')
-    with open('data/cue_verbs.csv', 'r') as f:
-        reader = csv.reader(f)
-        cue_verbs = set(list(reader)[0])
+    cue_verbs = resources.get('cue_verbs')
 
     print("Authors:", extract_people_quoted(article_text, nlp, cue_verbs))
 
 
-def extract_people_quoted_baseline(article_text, nlp, cue_verbs):
+def extract_people_quoted_baseline(article_text, nlp, cue_verbs, two_tier=False):
     """
     Uses
 
@@ -165,23 +207,36 @@ def extract_people_quoted_baseline(article_text, nlp, cue_verbs):
         The language model used to tokenize the text.
     :param cue_verbs: list(string)
         The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param two_tier: bool.
+        If only the paragraphs containing quotes should be processed by the whole language model.
     :return: list(String)
         The names of all people that are predicted to have been cited in the article.
     """
     # Parses the article
     article_text = article_text.replace('&', '&amp;')
-    data = process_article(article_text, nlp)
-    article_mentions = data['mentions']
-    article_sentences = data['s']
-    article_in_quotes = data['in_quotes']
-    article_sentence_docs = extract_sentence_spans(article_text, nlp)
+    if two_tier:
+        parsed = parse_articles([article_text], nlp, two_tier=True)[0]
+    else:
+        parsed = ParsedArticle(article_text, nlp)
+    return people_quoted_in_article_baseline(parsed, cue_verbs)
+
+
+def people_quoted_in_article_baseline(parsed, cue_verbs):
+    """
+    Uses the lazy baseline models to find the people cited in a parsed article.
+
+    :param parsed: backend.xml_parsing.xml_to_postgre.ParsedArticle
+        The parsed article.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :return: list(String)
+        The names of all people that are predicted to have been cited in the article.
+    """
+    article_mentions = parsed.mentions
+    article_sentence_docs = parsed.sentence_docs
 
     # Computes the in_quotes value for each sentence
-    sentence_in_quotes = []
-    sentence_start = 0
-    for end in article_sentences:
-        sentence_in_quotes.append(article_in_quotes[sentence_start:end + 1])
-        sentence_start = end + 1
+    sentence_in_quotes = parsed.sentence_in_quotes()
 
     # Predict if each sentence contains a quote or not
     sentence_predictions = []
@@ -194,8 +249,8 @@ def extract_people_quoted_baseline(article_text, nlp, cue_verbs):
 
     # Determining authors
     ne_is_cited = len(article_mentions) * [0]
+    sentence_starts = parsed.sentence_starts()
     for quote_sentence_index in indices_sentences_containing_quotes:
-        sentence_starts = [0] + [s_end + 1 for s_end in article_sentences][:-1]
         predicted_author_indices = attribute_quote_lazy(article_sentence_docs, quote_sentence_index, sentence_starts, sentence_in_quotes, cue_verbs)
         if len(predicted_author_indices) > 0:
             predicted_index_lazy = find_true_author_index(predicted_author_indices, article_mentions)
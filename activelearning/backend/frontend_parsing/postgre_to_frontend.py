@@ -1,10 +1,43 @@
+from collections import namedtuple
+import hashlib
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 
+from backend.encoding import decode_tokens
 from backend.models import Article
+from backend.result_cache import LocalBackend
 
 """ File containing all methods to select and format user labelling tasks. """
 
 
+""" The content of an article needed to load the context of tasks. """
+ArticleContent = namedtuple('ArticleContent', ['tokens_data', 'paragraph_ends', 'sentence_ends', 'etag'])
+
+
+""" The default configuration of the cache of article contents, which can be overridden with CONTEXT_CACHE in the
+settings. """
+DEFAULT_CONTEXT_CACHE = {
+    # The maximum number of articles kept in the memory of each worker.
+    'MAX_SIZE': 512,
+    # The number of seconds after which an article is loaded again.
+    'TTL': 24 * 60 * 60,
+}
+
+
+def create_context_cache():
+    """
+    :return: LocalBackend.
+        The cache of article contents described by the CONTEXT_CACHE setting.
+    """
+    config = dict(DEFAULT_CONTEXT_CACHE)
+    config.update(getattr(settings, 'CONTEXT_CACHE', {}))
+    return LocalBackend(config['MAX_SIZE'], config['TTL'])
+
+
+context_cache = create_context_cache()
+
+
 def form_sentence_json(article, sentence_id):
     """
     Given an article and some sentence indices in the article, forms a dict containing the key-value pairs article_id
@@ -27,15 +60,15 @@ def form_sentence_json(article, sentence_id):
             'data': [],
             'task': 'sentence'
         }
-    tokens = article.tokens['tokens']
+    sentence_ends = article.sentences_array().tolist()
     start_token = 0
     if sentence_id[0] > 0:
-        start_token = article.sentences['sentences'][sentence_id[0] - 1] + 1
-    end_token = article.sentences['sentences'][sentence_id[-1]]
+        start_token = sentence_ends[sentence_id[0] - 1] + 1
+    end_token = sentence_ends[sentence_id[-1]]
     return {
         'article_id': article.id,
         'sentence_id': sentence_id,
-        'data': tokens[start_token:end_token + 1],
+        'data': article.token_list(start_token, end_token + 1),
         'task': 'sentence'
     }
 
@@ -55,9 +88,8 @@ def form_paragraph_json(article, paragraph_id):
     :return: dictionary.
         A dict containing article_id, paragraph_id, sentence_id, data and task keys
     """
-    tokens = article.tokens['tokens']
-    par_ends = article.paragraphs['paragraphs']
-    sent_ends = article.sentences['sentences']
+    par_ends = article.paragraphs_array().tolist()
+    sent_ends = article.sentences_array().tolist()
     if paragraph_id == 0:
         start_token = 0
         start_sent = 0
@@ -69,37 +101,56 @@ def form_paragraph_json(article, paragraph_id):
     return {
         'article_id': article.id,
         'sentence_id': list(range(start_sent, end_sent + 1)),
-        'data': tokens[start_token:end_token + 1],
+        'data': article.token_list(start_token, end_token + 1),
         'task': 'paragraph'
     }
 
 
-def load_paragraph_above(article_id, sentence_id):
+def article_content(article_id):
     """
-    Finds the lists of tokens for a paragraph above a given sentence. If the sentence is in a paragraph below the
-    requested paragraph, returns the whole paragraph. If the sentence is the first of the paragraph, returns the
-    paragraph above.
+    Loads the tokens, paragraphs and sentences of an article, which never change once it is added. They are kept in a
+    least recently used cache, so that the context of a task can be loaded many times without querying the database.
 
     :param article_id: int.
-        The id of the Article of which we want the tokens for a paragraph.
-    :param sentence_id: int.
-        The index of the sentence for which we want the tokens above.
-    :return: dict.
-        data: list(string). The tokens in paragraph paragraph_id.
-        paragraph: int. The index of the paragraph returned.
+        The id of the article.
+    :return: ArticleContent.
+        The encoded tokens, the paragraph ends and the sentence ends of the article, and an ETag identifying them, or
+        None if the article doesn't exist.
     """
-    try:
-        article = Article.objects.get(id=article_id)
-    except ObjectDoesNotExist:
-        return None
+    content = context_cache.get(article_id)
+    if content is None:
+        try:
+            article = Article.objects.only('tokens_data', 'paragraphs_data', 'sentences_data').get(id=article_id)
+        except ObjectDoesNotExist:
+            return None
+        tokens_data = bytes(article.tokens_data)
+        content = ArticleContent(
+            tokens_data=tokens_data,
+            paragraph_ends=article.paragraphs_array().tolist(),
+            sentence_ends=article.sentences_array().tolist(),
+            etag=f'"{article.id}-{hashlib.sha1(tokens_data).hexdigest()[:16]}"',
+        )
+        context_cache.set(article_id, content)
+    return content
 
-    tokens = article.tokens['tokens']
-    paragraph_ends = article.paragraphs['paragraphs']
-    sentence_ends = article.sentences['sentences']
 
+def sentence_range_above(paragraph_ends, sentence_ends, sentence_id):
+    """
+    Finds the sentences of the paragraph above a given sentence, or of the beginning of the paragraph of the sentence
+    if it isn't its first sentence.
+
+    :param paragraph_ends: list(int).
+        The index of the last sentence of each paragraph.
+    :param sentence_ends: list(int).
+        The index of the last token of each sentence.
+    :param sentence_id: int.
+        The index of the sentence.
+    :return: int, int.
+        The indices of the first and last sentences, or None if the sentence is the first of the article.
+    """
     # If the sentence_id is 0, no data can be loaded
     if not (0 < sentence_id < len(sentence_ends)):
-        return {'data': [], 'first_sentence': -1, 'last_sentence': -1}
+        return None
 
     first_sentence = 0
     last_sentence = paragraph_ends[0]
@@ -109,20 +160,85 @@ def load_paragraph_above(article_id, sentence_id):
         first_sentence = last_sentence + 1
         last_sentence = paragraph_ends[paragraph_index]
 
-    last_sentence = min(sentence_id - 1, last_sentence)
+    return first_sentence, min(sentence_id - 1, last_sentence)
+
+
+def sentence_range_below(paragraph_ends, sentence_ends, sentence_id):
+    """
+    Finds the sentences of the paragraph below a given sentence, or of the end of the paragraph of the sentence if it
+    isn't its last sentence.
+
+    :param paragraph_ends: list(int).
+        The index of the last sentence of each paragraph.
+    :param sentence_ends: list(int).
+        The index of the last token of each sentence.
+    :param sentence_id: int.
+        The index of the sentence.
+    :return: int, int.
+        The indices of the first and last sentences, or None if the sentence is the last of the article.
+    """
+    # If the sentence_id is the last sentence of the article, no text below can be loaded
+    if not (0 <= sentence_id < len(sentence_ends) - 1):
+        return None
+
+    first_sentence = 0
+    last_sentence = paragraph_ends[0]
+    paragraph_index = 0
+    while sentence_id >= last_sentence:
+        paragraph_index += 1
+        first_sentence = last_sentence + 1
+        last_sentence = paragraph_ends[paragraph_index]
+
+    return max(first_sentence, sentence_id + 1), last_sentence
+
+
+def form_context_json(content, sentence_range):
+    """
+    :param content: ArticleContent.
+        The content of the article.
+    :param sentence_range: Tuple(int, int).
+        The indices of the first and last sentences, or None if there are no sentences.
+    :return: dict.
+        data: list(string). The tokens of the sentences.
+        first_sentence: int. The index of the first sentence, or -1 if there are no sentences.
+        last_sentence: int. The index of the last sentence, or -1 if there are no sentences.
+    """
+    if sentence_range is None:
+        return {'data': [], 'first_sentence': -1, 'last_sentence': -1}
 
+    first_sentence, last_sentence = sentence_range
     if first_sentence == 0:
         first_token = 0
     else:
-        first_token = sentence_ends[first_sentence - 1] + 1
-    last_token = sentence_ends[last_sentence]
+        first_token = content.sentence_ends[first_sentence - 1] + 1
+    last_token = content.sentence_ends[last_sentence]
     return {
-        'data': tokens[first_token:last_token + 1],
+        'data': decode_tokens(content.tokens_data, first_token, last_token + 1),
         'first_sentence': first_sentence,
         'last_sentence': last_sentence,
     }
 
 
+def load_paragraph_above(article_id, sentence_id):
+    """
+    Finds the lists of tokens for a paragraph above a given sentence. If the sentence is in a paragraph below the
+    requested paragraph, returns the whole paragraph. If the sentence is the first of the paragraph, returns the
+    paragraph above.
+
+    :param article_id: int.
+        The id of the Article of which we want the tokens for a paragraph.
+    :param sentence_id: int.
+        The index of the sentence for which we want the tokens above.
+    :return: dict.
+        data: list(string). The tokens in paragraph paragraph_id.
+        paragraph: int. The index of the paragraph returned.
+    """
+    content = article_content(article_id)
+    if content is None:
+        return None
+    return form_context_json(content, sentence_range_above(content.paragraph_ends, content.sentence_ends, sentence_id))
+
+
 def load_paragraph_below(article_id, sentence_id):
     """
     Finds the lists of tokens for a paragraph below a given sentence. If the sentence is in a paragraph above the
@@ -137,36 +253,50 @@ def load_paragraph_below(article_id, sentence_id):
         data: list(string). The tokens in paragraph paragraph_id.
         paragraph: int. The index of the paragraph returned.
     """
-    try:
-        article = Article.objects.get(id=article_id)
-    except ObjectDoesNotExist:
+    content = article_content(article_id)
+    if content is None:
         return None
+    return form_context_json(content, sentence_range_below(content.paragraph_ends, content.sentence_ends, sentence_id))
 
-    tokens = article.tokens['tokens']
-    paragraph_ends = article.paragraphs['paragraphs']
-    sentence_ends = article.sentences['sentences']
 
-    # If the sentence_id is the last sentence of the article, no text below can be loaded
-    if not (0 <= sentence_id < len(sentence_ends) - 1):
-        return {'data': [], 'first_sentence': -1, 'last_sentence': -1}
+def load_context(article_id, first_sentence, last_sentence, n_paragraphs):
+    """
+    Finds the tokens around some sentences, as if the paragraphs above and below them were loaded n_paragraphs times
+    with load_paragraph_above and load_paragraph_below.
 
-    first_sentence = 0
-    last_sentence = paragraph_ends[0]
-    paragraph_index = 0
-    while sentence_id >= last_sentence:
-        paragraph_index += 1
-        first_sentence = last_sentence + 1
-        last_sentence = paragraph_ends[paragraph_index]
+    :param article_id: int.
+        The id of the Article.
+    :param first_sentence: int.
+        The index of the first sentence, above which tokens are loaded.
+    :param last_sentence: int.
+        The index of the last sentence, below which tokens are loaded.
+    :param n_paragraphs: int.
+        The number of paragraphs to load above and below the sentences.
+    :return: dict.
+        above: dict. The tokens above the sentences, as returned by load_paragraph_above.
+        below: dict. The tokens below the sentences, as returned by load_paragraph_below.
+    """
+    content = article_content(article_id)
+    if content is None:
+        return None
 
-    first_sentence = max(first_sentence, sentence_id + 1)
+    above = None
+    for _ in range(n_paragraphs):
+        sentence_range = sentence_range_above(content.paragraph_ends, content.sentence_ends, first_sentence)
+        if sentence_range is None:
+            break
+        first_sentence = sentence_range[0]
+        above = (first_sentence, above[1] if above is not None else sentence_range[1])
+
+    below = None
+    for _ in range(n_paragraphs):
+        sentence_range = sentence_range_below(content.paragraph_ends, content.sentence_ends, last_sentence)
+        if sentence_range is None:
+            break
+        last_sentence = sentence_range[1]
+        below = (below[0] if below is not None else sentence_range[0], last_sentence)
 
-    if first_sentence == 0:
-        first_token = 0
-    else:
-        first_token = sentence_ends[first_sentence - 1] + 1
-    last_token = sentence_ends[last_sentence]
     return {
-        'data': tokens[first_token:last_token + 1],
-        'first_sentence': first_sentence,
-        'last_sentence': last_sentence,
+        'above': form_context_json(content, above),
+        'below': form_context_json(content, below),
     }
@@ -0,0 +1,204 @@
+from functools import lru_cache
+import json
+import logging
+import os
+
+import gender_guesser.detector as gender_detector
+
+from backend.atomic_files import write_atomic
+
+""" File containing the resolution of the gender of people from their first name. """
+
+logger = logging.getLogger(__name__)
+
+
+""" The path to the snapshot of the compiled gender lookup table. """
+path_gender_snapshot = 'data/gender_lookup.json'
+
+
+""" The version of the format of the snapshot. Snapshots with another version are compiled again. """
+SNAPSHOT_VERSION = 1
+
+
+""" The genders returned by gender_guesser, in the order of their codes in the lookup table. """
+GENDERS = ['unknown', 'male', 'female', 'mostly_male', 'mostly_female', 'andy']
+
+
+""" The maximum number of first names for which the gender is memoized. """
+MEMO_SIZE = 65536
+
+
+def gender_overrides(gender_dict):
+    """
+    Turns the gender dictionary of a request into overrides of the gender of some first names. If a name is both male
+    and female, it is considered to be male.
+
+    :param gender_dict: dict
+        The gender dictionary, with keys 'm' and 'f' containing lists of first names that are always male and always
+        female, respectively.
+    :return: dict
+        The lowercase first names, mapped to either 'male' or 'female'.
+    """
+    overrides = {name.lower(): 'female' for name in gender_dict['f']}
+    overrides.update({name.lower(): 'male' for name in gender_dict['m']})
+    return overrides
+
+
+class GenderResolver:
+    """
+    Finds the gender of first names in a lookup table compiled from the data of gender_guesser, instead of going
+    through the countries of each name every time.
+    """
+
+    def __init__(self, table):
+        """
+        :param table: dict
+            The first names, mapped to the code of their gender in GENDERS. Names that aren't in the table are of
+            unknown gender.
+        """
+        self.table = table
+        self.gender = lru_cache(maxsize=MEMO_SIZE)(self._gender)
+
+    @classmethod
+    def compile(cls, detector=None):
+        """
+        Compiles the lookup table by finding the gender of every first name known to gender_guesser.
+
+        :param detector: gender_guesser.detector.Detector
+            The detector from which to compile the table. If None, a new detector is created.
+        :return: GenderResolver
+            The resolver using the compiled table.
+        """
+        if detector is None:
+            detector = gender_detector.Detector()
+        table = {}
+        for name in detector.names:
+            code = GENDERS.index(detector.get_gender(name))
+            # Names of unknown gender don't need to be in the table.
+            if code > 0:
+                table[name] = code
+        return cls(table)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a lookup table from a snapshot.
+
+        :param path: string
+            The path to the snapshot.
+        :return: GenderResolver
+            The resolver using the table, or None if the snapshot doesn't exist, can't be read or has another version.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f'Could not load the gender lookup snapshot from {path}', exc_info=True)
+            return None
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('genders') != GENDERS:
+            return None
+        return cls(snapshot['names'])
+
+    def save(self, path):
+        """
+        Saves the lookup table in a snapshot, which can be loaded much faster than compiling it again. Other workers
+        may load the snapshot at the same time, so it is replaced at once.
+
+        :param path: string
+            The path to the snapshot.
+        """
+        snapshot = {'version': SNAPSHOT_VERSION, 'genders': GENDERS, 'names': self.table}
+        write_atomic(path, lambda f: json.dump(snapshot, f), binary=False)
+
+    def _gender(self, first_name):
+        return GENDERS[self.table.get(first_name.capitalize(), 0)]
+
+    def genders(self, first_names, overrides=None):
+        """
+        Finds the gender of many first names at once.
+
+        :param first_names: list(string)
+            The first names.
+        :param overrides: dict
+            The lowercase first names whose gender is given, mapped to their gender, as in gender_overrides.
+        :return: list(string)
+            The gender of each first name, as returned by gender_guesser.
+        """
+        if overrides is None:
+            overrides = {}
+        genders = []
+        for name in first_names:
+            gender = overrides.get(name.lower())
+            if gender is None:
+                gender = self.gender(name)
+            genders.append(gender)
+        return genders
+
+    def people_genders(self, people, overrides=None):
+        """
+        Sorts the people cited in an article by the gender of their first name.
+
+        :param people: list(string)
+            The full names of the people cited in the article.
+        :param overrides: dict
+            The lowercase first names whose gender is given, mapped to their gender, as in gender_overrides.
+        :return: dict
+            The names of the people of each gender, with keys 'female', 'mostly_female', 'mostly_male', 'male',
+            'androgyne' and 'unknown'.
+        """
+        return self.people_genders_many([people], overrides)[0]
+
+    def people_genders_many(self, people_per_article, overrides=None):
+        """
+        Sorts the people cited in many articles by the gender of their first name. The gender of each distinct first
+        name is only resolved once.
+
+        :param people_per_article: list(list(string))
+            For each article, the full names of the people cited in it.
+        :param overrides: dict
+            The lowercase first names whose gender is given, mapped to their gender, as in gender_overrides.
+        :return: list(dict)
+            For each article, the names of the people of each gender, as in people_genders.
+        """
+        first_names = list({p.split(" ")[0] for people in people_per_article for p in people})
+        first_name_genders = dict(zip(first_names, self.genders(first_names, overrides)))
+
+        results = []
+        for people in people_per_article:
+            genders = {
+                'female': [],
+                'mostly_female': [],
+                'mostly_male': [],
+                'male': [],
+                'androgyne': [],
+                'unknown': [],
+            }
+            for p in people:
+                g = first_name_genders[p.split(" ")[0]]
+                if g == 'andy':
+                    genders['androgyne'].append(p)
+                else:
+                    genders[g].append(p)
+            results.append(genders)
+        return results
+
+
+def load_gender_resolver(path=path_gender_snapshot):
+    """
+    Loads the gender resolver from its snapshot, or compiles it and saves the snapshot if there is none.
+
+    :param path: string
+        The path to the snapshot.
+    :return: GenderResolver
+        The gender resolver.
+    """
+    resolver = GenderResolver.load(path)
+    if resolver is None:
+        resolver = GenderResolver.compile()
+        try:
+            resolver.save(path)
+        except OSError:
+            logger.warning(f'Could not save the gender lookup snapshot to {path}')
+    return resolver
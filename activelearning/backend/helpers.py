@@ -1,6 +1,14 @@
+import bisect
+from collections import Counter
+
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+
+from backend.models import Article, UserLabel, SentenceConsensus, LabellingTask
+
 
-from backend.models import Article, UserLabel
+""" The minimum confidence required for an a full paragraph to be labeled at once. """
+CONFIDENCE_THRESHOLD = 0.8
 
 
 ##############################################################################################
@@ -8,6 +16,99 @@ from backend.models import Article, UserLabel
 ##############################################################################################
 
 
+class LabelTally:
+    """
+    A running count of the distinct labels and authors that users reported for a sentence, from which the consensus
+    can be computed at any time. Adding a user label only updates two counters.
+    """
+
+    def __init__(self, labels=None, authors=None):
+        """
+        :param labels: list(list).
+            Each distinct list of tags, with the number of users who reported it, in the order in which they were first
+            reported.
+        :param authors: list(list).
+            Each distinct list of author indices, with the number of users who reported it, in the same order.
+        """
+        self.labels = Counter({tuple(label): count for label, count in labels or []})
+        self.authors = Counter({tuple(author): count for author, count in authors or []})
+        self.count = sum(self.labels.values())
+
+    @classmethod
+    def from_labels(cls, labels, authors):
+        """
+        :param labels: list(list(int)).
+            The list of tags that each user reported.
+        :param authors: list(list(int)).
+            The list of author indices that each user reported.
+        :return: LabelTally.
+            The tally of the user labels.
+        """
+        tally = cls()
+        tally.labels = Counter(map(tuple, labels))
+        tally.authors = Counter(map(tuple, authors))
+        tally.count = len(labels)
+        return tally
+
+    @classmethod
+    def from_json(cls, tally):
+        """
+        :param tally: dict.
+            A tally saved with to_json.
+        :return: LabelTally.
+            The tally.
+        """
+        return cls(tally['labels'], tally['authors'])
+
+    def to_json(self):
+        """
+        :return: dict.
+            The tally, with keys 'labels' and 'authors' containing the arguments of the constructor.
+        """
+        return {
+            'labels': [[list(label), count] for label, count in self.labels.items()],
+            'authors': [[list(author), count] for author, count in self.authors.items()],
+        }
+
+    def add(self, labels, authors):
+        """
+        Adds the response of a user.
+
+        :param labels: list(int).
+            The tags the user reported.
+        :param authors: list(int).
+            The author indices the user reported.
+        """
+        self.labels[tuple(labels)] += 1
+        self.authors[tuple(authors)] += 1
+        self.count += 1
+
+    def consensus(self):
+        """
+        :return: Tuple(list(int), list(int), float).
+            The most common labels and authors, and the consensus, as in label_consensus.
+        """
+        if self.count == 0:
+            return [], [], 0
+        label, label_count = most_common(self.labels)
+        author, author_count = most_common(self.authors)
+        return list(label), list(author), (label_count + author_count) / (2 * self.count)
+
+
+def most_common(counter):
+    """
+    Finds the most common element of a counter. Ties are broken in the iteration order of a set of the elements,
+    filled in the order in which they were first counted, so that the consensus of existing sentences doesn't change.
+
+    :param counter: Counter.
+        The counter.
+    :return: object, int.
+        The most common element, and its count.
+    """
+    element = max(set(element for element in counter), key=counter.__getitem__)
+    return element, counter[element]
+
+
 def label_consensus(labels, authors):
     """
     Computes the (label, author) pair that is most common in the user labels, as well as the percentage of responses
@@ -22,17 +123,7 @@ def label_consensus(labels, authors):
         list(int): The author indices.
         float: A consensus between 0 and 1.
     """
-    if len(labels) == 0:
-        return [], [], 0
-    # Set of tuples as lists can't be hashed in Python
-    label_sets = set(tuple(i) for i in labels)
-    author_sets = set(tuple(i) for i in authors)
-    label_counts = [[label, labels.count(list(label))] for label in label_sets]
-    author_counts = [[author, authors.count(list(author))] for author in author_sets]
-    max_label_count = max(label_counts, key=lambda x: x[1])
-    max_author_count = max(author_counts, key=lambda x: x[1])
-    return list(max_label_count[0]), list(max_author_count[0]),\
-        (max_label_count[1] + max_author_count[1]) / (2 * len(labels))
+    return LabelTally.from_labels(labels, authors).consensus()
 
 
 def aggregate_label(article, sentence_index):
@@ -50,6 +141,261 @@ def aggregate_label(article, sentence_index):
     labels, author, consensus = label_consensus(all_labels, all_authors)
     return labels, author, consensus
 
+
+def user_labels_bulk(article_ids=None):
+    """
+    Loads all valid user labels of many articles in a single query, and groups them by sentence.
+
+    :param article_ids: list(int).
+        The ids of the articles. If None, the user labels of all articles are loaded.
+    :return: dict.
+        For each article id, a dict mapping the index of each labeled sentence to a tuple (labels, authors, admins),
+        containing the list of tags, the list of author indices and if the label was added by an admin, for each user
+        label of the sentence in the order in which they were added.
+    """
+    userlabels = UserLabel.objects.exclude(labels__labels=[])
+    if article_ids is not None:
+        userlabels = userlabels.filter(article_id__in=list(article_ids))
+    userlabels = userlabels.order_by('article_id', 'sentence_index', 'id').values_list(
+        'article_id', 'sentence_index', 'labels', 'author_index', 'admin_label')
+
+    article_userlabels = {}
+    for article_id, sentence_index, labels, authors, admin in userlabels.iterator():
+        sentence = article_userlabels.setdefault(article_id, {}).setdefault(sentence_index, ([], [], []))
+        sentence[0].append(labels['labels'])
+        sentence[1].append(authors['author_index'])
+        sentence[2].append(admin)
+    return article_userlabels
+
+
+def aggregate_labels_bulk(article_ids):
+    """
+    Computes the consensus of every sentence of many articles, from user labels loaded in a single query. Gives the
+    same results as calling aggregate_label for each sentence. The consensus is read from the SentenceConsensus table
+    with load_consensus, so this is only used to check or rebuild the table from the user labels.
+
+    :param article_ids: list(int).
+        The ids of the articles.
+    :return: dict.
+        For each article id, a list with a tuple (labels, authors, consensus) for each sentence of the article.
+        Sentences that were never labeled have no labels, no authors and a consensus of 0.
+    """
+    article_ids = list(article_ids)
+    article_userlabels = user_labels_bulk(article_ids)
+    consensus = {}
+    for article in Article.objects.filter(id__in=article_ids).only('id', 'sentences_data'):
+        sentence_userlabels = article_userlabels.get(article.id, {})
+        consensus[article.id] = [
+            label_consensus(*sentence_userlabels.get(sentence_index, ([], [], []))[:2])
+            for sentence_index in range(len(article.sentences_array()))
+        ]
+    return consensus
+
+
+def sentence_consensus_row(article_id, sentence_index, tally, has_admin):
+    """
+    :param article_id: int.
+        The id of the article containing the sentence.
+    :param sentence_index: int.
+        The index of the sentence in the article.
+    :param tally: LabelTally.
+        The tally of the user labels of the sentence.
+    :param has_admin: bool.
+        If one of the labels was added by an admin user.
+    :return: models.SentenceConsensus.
+        The consensus of the sentence, which isn't saved in the database.
+    """
+    consensus_labels, consensus_authors, consensus = tally.consensus()
+    return SentenceConsensus(
+        article_id=article_id,
+        sentence_index=sentence_index,
+        labels={'labels': consensus_labels},
+        authors={'author_index': consensus_authors},
+        consensus=consensus,
+        count=tally.count,
+        has_admin=has_admin,
+        tally=tally.to_json(),
+    )
+
+
+def load_sentence_tallies(article, sentence_indices):
+    """
+    Loads the tally of the user labels of some sentences of an article from the SentenceConsensus table.
+
+    :param article: models.Article.
+        The article containing the sentences.
+    :param sentence_indices: list(int).
+        The indices of the sentences.
+    :return: dict.
+        The index of each sentence, mapped to a tuple (tally, has_admin) with the LabelTally of the sentence and if
+        one of its labels was added by an admin user. Sentences that were never labeled have an empty tally.
+    """
+    tallies = {sentence_index: (LabelTally(), False) for sentence_index in sentence_indices}
+    rows = SentenceConsensus.objects.filter(article=article, sentence_index__in=list(sentence_indices))
+    for sentence_index, tally, has_admin in rows.values_list('sentence_index', 'tally', 'has_admin'):
+        tallies[sentence_index] = (LabelTally.from_json(tally), has_admin)
+    return tallies
+
+
+def store_sentences_consensus(article, sentence_tallies):
+    """
+    Stores the consensus of some sentences of an article in the SentenceConsensus table, replacing their previous
+    consensus.
+
+    :param article: models.Article.
+        The article containing the sentences.
+    :param sentence_tallies: dict.
+        The index of each sentence, mapped to a tuple (tally, has_admin), as in load_sentence_tallies.
+    """
+    rows = [
+        sentence_consensus_row(article.id, sentence_index, tally, has_admin)
+        for sentence_index, (tally, has_admin) in sentence_tallies.items()
+    ]
+    SentenceConsensus.objects.filter(article=article, sentence_index__in=list(sentence_tallies.keys())).delete()
+    SentenceConsensus.objects.bulk_create(rows)
+
+
+def load_consensus(articles):
+    """
+    Loads the consensus of every sentence of many articles from the SentenceConsensus table, in a single query. Gives
+    the same results as calling aggregate_label for each sentence.
+
+    :param articles: list(models.Article).
+        The articles.
+    :return: dict.
+        For each article id, a list with a tuple (labels, authors, consensus) for each sentence of the article.
+        Sentences that were never labeled have no labels, no authors and a consensus of 0.
+    """
+    consensus = {
+        article.id: [([], [], 0) for _ in range(len(article.sentences_array()))] for article in articles
+    }
+    rows = SentenceConsensus.objects.filter(article_id__in=list(consensus.keys())).values_list(
+        'article_id', 'sentence_index', 'labels', 'authors', 'consensus')
+    for article_id, sentence_index, labels, authors, sentence_consensus in rows:
+        if sentence_index < len(consensus[article_id]):
+            consensus[article_id][sentence_index] = (labels['labels'], authors['author_index'], sentence_consensus)
+    return consensus
+
+##############################################################################################
+# Labelling tasks
+##############################################################################################
+
+
+def article_labelling_tasks(article):
+    """
+    Finds all paragraphs and sentences of an article that still need to be labelled. A paragraph can be labelled at
+    once if its first sentence isn't labeled, if it has more than two sentences, and if the trained model is confident
+    that none of them contains reported speech. Every sentence that isn't labeled needs to be labelled, along with the
+    following sentences if a quote continues into them.
+
+    :param article: models.Article.
+        The article.
+    :return: list(models.LabellingTask).
+        The tasks of the article, which aren't saved in the database.
+    """
+    labeled = article.labeled['labeled']
+    confidences = article.confidence['confidence']
+    predictions = article.confidence['predictions']
+    sentence_ends = article.sentences_array().tolist()
+    in_quotes = article.in_quotes_array()
+
+    def task(task_type, first_sentence, last_sentence, paragraph_index=None):
+        return LabellingTask(
+            article=article,
+            first_sentence=first_sentence,
+            last_sentence=last_sentence,
+            paragraph_index=paragraph_index,
+            task_type=task_type,
+            priority=article.confidence['min_confidence'],
+            source=article.source,
+        )
+
+    tasks = []
+    prev_par_end = -1
+    # p is the index of the last sentence in paragraph i
+    for (i, p) in enumerate(article.paragraphs_array().tolist()):
+        if min(confidences[prev_par_end + 1:p + 1]) >= CONFIDENCE_THRESHOLD \
+                and max(predictions[prev_par_end + 1:p + 1]) == 0 \
+                and labeled[prev_par_end + 1] == 0 \
+                and p - prev_par_end > 2:
+            tasks.append(task(LabellingTask.PARAGRAPH, prev_par_end + 1, p, i))
+
+        for j in range(prev_par_end + 1, p + 1):
+            if not labeled[j] == 1:
+                last_sentence = j
+                # If the sentence's last token is inside quotes, the next sentences also need to be labelled
+                if in_quotes[sentence_ends[j]] == 1:
+                    last_sentence = min(quote_end_sentence(sentence_ends, in_quotes, sentence_ends[j]),
+                                        len(sentence_ends) - 1)
+                tasks.append(task(LabellingTask.SENTENCE, j, last_sentence))
+        prev_par_end = p
+    return tasks
+
+
+def task_starts(article, sentence_indices):
+    """
+    Finds the first sentence of all tasks that can change when the labels of some sentences change: the tasks of the
+    sentences themselves, and the tasks of the paragraphs containing them.
+
+    :param article: models.Article.
+        The article.
+    :param sentence_indices: list(int).
+        The indices of the sentences whose labels changed.
+    :return: set(int).
+        The indices of the first sentences of the tasks.
+    """
+    paragraph_ends = article.paragraphs_array().tolist()
+    starts = set(sentence_indices)
+    for index in sentence_indices:
+        paragraph = bisect.bisect_left(paragraph_ends, index)
+        starts.add(paragraph_ends[paragraph - 1] + 1 if paragraph > 0 else 0)
+    return starts
+
+
+def refresh_labelling_tasks(article, sentence_indices=None):
+    """
+    Updates the labelling tasks of an article to match its current labels and confidences. Needs to be called every
+    time they change. Only the tasks that were added, removed or changed are written.
+
+    :param article: models.Article.
+        The article.
+    :param sentence_indices: list(int).
+        If defined, only the labels of these sentences changed since the tasks were last refreshed, so only the tasks
+        that can depend on them are compared.
+    """
+    tasks = article_labelling_tasks(article)
+    existing = LabellingTask.objects.filter(article=article)
+    if sentence_indices is not None:
+        starts = task_starts(article, sentence_indices)
+        tasks = [task for task in tasks if task.first_sentence in starts]
+        existing = existing.filter(first_sentence__in=starts)
+
+    current = {(task.first_sentence, task.task_type): task
+               for task in existing.only('id', 'first_sentence', 'last_sentence', 'paragraph_index', 'task_type')}
+    wanted = {(task.first_sentence, task.task_type): task for task in tasks}
+    removed = [task.id for key, task in current.items() if key not in wanted]
+    added = [task for key, task in wanted.items() if key not in current]
+    changed = []
+    for key, task in current.items():
+        if key in wanted and (task.last_sentence, task.paragraph_index) != \
+                (wanted[key].last_sentence, wanted[key].paragraph_index):
+            task.last_sentence = wanted[key].last_sentence
+            task.paragraph_index = wanted[key].paragraph_index
+            changed.append(task)
+
+    with transaction.atomic():
+        if len(removed) > 0:
+            LabellingTask.objects.filter(id__in=removed).delete()
+        if len(changed) > 0:
+            LabellingTask.objects.bulk_update(changed, ['last_sentence', 'paragraph_index'])
+        if len(added) > 0:
+            LabellingTask.objects.bulk_create(added)
+        if sentence_indices is None:
+            # The priority of all tasks of the article is its minimum confidence.
+            priority = article.confidence['min_confidence']
+            LabellingTask.objects.filter(article=article).exclude(priority=priority).update(priority=priority)
+
+
 ##############################################################################################
 # Learning
 ##############################################################################################
@@ -70,7 +416,7 @@ def change_confidence(article_id, confidences, predictions):
         The minimum confidence this article has in a sentence, or -1 if the article couldn't be added to the database.
     """
     try:
-        article = Article.objects.get(id=article_id)
+        article = Article.objects.defer(*Article.PAYLOAD_FIELDS).get(id=article_id)
     except ObjectDoesNotExist:
         return None
 
@@ -82,6 +428,7 @@ def change_confidence(article_id, confidences, predictions):
         article.confidence['predictions'] = predictions
         article.confidence['min_confidence'] = min_conf
         article.save()
+        refresh_labelling_tasks(article)
         return min_conf
     return None
 
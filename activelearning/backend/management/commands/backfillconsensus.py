@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.helpers import LabelTally, sentence_consensus_row, user_labels_bulk
+from backend.models import Article, SentenceConsensus
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the consensus of every labeled sentence from the user labels, and stores it in the ' \
+           'SentenceConsensus table. Needs to be run once for labels that were added before the table existed.'
+
+    def handle(self, *args, **options):
+        article_ids = set(Article.objects.values_list('id', flat=True))
+        rows = []
+        for article_id, sentence_userlabels in user_labels_bulk().items():
+            if article_id not in article_ids:
+                continue
+            for sentence_index, (labels, authors, admins) in sentence_userlabels.items():
+                tally = LabelTally.from_labels(labels, authors)
+                rows.append(sentence_consensus_row(article_id, sentence_index, tally, any(admins)))
+
+        with transaction.atomic():
+            SentenceConsensus.objects.all().delete()
+            SentenceConsensus.objects.bulk_create(rows, batch_size=1000)
+
+        print(f'Stored the consensus of {len(rows)} sentences.')
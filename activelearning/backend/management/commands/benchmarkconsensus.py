@@ -0,0 +1,83 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from backend.helpers import LabelTally, label_consensus
+
+
+def quadratic_label_consensus(labels, authors):
+    """ The previous implementation of label_consensus, which counts every distinct label in the whole list. """
+    if len(labels) == 0:
+        return [], [], 0
+    label_sets = set(tuple(i) for i in labels)
+    author_sets = set(tuple(i) for i in authors)
+    label_counts = [[label, labels.count(list(label))] for label in label_sets]
+    author_counts = [[author, authors.count(list(author))] for author in author_sets]
+    max_label_count = max(label_counts, key=lambda x: x[1])
+    max_author_count = max(author_counts, key=lambda x: x[1])
+    return list(max_label_count[0]), list(max_author_count[0]),\
+        (max_label_count[1] + max_author_count[1]) / (2 * len(labels))
+
+
+def random_responses(n_responses, n_tokens, n_distinct):
+    """
+    Creates the responses of users for a sentence, who only give a few distinct answers.
+
+    :param n_responses: int.
+        The number of responses.
+    :param n_tokens: int.
+        The number of tokens in the sentence.
+    :param n_distinct: int.
+        The number of distinct responses.
+    :return: list(list(int)), list(list(int))
+        The labels and the authors of each response.
+    """
+    answers = [
+        ([random.randint(0, 1) for _ in range(n_tokens)], sorted(random.sample(range(n_tokens), 2)))
+        for _ in range(n_distinct)
+    ]
+    responses = [random.choice(answers) for _ in range(n_responses)]
+    return [labels for labels, _ in responses], [authors for _, authors in responses]
+
+
+class Command(BaseCommand):
+    help = 'Compares the time needed to compute the consensus of a sentence with the previous implementation, with ' \
+           'label_consensus and with a tally that is updated for each new label.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--responses', type=int, default=50,
+                            help='The number of user labels of the sentence. Default: 50')
+        parser.add_argument('--tokens', type=int, default=40, help='The number of tokens of the sentence. Default: 40')
+        parser.add_argument('--distinct', type=int, default=10,
+                            help='The number of distinct user labels. Default: 10')
+        parser.add_argument('--repeat', type=int, default=1000,
+                            help='The number of times each computation is repeated. Default: 1000')
+
+    def handle(self, *args, **options):
+        labels, authors = random_responses(options['responses'], options['tokens'], options['distinct'])
+        tally = LabelTally.from_labels(labels[:-1], authors[:-1])
+        if not quadratic_label_consensus(labels, authors) == label_consensus(labels, authors) == \
+                LabelTally.from_labels(labels, authors).consensus():
+            raise AssertionError('The implementations give different results.')
+
+        def add_label():
+            # Copy the tally so that every repetition adds the last label to the same tally.
+            updated = LabelTally()
+            updated.labels, updated.authors, updated.count = tally.labels.copy(), tally.authors.copy(), tally.count
+            updated.add(labels[-1], authors[-1])
+            return updated.consensus()
+
+        timings = {
+            'Previous implementation': lambda: quadratic_label_consensus(labels, authors),
+            'label_consensus': lambda: label_consensus(labels, authors),
+            'Tally, one new label': add_label,
+        }
+        base = '{:^25} | {:^15}'
+        print('\n')
+        print(base.format('Method', 'Time per call'))
+        print(f'{45 * "-"}')
+        for name, function in timings.items():
+            seconds = timeit.timeit(function, number=options['repeat']) / options['repeat']
+            print(base.format(name, f'{1e6 * seconds:.1f} us'))
+        print('\n')
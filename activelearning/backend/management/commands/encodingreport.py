@@ -0,0 +1,68 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Compares the size and the decoding time of the binary arrays of articles with the JSON lists they replaced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=None,
+                            help='The maximum number of articles to compare. Default: all articles')
+
+    def handle(self, *args, **options):
+        # The arrays that are only stored in their binary encoding, with the key of the JSON list they replaced.
+        fields = {
+            'tokens_data': 'tokens',
+            'in_quotes_data': 'in_quotes',
+            'sentences_data': 'sentences',
+            'paragraphs_data': 'paragraphs',
+        }
+        json_sizes = {field: 0 for field in fields}
+        binary_sizes = {field: 0 for field in fields}
+        json_times = {field: 0 for field in fields}
+        binary_times = {field: 0 for field in fields}
+
+        articles = Article.objects.only(*fields)
+        if options['articles'] is not None:
+            articles = articles[:options['articles']]
+
+        n_articles = 0
+        for article in articles.iterator():
+            n_articles += 1
+            decoders = {
+                'tokens_data': article.token_list,
+                'in_quotes_data': lambda: article.in_quotes_array().tolist(),
+                'sentences_data': lambda: article.sentences_array().tolist(),
+                'paragraphs_data': lambda: article.paragraphs_array().tolist(),
+            }
+            for field, key in fields.items():
+                start = time.perf_counter()
+                values = decoders[field]()
+                binary_times[field] += time.perf_counter() - start
+                binary_sizes[field] += len(getattr(article, field))
+
+                # The JSON is measured as it would be sent by the database.
+                json_string = json.dumps({key: values})
+                json_sizes[field] += len(json_string.encode('utf-8'))
+                start = time.perf_counter()
+                json.loads(json_string)
+                json_times[field] += time.perf_counter() - start
+
+        base = '{:^15} | {:^15} | {:^15} | {:^15} | {:^15}'
+        print('\n')
+        print(f'Compared {n_articles} article(s).')
+        print(base.format('Field', 'JSON size', 'Binary size', 'JSON time', 'Binary time'))
+        print(f'{90 * "-"}')
+        for field, key in fields.items():
+            print(base.format(
+                key,
+                f'{json_sizes[field] / 1000:.1f} kB',
+                f'{binary_sizes[field] / 1000:.1f} kB',
+                f'{1000 * json_times[field]:.1f} ms',
+                f'{1000 * binary_times[field]:.1f} ms',
+            ))
+        print('\n')
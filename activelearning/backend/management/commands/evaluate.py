@@ -5,6 +5,7 @@ from django.core.management.base import BaseCommand, CommandError
 
 from backend.ml.author_prediction import evaluate_author_prediction
 from backend.ml.baseline import baseline_quote_detection, baseline_quote_attribution
+from backend.ml.grid_search import AUTHOR_PREDICTION, QUOTE_DETECTION, Configuration, evaluate_configurations
 from backend.ml.quote_attribution import evaluate_quote_attribution
 from backend.ml.quote_detection import evaluate_quote_detection
 from backend.ml.scoring import ResultAccumulator
@@ -51,6 +52,8 @@ class Command(BaseCommand):
                             choices=['l1', 'l2', 'all'], )
         parser.add_argument('--exp', help='The degree of feature expansion for author prediction and quote detection.',
                             type=int, default=2)
+        parser.add_argument('--jobs', type=int, default=1,
+                            help='The number of processes training cross-validation folds at the same time. Default: 1')
 
     def handle(self, *args, **options):
         folds = 5
@@ -91,6 +94,16 @@ class Command(BaseCommand):
 
             alphas = [0.01, 0.1]
 
+            # With many jobs, all configurations are evaluated at once before the results are printed.
+            grid_results = {}
+            if options['jobs'] > 1:
+                print(f'Evaluating all configurations with {options["jobs"]} jobs...'.ljust(80), end='\r')
+                configurations = [Configuration(model, l, p, alpha)
+                                  for model in [QUOTE_DETECTION, AUTHOR_PREDICTION]
+                                  for l in losses for p in log_penalties for alpha in alphas]
+                grid_results = evaluate_configurations(configurations, nlp, cue_verbs, options['exp'], max_epochs,
+                                                       folds, options['jobs'])
+
             print('Evaluating quote detection...'.ljust(80))
             print('\n  Baseline:')
             results = baseline_quote_detection(nlp)
@@ -103,7 +116,11 @@ class Command(BaseCommand):
                     print(f'  {p} {l}:')
                     accumulator = ResultAccumulator()
                     for alpha in alphas:
-                        train_res, test_res = evaluate_quote_detection(l, p, alpha, max_epochs, nlp, cue_verbs, folds)
+                        if grid_results:
+                            train_res, test_res = grid_results[Configuration(QUOTE_DETECTION, l, p, alpha)]
+                        else:
+                            train_res, test_res = evaluate_quote_detection(l, p, alpha, max_epochs, nlp, cue_verbs,
+                                                                           folds)
                         with open('logs.txt', 'a') as f:
                             f.write(f'  Quote detection: {p}-{l} loss, alpha={alpha}\n'
                                     f'    Training results:\n{train_res.print_average_score()}\n'
@@ -143,9 +160,14 @@ class Command(BaseCommand):
                     best_alpha = ''
                     for alpha in alphas:
                         exp_degree = options['exp']
-                        train_res, test_res, train_set, test_set = evaluate_author_prediction(l, p, alpha, max_epochs,
-                                                                                              nlp, cue_verbs,
-                                                                                              exp_degree, folds)
+                        if grid_results:
+                            train_res, test_res, train_set, test_set = \
+                                grid_results[Configuration(AUTHOR_PREDICTION, l, p, alpha)]
+                        else:
+                            train_res, test_res, train_set, test_set = evaluate_author_prediction(l, p, alpha,
+                                                                                                  max_epochs, nlp,
+                                                                                                  cue_verbs, exp_degree,
+                                                                                                  folds)
 
                         acc, pre, rec, f1 = test_set.average_score()
                         if f1 > best_f1:
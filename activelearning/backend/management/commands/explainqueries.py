@@ -0,0 +1,86 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from backend.db_management import SOURCES
+from backend.helpers import article_labelling_tasks
+from backend.models import Article, UserLabel, LabellingTask
+
+
+def synthetic_article(index, n_sentences, fully_labeled):
+    """
+    Creates a small article with random confidences, which is only used to fill the tables.
+
+    :param index: int.
+        The index of the article, used in its name.
+    :param n_sentences: int.
+        The number of sentences of the article, which all contain a single token.
+    :param fully_labeled: bool.
+        If all sentences of the article are labeled.
+    :return: models.Article.
+        The article, which isn't saved in the database.
+    """
+    confidence = [random.random() for _ in range(n_sentences)]
+    return Article(
+        name=f'Synthetic article {index}',
+        text='',
+        people={'people': [], 'mentions': []},
+        labeled={
+            'labeled': n_sentences * [int(fully_labeled)],
+            'fully_labeled': int(fully_labeled),
+        },
+        confidence={
+            'confidence': confidence,
+            'predictions': n_sentences * [0],
+            'min_confidence': min(confidence),
+        },
+        admin_article=False,
+        source=random.choice(SOURCES),
+        **Article.encode_arrays(n_sentences * ['token '], [n_sentences - 1], list(range(n_sentences)),
+                                n_sentences * [0]),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with a synthetic corpus, and prints the plan and the execution time of the queries ' \
+           'run for every labelling task and for training. All changes are rolled back at the end.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=100000,
+                            help='The number of synthetic articles. Default: 100000')
+        parser.add_argument('--sentences', type=int, default=5,
+                            help='The number of sentences of each synthetic article. Default: 5')
+        parser.add_argument('--labeled', type=float, default=0.3,
+                            help='The proportion of synthetic articles that are fully labeled. Default: 0.3')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            print(f'Creating {options["articles"]} synthetic articles...')
+            articles = Article.objects.bulk_create(
+                [synthetic_article(i, options['sentences'], random.random() < options['labeled'])
+                 for i in range(options['articles'])],
+                batch_size=1000,
+            )
+            tasks = [task for article in articles for task in article_labelling_tasks(article)]
+            LabellingTask.objects.bulk_create(tasks, batch_size=1000)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE backend_article; ANALYZE backend_userlabel; ANALYZE backend_labellingtask;')
+
+            unlabeled_articles = Article.objects.filter(labeled__fully_labeled=0)
+            session_labels = UserLabel.objects.filter(
+                session_id='0000', article=OuterRef('article'), sentence_index=OuterRef('first_sentence'))
+            queries = {
+                'Unlabeled articles': unlabeled_articles.values('id'),
+                'Fully labeled articles': Article.objects.filter(labeled__fully_labeled=1).values('id'),
+                'Next labelling task': LabellingTask.objects.annotate(annotated=Exists(session_labels))
+                .filter(annotated=False, source=SOURCES[0]).select_related('article')
+                .order_by('priority', 'article_id', 'first_sentence', 'task_type')[:1],
+            }
+            for name, queryset in queries.items():
+                print(f'\n{name}')
+                print(f'{110 * "-"}')
+                print(queryset.explain(analyze=True))
+
+            transaction.set_rollback(True)
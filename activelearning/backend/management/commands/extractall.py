@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError
 
-from backend.helpers import aggregate_label
+from backend.helpers import load_consensus
 from backend.models import Article
 from backend.xml_parsing.postgre_to_xml import database_to_xml
 
@@ -14,13 +14,14 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         path = options['path']
         try:
-            articles = Article.objects.all()
+            articles = list(Article.objects.filter(labeled__fully_labeled=1))
+            article_consensus = load_consensus(articles)
             for a in articles:
                 if a.labeled['fully_labeled'] == 1:
                     labels = []
                     authors = []
-                    for s_id in range(len(a.sentences['sentences'])):
-                        sent_label, sent_authors, consensus = aggregate_label(a, s_id)
+                    for s_id in range(len(a.sentences_array())):
+                        sent_label, sent_authors, consensus = article_consensus[a.id][s_id]
                         labels.append(sent_label)
                         authors.append(sent_authors)
                     output_xml = database_to_xml(a, labels, authors)
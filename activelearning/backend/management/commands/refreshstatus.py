@@ -1,8 +1,8 @@
 from django.core.management.base import BaseCommand
 
 from backend.db_management import CONSENSUS_THRESHOLD, COUNT_THRESHOLD
-from backend.helpers import label_consensus
-from backend.models import Article, UserLabel
+from backend.helpers import LabelTally, user_labels_bulk, refresh_labelling_tasks
+from backend.models import Article
 
 
 class Command(BaseCommand):
@@ -11,29 +11,29 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
 
-        articles = Article.objects.all()
+        articles = Article.objects.defer(*Article.PAYLOAD_FIELDS)
+        article_userlabels = user_labels_bulk()
         for a in articles:
             labeled = []
-            for s_index in range(len(a.sentences['sentences'])):
-                userlabels = UserLabel.objects.filter(article=a, sentence_index=s_index).exclude(labels__labels=[])
+            sentence_userlabels = article_userlabels.get(a.id, {})
+            for s_index in range(len(a.sentences_array())):
+                labels, authors, admins = sentence_userlabels.get(s_index, ([], [], []))
 
-                admin_labels = userlabels.filter(admin_label=True)
-
-                if len(admin_labels) > 0:
+                if any(admins):
                     labeled.append(1)
                 else:
-                    labels = [userlabel.labels['labels'] for userlabel in userlabels]
-                    authors = [userlabel.author_index['author_index'] for userlabel in userlabels]
-                    label, author, consensus = label_consensus(labels, authors)
+                    tally = LabelTally.from_labels(labels, authors)
+                    label, author, consensus = tally.consensus()
 
-                    is_labeled = int(consensus >= CONSENSUS_THRESHOLD and len(labels) >= COUNT_THRESHOLD)
+                    is_labeled = int(consensus >= CONSENSUS_THRESHOLD and tally.count >= COUNT_THRESHOLD)
                     labeled.append(is_labeled)
 
-            predictions = len(a.sentences['sentences']) * [0]
+            predictions = len(a.sentences_array()) * [0]
             a.confidence['predictions'] = predictions
-            fully_labeled = int(sum(labeled) == len(a.sentences['sentences']))
+            fully_labeled = int(sum(labeled) == len(a.sentences_array()))
             a.labeled = {
                 'labeled': labeled,
                 'fully_labeled': fully_labeled,
             }
             a.save()
+            refresh_labelling_tasks(a)
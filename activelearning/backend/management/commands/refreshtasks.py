@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.helpers import article_labelling_tasks
+from backend.models import Article, LabellingTask
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the queue of labelling tasks from the labels and confidences of all articles. Needs to be run ' \
+           'once for articles that were added before the queue existed.'
+
+    def handle(self, *args, **options):
+        tasks = []
+        articles = Article.objects.filter(labeled__fully_labeled=0)
+        for article in articles.defer(*Article.PAYLOAD_FIELDS).iterator():
+            tasks += article_labelling_tasks(article)
+
+        with transaction.atomic():
+            LabellingTask.objects.all().delete()
+            LabellingTask.objects.bulk_create(tasks, batch_size=1000)
+
+        print(f'Stored {len(tasks)} labelling tasks.')
@@ -3,7 +3,7 @@ from functools import reduce
 from django.core.management.base import BaseCommand
 from numpy.random import random
 
-from backend.helpers import aggregate_label
+from backend.helpers import load_consensus
 from backend.models import Article
 
 
@@ -26,10 +26,11 @@ class Command(BaseCommand):
         # Number of labeled sentences that are quotes for each source
         labeled_quotes = {'Heidi.News': 0, 'Parisien': 0, 'Republique': 0}
 
-        articles = Article.objects.all()
+        articles = list(Article.objects.defer(*Article.PAYLOAD_FIELDS))
+        consensus = load_consensus([a for a in articles if a.labeled['fully_labeled'] == 1])
         for a in articles:
             articles_count[a.source] += 1
-            sentences_count[a.source] += len(a.sentences['sentences'])
+            sentences_count[a.source] += len(a.sentences_array())
             if a.labeled['fully_labeled'] == 1:
                 labeled_articles[a.source] += 1
 
@@ -43,10 +44,10 @@ class Command(BaseCommand):
                     test_articles[a.source] += 1
 
                 # Check if each sentence is a quote or not.
-                for sentence_index, end in enumerate(a.sentences['sentences']):
+                for sentence_index, end in enumerate(a.sentences_array()):
                     labeled_sentences[a.source] += 1
-                    # Compute consensus labels
-                    sentence_labels, sentence_authors, _ = aggregate_label(a, sentence_index)
+                    # Consensus labels
+                    sentence_labels, sentence_authors, _ = consensus[a.id][sentence_index]
                     # If the sentence is a quote, add the number of quotes to the source
                     if sum(sentence_labels) > 0:
                         labeled_quotes[a.source] += 1
@@ -1,15 +1,22 @@
 import csv
+import os
 import numpy as np
 
 from django.core.management.base import BaseCommand, CommandError
+from sklearn.preprocessing import PolynomialFeatures
 
 from backend.db_management import load_unlabeled_sentences
 from backend.extraction_pipeline import path_quote_detection_weights, path_author_attribution_weights, \
     author_prediction_poly_degree, quote_detection_poly_degree
 from backend.helpers import change_confidence
-from backend.ml.author_prediction import evaluate_author_prediction_test
-from backend.ml.helpers import save_model
-from backend.ml.quote_detection import train_quote_detection, evaluate_unlabeled_sentences
+from backend.ml.author_prediction import evaluate_author_prediction_test, update_author_prediction
+from backend.ml.feature_store import FeatureStore
+from backend.ml.grid_search import QUOTE_DETECTION, AUTHOR_PREDICTION
+from backend.ml.helpers import save_model, load_model
+from backend.ml.quote_detection import train_quote_detection, update_quote_detection, evaluate_unlabeled_sentences
+from backend.ml.training_watermark import load_watermark, save_watermark, trained_snapshots, model_version, \
+    set_trained, scoring_snapshot, scored_articles, set_scored
+from backend.models import Article
 from backend.xml_parsing.helpers import load_nlp
 
 
@@ -20,6 +27,39 @@ def form_sentence(nlp, tokens):
     return doc
 
 
+def model_parameters(loss, penalty, alpha, feature_store):
+    """
+    :param loss: string
+        The loss of the model.
+    :param penalty: string
+        The penalty of the model.
+    :param alpha: float
+        The regularization of the model.
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        The store of the features of the model, named after the parameters of the features.
+    :return: dict
+        The parameters of the model and of its features, which must be the same to train the model incrementally.
+    """
+    return {'loss': loss, 'penalty': penalty, 'alpha': alpha, 'features': os.path.basename(feature_store.directory)}
+
+
+def rescale_confidences(article_ids, ratio):
+    """
+    Normalizes the confidences of articles scored with hinge loss again, when the largest hinge value grows, so that
+    they stay comparable with the confidences of the articles scored afterwards.
+
+    :param article_ids: list(int)
+        The ids of the articles whose confidences are rescaled.
+    :param ratio: float
+        The previous largest hinge value divided by the new one.
+    """
+    for article in Article.objects.filter(id__in=article_ids).defer(*Article.PAYLOAD_FIELDS):
+        # The confidence of labeled sentences is always 1
+        confidence = [1 if label == 1 else conf * ratio
+                      for label, conf in zip(article.labeled['labeled'], article.confidence['confidence'])]
+        change_confidence(article.id, confidence, article.confidence['predictions'])
+
+
 class Command(BaseCommand):
     help = 'Trains the model with all fully annotated articles.'
 
@@ -40,6 +80,14 @@ class Command(BaseCommand):
         parser.add_argument('--ap_reg', type=float, help='Reg to use for author prediction. Default: 0.01',
                             default=0.01)
 
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only trains the saved models on the articles labeled since they were trained, with a '
+                                 'sample of the other articles, and only evaluates the articles whose confidences can '
+                                 'have changed. Models trained with other parameters are trained from scratch.')
+        parser.add_argument('--replay', type=int, default=2,
+                            help='Number of previously trained articles sampled for each new article when training '
+                                 'incrementally. Default: 2')
+
     def handle(self, *args, **options):
         max_epochs = options['epochs']
         qd_loss = options['qd_loss']
@@ -50,30 +98,80 @@ class Command(BaseCommand):
         ap_penalty = options['ap_penalty']
         ap_alpha = options['ap_reg']
 
+        incremental = options['incremental']
+        replay = options['replay']
+
         try:
             print('\nLoading language model...\n')
             nlp = load_nlp()
             with open('data/cue_verbs.csv', 'r') as f:
                 reader = csv.reader(f)
                 cue_verbs = set(list(reader)[0])
+            watermark = load_watermark()
 
             print('Training quote detection...')
             qd_ed = quote_detection_poly_degree
-            qd_trained_model = train_quote_detection(qd_loss, qd_penalty, qd_alpha, max_epochs, nlp, cue_verbs, qd_ed)
-            save_model(qd_trained_model, path_quote_detection_weights)
-            print(f'Saved trained model at {path_quote_detection_weights}\n')
+            qd_poly = PolynomialFeatures(qd_ed, interaction_only=True, include_bias=True)
+            qd_store = FeatureStore(QUOTE_DETECTION, cue_verbs, qd_poly, nlp)
+            qd_parameters = model_parameters(qd_loss, qd_penalty, qd_alpha, qd_store)
+            qd_snapshots = trained_snapshots(watermark, QUOTE_DETECTION, qd_parameters) if incremental else None
+            if qd_snapshots is not None and os.path.exists(path_quote_detection_weights):
+                qd_trained_model, new_ids = update_quote_detection(load_model(path_quote_detection_weights), max_epochs,
+                                                                   nlp, cue_verbs, qd_snapshots, qd_store, replay,
+                                                                   qd_ed)
+                print(f'Trained on {len(new_ids)} new or relabeled articles')
+                qd_updated = len(new_ids) > 0
+            else:
+                qd_trained_model = train_quote_detection(qd_loss, qd_penalty, qd_alpha, max_epochs, nlp, cue_verbs,
+                                                         qd_ed, feature_store=qd_store)
+                qd_updated = True
+            if qd_updated:
+                save_model(qd_trained_model, path_quote_detection_weights)
+                print(f'Saved trained model at {path_quote_detection_weights}\n')
+            set_trained(watermark, QUOTE_DETECTION, qd_parameters, qd_store.snapshots, qd_updated)
+            save_watermark(watermark)
 
             print("Training author prediction...")
             ap_ed = author_prediction_poly_degree
-            ap_trained_model, _, _, _, _, _ =\
-                evaluate_author_prediction_test(ap_loss, ap_penalty, ap_alpha, max_epochs, nlp, cue_verbs, ap_ed)
-            save_model(ap_trained_model, path_author_attribution_weights)
-            print(f'Saved trained model at {path_quote_detection_weights}\n')
+            ap_poly = PolynomialFeatures(ap_ed, interaction_only=True, include_bias=True)
+            ap_store = FeatureStore(AUTHOR_PREDICTION, cue_verbs, ap_poly, nlp)
+            ap_parameters = model_parameters(ap_loss, ap_penalty, ap_alpha, ap_store)
+            ap_snapshots = trained_snapshots(watermark, AUTHOR_PREDICTION, ap_parameters) if incremental else None
+            if ap_snapshots is not None and os.path.exists(path_author_attribution_weights):
+                ap_trained_model, new_ids = update_author_prediction(load_model(path_author_attribution_weights),
+                                                                     max_epochs, nlp, cue_verbs, ap_snapshots,
+                                                                     ap_store, replay, ap_ed)
+                print(f'Trained on {len(new_ids)} new or relabeled articles')
+                ap_updated = len(new_ids) > 0
+            else:
+                ap_trained_model, _, _, _, _, _ = evaluate_author_prediction_test(
+                    ap_loss, ap_penalty, ap_alpha, max_epochs, nlp, cue_verbs, ap_ed, feature_store=ap_store)
+                ap_updated = True
+            if ap_updated:
+                save_model(ap_trained_model, path_author_attribution_weights)
+                print(f'Saved trained model at {path_author_attribution_weights}\n')
+            set_trained(watermark, AUTHOR_PREDICTION, ap_parameters, ap_store.snapshots, ap_updated)
+            save_watermark(watermark)
 
             print('Evaluating all unlabeled quotes...')
             proba = qd_loss == 'log'
-            articles, sentences, in_quotes = load_unlabeled_sentences(nlp)
-            max_hinge_value = 0.00001
+            # The articles whose labels didn't change since they were evaluated by the same model keep their
+            # confidences. When training from scratch, all articles are evaluated again.
+            qd_version = model_version(watermark, QUOTE_DETECTION)
+            scored, scored_max_hinge_value = scored_articles(watermark, qd_version) if incremental else ({}, 0)
+            unlabeled_ids = set()
+
+            def needs_scoring(article):
+                unlabeled_ids.add(article.id)
+                return scored.get(article.id) != scoring_snapshot(article)
+
+            articles, sentences, in_quotes = load_unlabeled_sentences(nlp, needs_scoring)
+            # Articles that became fully labeled don't have confidences anymore.
+            scored = {article_id: snapshot for article_id, snapshot in scored.items() if article_id in unlabeled_ids}
+            print(f'Evaluating {len(articles)} articles')
+            # The confidences of the articles evaluated again are normalized by at least the largest hinge value of the
+            # articles that were already evaluated, so that they stay comparable.
+            max_hinge_value = max(scored_max_hinge_value, 0.00001)
             confidences = []
             predictions = []
             for article, article_sentences, article_in_quotes in zip(articles, sentences, in_quotes):
@@ -96,12 +194,21 @@ class Command(BaseCommand):
                     predictions.append(prediction)
                     max_hinge_value = max(max_hinge_value, max(confidence))
 
+            # If the largest hinge value grew, the articles that kept their confidences are normalized by it too.
+            evaluated_ids = {article.id for article in articles}
+            kept_ids = [article_id for article_id in scored if article_id not in evaluated_ids]
+            if not proba and kept_ids and max_hinge_value > scored_max_hinge_value:
+                rescale_confidences(kept_ids, scored_max_hinge_value / max_hinge_value)
+
             for article, confidence, prediction in zip(articles, confidences, predictions):
                 if not proba:
                     confidence = [conf/max_hinge_value for conf in confidence]
                 # For sentences in the article that are fully labeled, the confidence is 1
                 new_confidences = [max(label, conf) for label, conf in zip(article.labeled['labeled'], confidence)]
-                change_confidence(article.id, new_confidences, prediction)
+                if change_confidence(article.id, new_confidences, prediction) is not None:
+                    scored[article.id] = scoring_snapshot(article)
+            set_scored(watermark, qd_version, scored, max_hinge_value)
+            save_watermark(watermark)
 
             print('Done\n')
 
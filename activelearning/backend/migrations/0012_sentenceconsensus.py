@@ -0,0 +1,31 @@
+# Generated by Django 2.2.5 on 2026-10-17 09:12
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_auto_20200518_0821'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentenceConsensus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sentence_index', models.IntegerField()),
+                ('labels', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('authors', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('consensus', models.FloatField()),
+                ('count', models.IntegerField()),
+                ('has_admin', models.BooleanField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend.Article')),
+            ],
+            options={
+                'unique_together': {('article', 'sentence_index')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.5 on 2026-10-17 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_sentenceconsensus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabellingTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_sentence', models.IntegerField()),
+                ('last_sentence', models.IntegerField()),
+                ('paragraph_index', models.IntegerField(null=True)),
+                ('task_type', models.CharField(choices=[('paragraph', 'Paragraph'), ('sentence', 'Sentence')], max_length=10)),
+                ('priority', models.FloatField()),
+                ('source', models.CharField(max_length=200)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend.Article')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userlabel',
+            index=models.Index(fields=['session_id', 'article', 'sentence_index'], name='userlabel_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labellingtask',
+            index=models.Index(fields=['priority', 'article', 'first_sentence', 'task_type'], name='task_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labellingtask',
+            index=models.Index(fields=['source', 'priority', 'article', 'first_sentence', 'task_type'], name='task_source_priority_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='labellingtask',
+            unique_together={('article', 'first_sentence', 'task_type')},
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.5 on 2026-10-17 11:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index on the key of the JSON field of articles that tells if they are fully labeled, which is used to load the
+    labeled and the unlabeled articles. Django can't describe expression indexes, so it is created in SQL. The
+    expression is the one generated by the queries, so that Postgres can match it.
+    """
+
+    dependencies = [
+        ('backend', '0013_labellingtask'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX article_fully_labeled_idx ON backend_article ((labeled -> 'fully_labeled'));",
+            reverse_sql='DROP INDEX article_fully_labeled_idx;',
+        ),
+    ]
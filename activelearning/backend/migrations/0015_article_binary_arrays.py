@@ -0,0 +1,124 @@
+# Generated by Django 2.2.5 on 2026-10-17 13:40
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+from backend.encoding import encode_ints, decode_ints, encode_bits, decode_bits, encode_tokens, decode_tokens
+
+
+def encode_articles(apps, schema_editor):
+    Article = apps.get_model('backend', 'Article')
+    articles = Article.objects.only('tokens', 'in_quotes', 'sentences', 'paragraphs')
+    for article in articles.iterator():
+        Article.objects.filter(id=article.id).update(
+            tokens_data=encode_tokens(article.tokens['tokens']),
+            in_quotes_data=encode_bits(article.in_quotes['in_quotes']),
+            sentences_data=encode_ints(article.sentences['sentences']),
+            paragraphs_data=encode_ints(article.paragraphs['paragraphs']),
+        )
+
+
+def decode_articles(apps, schema_editor):
+    Article = apps.get_model('backend', 'Article')
+    articles = Article.objects.only('tokens_data', 'in_quotes_data', 'sentences_data', 'paragraphs_data')
+    for article in articles.iterator():
+        Article.objects.filter(id=article.id).update(
+            tokens={'tokens': decode_tokens(article.tokens_data)},
+            in_quotes={'in_quotes': decode_bits(article.in_quotes_data).tolist()},
+            sentences={'sentences': decode_ints(article.sentences_data).tolist()},
+            paragraphs={'paragraphs': decode_ints(article.paragraphs_data).tolist()},
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Replaces the JSON lists of the arrays of articles, which never change once they are added, with compact binary
+    encodings. The binary fields are filled from the JSON fields before these are removed, and the other way around
+    when the migration is reversed.
+    """
+
+    dependencies = [
+        ('backend', '0014_article_json_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='in_quotes_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='paragraphs_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='sentences_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='tokens_data',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(encode_articles, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='article',
+            name='in_quotes_data',
+            field=models.BinaryField(),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='paragraphs_data',
+            field=models.BinaryField(),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='sentences_data',
+            field=models.BinaryField(),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='tokens_data',
+            field=models.BinaryField(),
+        ),
+        # The JSON fields are made nullable first, so that they can be added back and filled when reversing.
+        migrations.AlterField(
+            model_name='article',
+            name='in_quotes',
+            field=django.contrib.postgres.fields.jsonb.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='paragraphs',
+            field=django.contrib.postgres.fields.jsonb.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='sentences',
+            field=django.contrib.postgres.fields.jsonb.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='tokens',
+            field=django.contrib.postgres.fields.jsonb.JSONField(null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, decode_articles),
+        migrations.RemoveField(
+            model_name='article',
+            name='in_quotes',
+        ),
+        migrations.RemoveField(
+            model_name='article',
+            name='paragraphs',
+        ),
+        migrations.RemoveField(
+            model_name='article',
+            name='sentences',
+        ),
+        migrations.RemoveField(
+            model_name='article',
+            name='tokens',
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.5 on 2026-10-17 15:10
+
+from collections import Counter
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+def most_common(counter):
+    """ The most common element of a counter and its count, with ties broken as when the tallies were introduced. """
+    element = max(set(element for element in counter), key=counter.__getitem__)
+    return element, counter[element]
+
+
+def tally_user_labels(apps, schema_editor):
+    """
+    Recomputes the consensus and the tally of every labeled sentence from the user labels. The tallies are computed
+    here rather than with backend.helpers.LabelTally, so that later changes to it don't change this migration.
+    """
+    UserLabel = apps.get_model('backend', 'UserLabel')
+    SentenceConsensus = apps.get_model('backend', 'SentenceConsensus')
+
+    # The number of users who reported each distinct labels and authors of each sentence, and if one was an admin.
+    tallies = {}
+    userlabels = UserLabel.objects.exclude(labels__labels=[]).order_by('id')
+    for article_id, sentence_index, labels, authors, admin in userlabels.values_list(
+            'article_id', 'sentence_index', 'labels', 'author_index', 'admin_label').iterator():
+        key = (article_id, sentence_index)
+        label_counts, author_counts, has_admin = tallies.get(key, (Counter(), Counter(), False))
+        label_counts[tuple(labels['labels'])] += 1
+        author_counts[tuple(authors['author_index'])] += 1
+        tallies[key] = (label_counts, author_counts, has_admin or admin)
+
+    rows = []
+    for (article_id, sentence_index), (label_counts, author_counts, has_admin) in tallies.items():
+        count = sum(label_counts.values())
+        consensus_labels, label_count = most_common(label_counts)
+        consensus_authors, author_count = most_common(author_counts)
+        rows.append(SentenceConsensus(
+            article_id=article_id,
+            sentence_index=sentence_index,
+            labels={'labels': list(consensus_labels)},
+            authors={'author_index': list(consensus_authors)},
+            consensus=(label_count + author_count) / (2 * count),
+            count=count,
+            has_admin=has_admin,
+            tally={
+                'labels': [[list(label), n] for label, n in label_counts.items()],
+                'authors': [[list(author), n] for author, n in author_counts.items()],
+            },
+        ))
+    SentenceConsensus.objects.all().delete()
+    SentenceConsensus.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_article_binary_arrays'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentenceconsensus',
+            name='tally',
+            field=django.contrib.postgres.fields.jsonb.JSONField(default=dict),
+        ),
+        migrations.RunPython(tally_user_labels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.5 on 2026-10-17 16:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_sentenceconsensus_tally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sentence_index', models.IntegerField()),
+                ('session_id', models.CharField(max_length=50)),
+                ('expires_at', models.DateTimeField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend.Article')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tasklease',
+            index=models.Index(fields=['expires_at'], name='lease_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasklease',
+            index=models.Index(fields=['session_id'], name='lease_session_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tasklease',
+            unique_together={('article', 'sentence_index')},
+        ),
+    ]
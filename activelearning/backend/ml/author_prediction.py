@@ -7,8 +7,9 @@ from sklearn.preprocessing import PolynomialFeatures
 from backend.ml.helpers import extract_speaker_names
 from backend.db_management import load_quote_authors
 from backend.ml.author_prediction_dataset import AuthorPredictionDataset, subset, author_prediction_loader
+from backend.ml.feature_store import FeatureStore
 from backend.ml.scoring import Results
-from backend.ml.sgd import train, evaluate
+from backend.ml.sgd import train, evaluate, incremental_train
 
 """
 File with the second way of extracting authors for quotes. Instead of trying to determine which Named Entity is the
@@ -17,9 +18,10 @@ binary classifier.
 """
 
 
-def load_data(nlp, cue_verbs, poly):
+def load_data(nlp, cue_verbs, poly, feature_store=None):
     """
-    Loads the datasets to perform article quotee extraction.
+    Loads the datasets to perform article quotee extraction. Features are loaded from the feature store when
+    possible, in which case the articles aren't parsed.
 
     :param nlp: spaCy.Language
         The language model used to tokenize the text.
@@ -27,6 +29,8 @@ def load_data(nlp, cue_verbs, poly):
         The list of all "cue verbs", which are verbs that often introduce reported speech.
     :param poly: sklearn.preprocessing.PolynomialFeatures
         If defined, used to perform feature extraction.
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        The store of the features. If None, the store of the features for author prediction is used.
     :return: np.array(dict), np.array(int), QuoteAttributionDataset
         * Array of dicts containing training and test quotes, respectively. Keys:
             * 'article': models.Article, the article containing the quote
@@ -35,8 +39,10 @@ def load_data(nlp, cue_verbs, poly):
             * 'author': list(list(int)), the indices of the tokens of the author of the quote.
         * The dataset
     """
-    train_dicts, _ = load_quote_authors(nlp)
-    author_prediction_dataset = AuthorPredictionDataset(train_dicts, cue_verbs, poly)
+    train_dicts, _ = load_quote_authors(nlp, lazy=True)
+    if feature_store is None:
+        feature_store = FeatureStore('author_prediction', cue_verbs, poly, nlp)
+    author_prediction_dataset = AuthorPredictionDataset(train_dicts, cue_verbs, poly, feature_store=feature_store)
     return np.array(train_dicts), author_prediction_dataset
 
 
@@ -117,83 +123,111 @@ def evaluate_author_prediction(loss, penalty, alpha, max_iter, nlp, cue_verbs, p
     train_author_set_results = Results()
     test_author_set_results = Results()
 
-    n = 0
-    for train_indices, test_indices in kf.split(article_dicts):
+    for n, (train_indices, test_indices) in enumerate(kf.split(article_dicts)):
         prefix = f'      Evaluating with alpha={alpha}: {int(100 * n / cv_folds)}% {10 * n // cv_folds * "█"}'.ljust(50)
-        n += 1
-
-        classifier = SGDClassifier(loss=loss, alpha=alpha, penalty=penalty, warm_start=True)
-
-        train_articles = article_dicts[train_indices]
-        train_ids = list(map(lambda a: a['article'].id, train_articles))
-
-        test_articles = article_dicts[test_indices]
-        test_ids = list(map(lambda a: a['article'].id, test_articles))
-
-        train_dataset = subset(author_prediction_dataset, train_ids)
-        test_dataset = subset(author_prediction_dataset, test_ids)
-
-        train_loader = author_prediction_loader(train_dataset, train=True, batch_size=10)
-        test_loader = author_prediction_loader(test_dataset, train=False, batch_size=len(test_dataset))
-
-        classifier, _ = train(classifier, train_loader, test_loader, max_iter, print_prefix=prefix)
-
-        train_loader = author_prediction_loader(train_dataset, train=False, batch_size=len(train_dataset))
-        train_results.add_scores(evaluate(classifier, train_loader))
-        test_results.add_scores(evaluate(classifier, test_loader))
-
-        train_people_cited_true_labels = []
-        train_people_cited_predicted_labels = []
-
-        for article in train_articles:
-            prediction_results = predict_authors(classifier, author_prediction_dataset, article['article'])
-            if prediction_results:
-                true_labels, predicted_labels = prediction_results
-                train_people_cited_true_labels += true_labels
-                train_people_cited_predicted_labels += predicted_labels
-
-        train_labels = zip(train_people_cited_true_labels, train_people_cited_predicted_labels)
-        accuracy = sum([true == predicted for true, predicted in train_labels]) / len(train_people_cited_true_labels)
-        precision, recall, f1, _ = precision_recall_fscore_support(train_people_cited_true_labels,
-                                                                   train_people_cited_predicted_labels,
-                                                                   zero_division=0,
-                                                                   average='binary')
-        train_people_cited_scores = {
-            'accuracy': accuracy,
-            'precision': precision,
-            'recall': recall,
-            'f1': f1,
-        }
+        fold_scores = author_prediction_fold(loss, penalty, alpha, max_iter, article_dicts[train_indices],
+                                             article_dicts[test_indices], author_prediction_dataset, prefix)
+        train_scores, test_scores, train_people_cited_scores, test_people_cited_scores = fold_scores
+        train_results.add_scores(train_scores)
+        test_results.add_scores(test_scores)
         train_author_set_results.add_scores(train_people_cited_scores)
-
-        test_people_cited_true_labels = []
-        test_people_cited_predicted_labels = []
-
-        for article in test_articles:
-            prediction_results = predict_authors(classifier, author_prediction_dataset, article['article'])
-            if prediction_results:
-                true_labels, predicted_labels = prediction_results
-                test_people_cited_true_labels += true_labels
-                test_people_cited_predicted_labels += predicted_labels
-
-        test_labels = zip(test_people_cited_true_labels, test_people_cited_predicted_labels)
-        accuracy = sum([true == predicted for true, predicted in test_labels]) / len(test_people_cited_true_labels)
-        precision, recall, f1, _ = precision_recall_fscore_support(test_people_cited_true_labels,
-                                                                   test_people_cited_predicted_labels,
-                                                                   zero_division=0,
-                                                                   average='binary')
-        test_people_cited_scores = {
-            'accuracy': accuracy,
-            'precision': precision,
-            'recall': recall,
-            'f1': f1,
-        }
         test_author_set_results.add_scores(test_people_cited_scores)
 
     return train_results, test_results, train_author_set_results, test_author_set_results
 
 
-def evaluate_author_prediction_test(loss, penalty, alpha, max_iter, nlp, cue_verbs, poly_degree):
+def author_prediction_fold(loss, penalty, alpha, max_iter, train_articles, test_articles, dataset, prefix=''):
+    """
+    Trains and evaluates the author prediction model on a single fold of cross-validation.
+
+    :param loss: string
+        One of {'log', 'hinge'}. The loss function to use.
+    :param penalty: string
+        One of {'l1', 'l2}. The penalty to use for training
+    :param alpha: float
+        The regularization to use for training
+    :param max_iter: int
+        The maximum number of epochs to train for
+    :param train_articles: np.array(dict)
+        The dicts of the articles used for training, as returned by load_data.
+    :param test_articles: np.array(dict)
+        The dicts of the articles used for testing, as returned by load_data.
+    :param dataset: AuthorPredictionDataset
+        The dataset containing the features of all articles.
+    :param prefix: String
+        The prefix to the string indicating the progression of the training
+    :return: dict, dict, dict, dict
+        The scores, as returned by evaluate, of predicting if each named entity is the quotee for a sentence or not on
+        the training and test sets, and of predicting if each person is cited in the article or not on the training
+        and test sets.
+    """
+    classifier = SGDClassifier(loss=loss, alpha=alpha, penalty=penalty, warm_start=True)
+
+    train_ids = list(map(lambda a: a['article'].id, train_articles))
+    test_ids = list(map(lambda a: a['article'].id, test_articles))
+
+    train_dataset = subset(dataset, train_ids)
+    test_dataset = subset(dataset, test_ids)
+
+    train_loader = author_prediction_loader(train_dataset, train=True, batch_size=10)
+    test_loader = author_prediction_loader(test_dataset, train=False, batch_size=len(test_dataset))
+
+    classifier, _ = train(classifier, train_loader, test_loader, max_iter, print_prefix=prefix)
+
+    train_loader = author_prediction_loader(train_dataset, train=False, batch_size=len(train_dataset))
+    train_scores = evaluate(classifier, train_loader)
+    test_scores = evaluate(classifier, test_loader)
+
+    train_people_cited_true_labels = []
+    train_people_cited_predicted_labels = []
+
+    for article in train_articles:
+        prediction_results = predict_authors(classifier, dataset, article['article'])
+        if prediction_results:
+            true_labels, predicted_labels = prediction_results
+            train_people_cited_true_labels += true_labels
+            train_people_cited_predicted_labels += predicted_labels
+
+    train_labels = zip(train_people_cited_true_labels, train_people_cited_predicted_labels)
+    accuracy = sum([true == predicted for true, predicted in train_labels]) / len(train_people_cited_true_labels)
+    precision, recall, f1, _ = precision_recall_fscore_support(train_people_cited_true_labels,
+                                                               train_people_cited_predicted_labels,
+                                                               zero_division=0,
+                                                               average='binary')
+    train_people_cited_scores = {
+        'accuracy': accuracy,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+    }
+
+    test_people_cited_true_labels = []
+    test_people_cited_predicted_labels = []
+
+    for article in test_articles:
+        prediction_results = predict_authors(classifier, dataset, article['article'])
+        if prediction_results:
+            true_labels, predicted_labels = prediction_results
+            test_people_cited_true_labels += true_labels
+            test_people_cited_predicted_labels += predicted_labels
+
+    test_labels = zip(test_people_cited_true_labels, test_people_cited_predicted_labels)
+    accuracy = sum([true == predicted for true, predicted in test_labels]) / len(test_people_cited_true_labels)
+    precision, recall, f1, _ = precision_recall_fscore_support(test_people_cited_true_labels,
+                                                               test_people_cited_predicted_labels,
+                                                               zero_division=0,
+                                                               average='binary')
+    test_people_cited_scores = {
+        'accuracy': accuracy,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+    }
+
+    return train_scores, test_scores, train_people_cited_scores, test_people_cited_scores
+
+
+def evaluate_author_prediction_test(loss, penalty, alpha, max_iter, nlp, cue_verbs, poly_degree, feature_store=None):
     """
     Trains an author prediction model on the whole training set, and evaluates it on the test set. Computes:
         * Accuracy in speaker prediction: given a named entity, the model tries to predict if that named entity is the
@@ -214,6 +248,8 @@ def evaluate_author_prediction_test(loss, penalty, alpha, max_iter, nlp, cue_ver
         The list of all "cue verbs", which are verbs that often introduce reported speech.
     :param poly_degree: int
         The degree to which polynomial feature expansion should be performed
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        If defined, the store of the features of the training articles.
     :return: SGDClassifier, Scoring.Results, Scoring.Results, Scoring.Results, Scoring.Results, list[dict]
         The results of of training
             * The trained model
@@ -229,7 +265,7 @@ def evaluate_author_prediction_test(loss, penalty, alpha, max_iter, nlp, cue_ver
     # Load Data
     poly = PolynomialFeatures(poly_degree, interaction_only=True, include_bias=True)
     train_dicts, test_dicts = load_quote_authors(nlp)
-    train_dataset = AuthorPredictionDataset(train_dicts, cue_verbs, poly)
+    train_dataset = AuthorPredictionDataset(train_dicts, cue_verbs, poly, feature_store=feature_store)
     train_loader = author_prediction_loader(train_dataset, train=True, batch_size=10)
     test_dataset = AuthorPredictionDataset(test_dicts, cue_verbs, poly)
     test_loader = author_prediction_loader(test_dataset, train=False, batch_size=len(test_dataset))
@@ -306,3 +342,40 @@ def evaluate_author_prediction_test(loss, penalty, alpha, max_iter, nlp, cue_ver
 
     return classifier, train_results, test_results, train_author_set_results, test_author_set_results,\
         test_authors_per_article
+
+
+def update_author_prediction(classifier, max_iter, nlp, cue_verbs, trained_snapshots, feature_store, replay=2,
+                             poly_degree=5):
+    """
+    Continues training an author prediction classifier on the training articles that were labeled or relabeled since
+    it was trained, along with a sample of the other training articles.
+
+    :param classifier: SGDClassifier
+        The trained classifier.
+    :param max_iter: int
+        The maximum number of epochs to train for
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param trained_snapshots: dict(int, string)
+        The snapshot of each article the classifier was trained on, as computed by the feature store.
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        The store of the features, which computes the snapshots of the articles.
+    :param replay: int
+        The number of articles the classifier was already trained on that are sampled for each new article.
+    :param poly_degree: int
+        The degree to which polynomial feature expansion should be performed
+    :return: SGDClassifier, list(int)
+        The classifier, and the ids of the new or relabeled articles. If there are none, the classifier isn't trained.
+    """
+    poly = PolynomialFeatures(poly_degree, interaction_only=True, include_bias=True)
+    article_dicts, author_prediction_dataset = load_data(nlp, cue_verbs, poly, feature_store=feature_store)
+    article_ids = [article_dict['article'].id for article_dict in article_dicts]
+    new_ids = [article_id for article_id in article_ids
+               if trained_snapshots.get(article_id) != feature_store.snapshots[article_id]]
+    if len(new_ids) > 0:
+        prefix = '      Updating Author Prediction Model'.ljust(50)
+        classifier, _ = incremental_train(classifier, author_prediction_dataset, subset, author_prediction_loader,
+                                          article_ids, new_ids, replay, max_iter, print_prefix=prefix)
+    return classifier, new_ids
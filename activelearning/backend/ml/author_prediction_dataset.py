@@ -1,6 +1,6 @@
-from torch.utils.data import Dataset, DataLoader, Subset
-from torch.utils.data.sampler import WeightedRandomSampler
+from backend.ml.batches import ArrayDataset, Subset, batch_loader
 
+from backend.ml.feature_expansion import expand_features
 from backend.ml.helpers import find_true_author_index
 from backend.ml.author_prediction_feature_extraction import *
 
@@ -27,17 +27,17 @@ def parse_article(article_dict, cue_verbs, poly=None):
     features = []
     speakers_in_article = article_dict['article'].people['mentions']
 
-    for i, speaker in enumerate(speakers_in_article):
-        speaker_features = attribution_features_baseline(
-            article_dict['article'],
-            article_dict['sentences'],
-            article_dict['quotes'],
-            speaker,
-            speakers_in_article[:i] + speakers_in_article[i + 1:],
-            cue_verbs
-        )
-        if poly:
-            speaker_features = poly.fit_transform(speaker_features.reshape((-1, 1))).reshape((-1,))
+    speakers_features = attribution_feature_matrix(
+        article_dict['article'].sentences_array().tolist(),
+        article_dict['article'].in_quotes_array().tolist(),
+        article_dict['sentences'],
+        article_dict['quotes'],
+        speakers_in_article,
+        cue_verbs
+    )
+    if poly:
+        speakers_features = expand_features(speakers_features, poly)
+    for speaker_features in speakers_features:
         features.append(
             speaker_features
         )
@@ -55,10 +55,10 @@ def parse_article(article_dict, cue_verbs, poly=None):
     return features, labels, len(speakers_in_article)
 
 
-class AuthorPredictionDataset(Dataset):
+class AuthorPredictionDataset(ArrayDataset):
     """ Dataset comprised of labeled articles, with features extracted for quote attribution """
 
-    def __init__(self, article_dicts, cue_verbs, poly=None):
+    def __init__(self, article_dicts, cue_verbs, poly=None, feature_store=None):
         """
         Initializes the dataset.
 
@@ -72,40 +72,27 @@ class AuthorPredictionDataset(Dataset):
             The list of all "cue verbs", which are verbs that often introduce reported speech.
         :param poly: sklearn.preprocessing.PolynomialFeatures
             If defined, used for feature expansion.
+        :param feature_store: backend.ml.feature_store.FeatureStore
+            If defined, the store from which the features of articles are loaded, and in which they are stored when
+            they are extracted.
         """
-        self.features = []
-        self.labels = []
-
-        # Keys: article id
-        # Values: first feature in the article
-        #         last feature in the article
-        #         number of speakers in the article
-        self.article_features = {}
-
-        for a_dict in article_dicts:
-            article_features, article_labels, article_speakers = parse_article(a_dict, cue_verbs, poly=poly)
-            first_feature = len(self.features)
-            self.features += article_features
-            last_feature = len(self.features) - 1
-            self.labels += article_labels
-            self.article_features[a_dict['article'].id] = (first_feature, last_feature, article_speakers)
-
-        self.feature_dimensionality = self.features[0].shape
-        self.length = len(self.features)
-
-    def __getitem__(self, index):
-        """
-        Finds the item at a given index of the dataset.
+        # The features of each article are stored in the matrix as soon as they are extracted. There is a datapoint
+        # for each speaker in the article.
+        self.allocate_articles([a_dict['article'].id for a_dict in article_dicts],
+                               [len(a_dict['article'].people['mentions']) for a_dict in article_dicts])
 
-        :param index: int.
-            The index at which we want the data.
-        :return: np.array, np.array
-            The features and label for the datapoint
-        """
-        return self.features[index], self.labels[index]
+        for index, a_dict in enumerate(article_dicts):
+            def extract():
+                return parse_article(a_dict, cue_verbs, poly=poly)
 
-    def __len__(self):
-        return self.length
+            if feature_store is None:
+                article_features, article_labels, _ = extract()
+            else:
+                article_features, article_labels, _ = feature_store.article_features(
+                    a_dict['article'], [a_dict['quotes'], a_dict['authors']], extract)
+            self.fill_article(index, article_features, article_labels)
+
+        self.feature_dimensionality = self.features.shape[1:]
 
     def get_article_indices(self, article_id):
         """
@@ -116,8 +103,7 @@ class AuthorPredictionDataset(Dataset):
         :return: list(int)
             All indices containing features for this article
         """
-        start, end, _ = self.article_features[article_id]
-        return list(range(start, end + 1))
+        return list(range(*self.article_range(article_id)))
 
     def get_article_features(self, article_id):
         """
@@ -129,7 +115,8 @@ class AuthorPredictionDataset(Dataset):
             The first two values are the first and last index containing a feature for this article. The last one is the
             number of potential quote authors in the article.
         """
-        return self.article_features[article_id]
+        start, end = self.article_range(article_id)
+        return start, end - 1, end - start
 
 
 def subset(dataset, article_indices):
@@ -142,35 +129,7 @@ def subset(dataset, article_indices):
         The indices of the articles to keep in the subset.
     :return:
     """
-    indices = []
-    for a_id in article_indices:
-        indices += dataset.get_article_indices(a_id)
-    return Subset(dataset, indices)
-
-
-def sampler_weights(dataset):
-    """
-    Computes the weights that need to be given to each index in the dataset for random sampling.
-
-    :param dataset: Dataset
-        The dataset to find the weights for
-    :return: list(float), int
-        The weights for each index in the dataset and the total number of samples in an epoch.
-    """
-    class_counts = [0, 0]
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        class_counts[label] += 1
-
-    divisor = 2 * class_counts[0] * class_counts[1]
-    sample_weights = (class_counts[1] / divisor, class_counts[0] / divisor)
-    weights = []
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        weights.append(sample_weights[label])
-
-    num_samples = 2 * min(class_counts[0], class_counts[1])
-    return weights, num_samples
+    return Subset(dataset, dataset.article_indices(article_indices))
 
 
 def author_prediction_loader(dataset, train=True, batch_size=None):
@@ -184,14 +143,7 @@ def author_prediction_loader(dataset, train=True, batch_size=None):
         Whether to load a training or testing dataloader.
     :param batch_size: int.
         The batch size. The default is None, where the batch size is the size of the data.
-    :return: torch.utils.data.DataLoader
-        DataLoader for quote detection.
+    :return: backend.ml.batches.BatchLoader
+        The loader of batches of the dataset.
     """
-    if batch_size is None:
-        batch_size = len(dataset)
-    if train:
-        weights, num_samples = sampler_weights(dataset)
-        sampler = WeightedRandomSampler(weights=weights, num_samples=num_samples, replacement=True)
-        return DataLoader(dataset=dataset, batch_size=batch_size, sampler=sampler)
-    else:
-        return DataLoader(dataset=dataset, batch_size=batch_size, shuffle=False)
+    return batch_loader(dataset, train, batch_size)
@@ -1,5 +1,16 @@
 import numpy as np
+from spacy.attrs import LEMMA, DEP
+
 from backend.ml.quote_attribution_feature_extraction import speaker_information, speaker_information_no_db
+from backend.ml.quote_detection_feature_extraction import SENTENCE_ATTRIBUTES, sentence_arrays
+
+
+""" The number of features extracted for each speaker. """
+N_ATTRIBUTION_FEATURES = 20
+
+
+""" The distance to the closest reported speech when there is none. """
+NO_RS_DISTANCE = 100
 
 
 def attribution_features_baseline(article, sentences, quotes, speaker, other_speakers, cue_verbs):
@@ -73,7 +84,7 @@ def attribution_features_baseline(article, sentences, quotes, speaker, other_spe
         return 0
 
     def speaker_in_quotes():
-        return article.in_quotes['in_quotes'][speaker_first_token_index] == 1
+        return article.in_quotes_array()[speaker_first_token_index] == 1
 
     def rs_before_speaker():
         if len(quotes) == 0:
@@ -246,10 +257,10 @@ def attribution_features_baseline_no_db(sentence_indices, in_quotes, sentences,
         * Number of other speakers within 6 sentences below it
 
     :param sentence_indices: list(int)
-        The index of the first token of each sentence in the article, as in article.sentences['sentences']
+        The index of the first token of each sentence in the article, as in article.sentences_array()
     :param in_quotes: list(int):
         List of boolean values indicating whether each token in the article is in between quotes or not, as in
-        article.in_quotes['in_quotes']
+        article.in_quotes_array()
     :param sentences: list(spaCy.Doc)
         the spaCy.Doc for each sentence in the article.
     :param quotes: list(int)
@@ -434,3 +445,157 @@ def attribution_features_baseline_no_db(sentence_indices, in_quotes, sentences,
         speakers_n_above(6),
         speakers_n_below(6),
     ])
+
+
+def prefix_mask(mask):
+    """
+    Keeps, in each row of a boolean matrix, only the values that are true before the first false value of the row.
+
+    :param mask: np.array
+        The boolean matrix.
+    :return: np.array
+        The boolean matrix of values in the true prefix of each row.
+    """
+    return np.cumprod(mask, axis=1).astype(bool)
+
+
+def suffix_mask(mask):
+    """
+    Keeps, in each row of a boolean matrix, only the values that are true after the last false value of the row.
+
+    :param mask: np.array
+        The boolean matrix.
+    :return: np.array
+        The boolean matrix of values in the true suffix of each row.
+    """
+    return prefix_mask(mask[:, ::-1])[:, ::-1]
+
+
+def attribution_feature_matrix(sentence_indices, in_quotes, sentences, quotes, speakers, cue_verbs):
+    """
+    Computes the same features as attribution_features_baseline_no_db for all speakers of an article at once, the
+    i-th speaker being compared to all the other speakers. The sentence containing each speaker is only looked up once,
+    and the speakers are compared to each other and to the quotes with NumPy, instead of looping over the sentences and
+    the other speakers for each speaker.
+
+    The features are identical to the ones of attribution_features_baseline_no_db, including in the way the quotes and
+    the other speakers are scanned in the order in which they are given.
+
+    :param sentence_indices: list(int)
+        The index of the last token of each sentence in the article, as in article.sentences_array()
+    :param in_quotes: list(int):
+        List of boolean values indicating whether each token in the article is in between quotes or not, as in
+        article.in_quotes_array()
+    :param sentences: list(spaCy.Doc)
+        the spaCy.Doc for each sentence in the article.
+    :param quotes: list(int)
+        The indices of sentences that are quotes in the article.
+    :param speakers: list(dict)
+        All speakers in the article. Have keys 'name', 'full_name', 'start', 'end', as described in the database.
+    :param cue_verbs: list(string).
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :return: np.array
+        The features extracted, with one row per speaker.
+    """
+    n_speakers = len(speakers)
+    if n_speakers == 0:
+        return np.zeros((0, N_ATTRIBUTION_FEATURES), dtype=int)
+
+    # Sentence features
+    strings = sentences[0].vocab.strings
+    tokens, token_sentences = sentence_arrays(sentences)
+    lemma = tokens[:, SENTENCE_ATTRIBUTES.index(LEMMA)]
+    dep = tokens[:, SENTENCE_ATTRIBUTES.index(DEP)]
+
+    def sentence_contains(token_values):
+        return np.bincount(token_sentences, weights=token_values, minlength=len(sentences)) > 0
+
+    cue_verb_hashes = np.array([strings[v] for v in cue_verbs], dtype=tokens.dtype)
+    sentence_cue_verb = sentence_contains(np.isin(lemma, cue_verb_hashes))
+    sentence_parataxis = sentence_contains(dep == strings['parataxis'])
+
+    # The sentence containing each speaker and the index of its first token, as in speaker_information_no_db
+    speaker_starts = np.array([speaker['start'] for speaker in speakers])
+    speaker_ends = np.array([speaker['end'] for speaker in speakers])
+    sentence_ends = np.array(sentence_indices, dtype=int)
+    speaker_sentences = np.searchsorted(sentence_ends, speaker_ends, side='left')
+    first_tokens = np.concatenate([[0], sentence_ends + 1])[speaker_sentences]
+
+    # The tokens of each speaker, indexed in their sentence's doc as in attribution_features_baseline_no_db
+    speaker_lengths = speaker_ends - speaker_starts + 1
+    token_speakers = np.repeat(np.arange(n_speakers), speaker_lengths)
+    absolute = np.arange(len(token_speakers)) - np.repeat(np.cumsum(speaker_lengths) - speaker_lengths,
+                                                          speaker_lengths) + speaker_starts[token_speakers]
+    relative = absolute - first_tokens[token_speakers]
+    sentence_lengths = np.array([len(sentence) for sentence in sentences])
+    token_sentence_lengths = sentence_lengths[speaker_sentences[token_speakers]]
+    if np.any(relative >= token_sentence_lengths) or np.any(relative < -token_sentence_lengths):
+        raise IndexError('speaker token out of the range of its sentence')
+    relative = np.where(relative < 0, relative + token_sentence_lengths, relative)
+    doc_offsets = np.concatenate([[0], np.cumsum(sentence_lengths)])
+    speaker_dep = dep[doc_offsets[speaker_sentences[token_speakers]] + relative]
+
+    def speaker_contains(token_values):
+        return np.bincount(token_speakers, weights=token_values, minlength=n_speakers) > 0
+
+    # Quotes around each speaker, scanned in the given order
+    s = speaker_sentences[:, None]
+    q = np.array(quotes, dtype=int).reshape((1, -1))
+    n_quotes = q.shape[1]
+    quotes_above = prefix_mask(q < s)
+    quotes_below = suffix_mask(q > s)
+    n_quotes_above = quotes_above.sum(axis=1)
+    n_quotes_below = quotes_below.sum(axis=1)
+    # A closest quote in the first sentence is treated as if there was none, as in the original features.
+    closest_above = np.concatenate([[0], q[0]])[n_quotes_above]
+    closest_below = np.concatenate([q[0], [0]])[np.where(n_quotes_below > 0, n_quotes - n_quotes_below, n_quotes)]
+    has_above = closest_above != 0
+    has_below = closest_below != 0
+    if n_quotes > 0:
+        rs_before = q[0, 0] < speaker_sentences
+        rs_after = q[0, -1] > speaker_sentences
+    else:
+        rs_before = rs_after = np.zeros(n_speakers, dtype=bool)
+
+    # Other speakers around each speaker, scanned in the given order without the speaker itself
+    o = speaker_sentences[None, :]
+    itself = np.eye(n_speakers, dtype=bool)
+    speakers_above = prefix_mask((o < s) | itself) & ~itself
+    speakers_below = suffix_mask((o > s) | itself) & ~itself
+    between_above = ((closest_above[:, None] <= o) & (o < s) & ~itself).sum(axis=1)
+    between_below = ((closest_below[:, None] >= o) & (o > s) & ~itself).sum(axis=1)
+
+    def quotes_n_above(n):
+        return (quotes_above & (s - q <= n)).sum(axis=1)
+
+    def quotes_n_below(n):
+        return (quotes_below & (q - s <= n)).sum(axis=1)
+
+    def speakers_n_above(n):
+        return (speakers_above & (s - o <= n)).sum(axis=1)
+
+    def speakers_n_below(n):
+        return (speakers_below & (o - s <= n)).sum(axis=1)
+
+    return np.column_stack([
+        speaker_contains(speaker_dep == strings['nsubj']),
+        speaker_contains(speaker_dep == strings['obj']),
+        sentence_cue_verb[speaker_sentences],
+        np.isin(speaker_sentences, q),
+        sentence_parataxis[speaker_sentences],
+        np.array(in_quotes)[first_tokens] == 1,
+        rs_before,
+        rs_after,
+        np.where(has_above, speaker_sentences - closest_above, NO_RS_DISTANCE),
+        np.where(has_below, closest_below - speaker_sentences, NO_RS_DISTANCE),
+        np.where(has_above, between_above, 0),
+        np.where(has_below, between_below, 0),
+        quotes_n_above(3),
+        quotes_n_below(3),
+        quotes_n_above(6),
+        quotes_n_below(6),
+        speakers_n_above(3),
+        speakers_n_below(3),
+        speakers_n_above(6),
+        speakers_n_below(6),
+    ]).astype(int)
@@ -2,7 +2,7 @@ import numpy as np
 from sklearn.metrics import precision_recall_fscore_support
 
 from backend.db_management import load_labeled_articles, load_quote_authors
-from backend.helpers import aggregate_label
+from backend.helpers import load_consensus
 from backend.ml.helpers import find_true_author_index, extract_speaker_names, evaluate_speaker_extraction
 from backend.ml.scoring import Results
 
@@ -80,15 +80,17 @@ def baseline_quote_detection(nlp):
     y = []
     y_pred = []
     train_articles, train_sentences, _, _ = load_labeled_articles(nlp)
+    consensus = load_consensus(train_articles)
     for index, article in enumerate(train_articles):
         article_sentences = train_sentences[index]
         sentence_start = 0
-        for sentence_index, end in enumerate(article.sentences['sentences']):
-            sentence_labels, sentence_authors, _ = aggregate_label(article, sentence_index)
+        article_in_quotes = article.in_quotes_array().tolist()
+        for sentence_index, end in enumerate(article.sentences_array().tolist()):
+            sentence_labels, sentence_authors, _ = consensus[article.id][sentence_index]
             true_value = int(sum(sentence_labels) > 0)
             y.append(true_value)
 
-            in_quotes = article.in_quotes['in_quotes'][sentence_start:end + 1]
+            in_quotes = article_in_quotes[sentence_start:end + 1]
             prediction = predict_sentence(article_sentences[sentence_index], in_quotes)
             y_pred.append(prediction)
 
@@ -305,12 +307,13 @@ def baseline_quote_attribution(nlp, cue_verbs, test=False):
         
     for i, article_dict in enumerate(data_dicts):
         mentions = article_dict['article'].people['mentions']
-        sentence_ends = article_dict['article'].sentences['sentences']
+        sentence_ends = article_dict['article'].sentences_array().tolist()
+        article_in_quotes = article_dict['article'].in_quotes_array().tolist()
         sentence_starts = [0] + [s_end + 1 for s_end in sentence_ends][:-1]
         sentence_edges = zip(sentence_starts, sentence_ends)
         in_quotes = []
         for start, end in sentence_edges:
-            in_quotes.append(article_dict['article'].in_quotes['in_quotes'][start:end + 1])
+            in_quotes.append(article_in_quotes[start:end + 1])
 
         article_labels = []
         article_predictions = []
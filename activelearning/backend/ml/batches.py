@@ -0,0 +1,259 @@
+import math
+
+import numpy as np
+
+""" File containing the loading of batches of feature vectors and labels to train and evaluate models. """
+
+
+""" The type of the features of datasets. """
+FEATURE_TYPE = np.float32
+
+
+class ArrayDataset:
+    """
+    Dataset whose feature vectors are the rows of a single matrix, and whose labels are a single array. The
+    datapoints of each article are contiguous, and the offsets of the articles give where they start and end.
+    """
+
+    def allocate_articles(self, article_ids, counts):
+        """
+        Allocates the array of labels for the datapoints of all articles, which are then filled article by article
+        with fill_article. The matrix of features is allocated when the first datapoints are filled, as the number of
+        features is only known once they are extracted.
+
+        :param article_ids: list(int)
+            The id of each article, in the order in which their datapoints are stored.
+        :param counts: list(int)
+            The number of datapoints of each article.
+        """
+        # The datapoints of article i are at rows offsets[i] to offsets[i + 1] (excluded).
+        self.offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64)
+        self.article_positions = {article_id: position for position, article_id in enumerate(article_ids)}
+        self.features = np.empty((self.offsets[-1], 0), dtype=FEATURE_TYPE)
+        self.labels = np.empty(self.offsets[-1], dtype=np.int64)
+
+    def fill_article(self, position, features, labels):
+        """
+        Copies the datapoints of an article in the rows allocated for it.
+
+        :param position: int
+            The position of the article in the ids given to allocate_articles.
+        :param features: list(np.array)
+            The feature vectors of the datapoints of the article.
+        :param labels: list(int)
+            The labels of the datapoints of the article.
+        """
+        if len(labels) == 0:
+            return
+        if self.features.shape[1] == 0:
+            self.features = np.empty((self.offsets[-1], len(features[0])), dtype=FEATURE_TYPE)
+        start, end = self.offsets[position], self.offsets[position + 1]
+        self.features[start:end] = features
+        self.labels[start:end] = labels
+
+    def set_articles(self, article_ids, article_features, article_labels):
+        """
+        Fills the matrix of features and the array of labels with the datapoints of all articles.
+
+        :param article_ids: list(int)
+            The id of each article, in the order in which their datapoints are stored.
+        :param article_features: list(list(np.array))
+            The feature vectors of the datapoints of each article.
+        :param article_labels: list(list(int))
+            The labels of the datapoints of each article.
+        """
+        self.allocate_articles(article_ids, [len(labels) for labels in article_labels])
+        for position, (features, labels) in enumerate(zip(article_features, article_labels)):
+            self.fill_article(position, features, labels)
+
+    def __getitem__(self, index):
+        """
+        Finds the item at a given index of the dataset.
+
+        :param index: int.
+            The index at which we want the data.
+        :return: np.array, int
+            The features and label for the datapoint
+        """
+        return self.features[index], self.labels[index]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def article_range(self, article_id):
+        """
+        :param article_id: int
+            The id of an article of the dataset.
+        :return: int, int
+            The index of the first datapoint of the article, and the index after its last datapoint.
+        """
+        position = self.article_positions[article_id]
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def article_indices(self, article_ids):
+        """
+        :param article_ids: list(int)
+            The ids of some articles of the dataset.
+        :return: np.array
+            The indices of all datapoints of the articles, in the order of the articles.
+        """
+        positions = np.array([self.article_positions[article_id] for article_id in article_ids], dtype=np.int64)
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        # Concatenates the ranges of the articles: the k-th datapoint of an article is at its start + k.
+        range_starts = np.cumsum(lengths) - lengths
+        return np.repeat(starts - range_starts, lengths) + np.arange(lengths.sum(), dtype=np.int64)
+
+    def arrays(self):
+        """
+        :return: np.array, np.array
+            The features of all datapoints as a matrix, with a row for each datapoint, and their labels.
+        """
+        return self.features, self.labels
+
+    def rows(self):
+        """
+        :return: np.array, np.array, np.array
+            The matrix of features and the array of labels in which the datapoints are stored, and the indices of the
+            datapoints in them, or None if all rows are datapoints.
+        """
+        return self.features, self.labels, None
+
+
+class Subset:
+    """ The datapoints of a dataset at some indices, which aren't copied. """
+
+    def __init__(self, dataset, indices):
+        """
+        :param dataset: ArrayDataset
+            The whole dataset.
+        :param indices: list(int)
+            The indices of the datapoints of the subset in the whole dataset.
+        """
+        self.dataset = dataset
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    def __getitem__(self, index):
+        return self.dataset[self.indices[index]]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def rows(self):
+        """
+        :return: np.array, np.array, np.array
+            The matrix of features and the array of labels in which the datapoints are stored, and the indices of the
+            datapoints in them, or None if all rows are datapoints. If the datapoints of the subset are contiguous,
+            the matrix and array are views of the rows of the subset.
+        """
+        features, labels = self.dataset.arrays()
+        if len(self.indices) > 0 and np.all(np.diff(self.indices) == 1):
+            start, end = self.indices[0], self.indices[-1] + 1
+            return features[start:end], labels[start:end], None
+        return features, labels, self.indices
+
+    def arrays(self):
+        """
+        :return: np.array, np.array
+            The features of the datapoints of the subset as a matrix, and their labels. They are only copied if the
+            datapoints aren't contiguous in the dataset.
+        """
+        features, labels, indices = self.rows()
+        if indices is None:
+            return features, labels
+        return features[indices], labels[indices]
+
+
+def balanced_weights(labels):
+    """
+    Computes the weights that need to be given to each datapoint so that datapoints of classes 0 and 1 are sampled as
+    often. Datapoints of other classes are never sampled.
+
+    :param labels: np.array
+        The label of each datapoint.
+    :return: np.array, int
+        The probability of sampling each datapoint, and the number of samples in an epoch.
+    """
+    class_counts = np.bincount(labels, minlength=2)
+    n_negative, n_positive = int(class_counts[0]), int(class_counts[1])
+    divisor = 2 * n_negative * n_positive
+    class_weights = np.zeros(len(class_counts))
+    class_weights[:2] = n_positive / divisor, n_negative / divisor
+    weights = class_weights[labels]
+    return weights / weights.sum(), 2 * min(n_negative, n_positive)
+
+
+class BatchLoader:
+    """
+    Iterates over batches of a matrix of features and an array of labels. If sampling weights are given, each epoch
+    draws its datapoints at random, with replacement, in a single vectorized operation. Otherwise, all datapoints are
+    loaded in order. Only the datapoints of each batch are copied.
+    """
+
+    def __init__(self, features, labels, batch_size, weights=None, num_samples=None, indices=None):
+        """
+        :param features: np.array
+            The features of the datapoints, with a row for each datapoint.
+        :param labels: np.array
+            The label of each datapoint.
+        :param batch_size: int
+            The number of datapoints in each batch.
+        :param weights: np.array
+            If defined, the probability of sampling each datapoint.
+        :param num_samples: int
+            The number of datapoints sampled in each epoch, if weights are defined.
+        :param indices: np.array
+            If defined, the rows of features and labels that are datapoints. Weights are given for each of them.
+        """
+        self.features = features
+        self.labels = labels
+        self.indices = indices
+        self.batch_size = max(batch_size, 1)
+        self.weights = weights
+        self.n_datapoints = len(labels) if indices is None else len(indices)
+        self.num_samples = self.n_datapoints if weights is None else num_samples
+
+    def __len__(self):
+        return math.ceil(self.num_samples / self.batch_size)
+
+    def __iter__(self):
+        if self.weights is None:
+            for start in range(0, self.num_samples, self.batch_size):
+                if self.indices is None:
+                    yield self.features[start:start + self.batch_size], self.labels[start:start + self.batch_size]
+                else:
+                    batch = self.indices[start:start + self.batch_size]
+                    yield self.features[batch], self.labels[batch]
+        else:
+            samples = np.random.choice(self.n_datapoints, size=self.num_samples, replace=True, p=self.weights)
+            if self.indices is not None:
+                samples = self.indices[samples]
+            for start in range(0, self.num_samples, self.batch_size):
+                batch = samples[start:start + self.batch_size]
+                yield self.features[batch], self.labels[batch]
+
+
+def batch_loader(dataset, train=True, batch_size=None, weights=balanced_weights):
+    """
+    Creates a loader of batches of a dataset. For training, datapoints are sampled so that, on average, half of them
+    belong to each class.
+
+    :param dataset: ArrayDataset or Subset
+        The dataset from which to load data.
+    :param train: boolean
+        Whether to load a training or testing loader.
+    :param batch_size: int.
+        The batch size. The default is None, where the batch size is the size of the data.
+    :param weights: function
+        The function computing the sampling weights and the number of samples in an epoch from the labels.
+    :return: BatchLoader
+        The loader of batches of the dataset.
+    """
+    features, labels, indices = dataset.rows()
+    if batch_size is None:
+        batch_size = len(dataset)
+    if train:
+        sample_weights, num_samples = weights(labels if indices is None else labels[indices])
+        return BatchLoader(features, labels, batch_size, sample_weights, num_samples, indices)
+    else:
+        return BatchLoader(features, labels, batch_size, indices=indices)
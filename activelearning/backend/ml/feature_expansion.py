@@ -0,0 +1,53 @@
+import functools
+
+import numpy as np
+from sklearn.preprocessing import PolynomialFeatures
+
+"""
+File containing the polynomial expansion of feature vectors. Each element of a feature vector is expanded on its own,
+as if the vector was a column of samples with a single feature, so the expansion of a vector is the same as
+poly.fit_transform(vector.reshape((-1, 1))).reshape((-1,)). The expansion is applied to all feature vectors at once.
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def element_powers(degree, interaction_only, include_bias):
+    """
+    Fits a polynomial expansion once for each set of parameters.
+
+    :param degree: int
+        The degree of the expansion.
+    :param interaction_only: boolean
+        Whether the expansion only contains products of distinct features.
+    :param include_bias: boolean
+        Whether the expansion contains a bias column.
+    :return: tuple(int)
+        The power of the element in each column of the expansion of a single element.
+    """
+    poly = PolynomialFeatures(degree, interaction_only=interaction_only, include_bias=include_bias)
+    return tuple(int(power) for power in poly.fit(np.zeros((1, 1))).powers_[:, 0])
+
+
+def expand_features(features, poly):
+    """
+    Applies a polynomial expansion to each element of some feature vectors.
+
+    :param features: np.array
+        A feature vector, or a matrix with a feature vector in each row.
+    :param poly: sklearn.preprocessing.PolynomialFeatures
+        The parameters of the expansion. It doesn't need to be fitted.
+    :return: np.array
+        The expanded features, with the same number of dimensions. The expansion of the i-th element of a vector is
+        at columns i * k to (i + 1) * k (excluded), where k is the number of columns of the expansion of an element.
+    """
+    features = np.asarray(features)
+    if not np.issubdtype(features.dtype, np.floating):
+        features = features.astype(np.float64)
+    powers = element_powers(poly.degree, poly.interaction_only, poly.include_bias)
+    # The successive powers are computed as products, in the same order as PolynomialFeatures, so that the expanded
+    # features are exactly the same.
+    element_power = [np.ones_like(features)]
+    for _ in range(max(powers)):
+        element_power.append(element_power[-1] * features)
+    expanded = np.stack([element_power[power] for power in powers], axis=-1)
+    return expanded.reshape(features.shape[:-1] + (features.shape[-1] * len(powers),))
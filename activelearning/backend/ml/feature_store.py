@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+
+from django.conf import settings
+import numpy as np
+
+from backend.atomic_files import write_atomic
+from backend.doc_cache import model_version, text_hash
+from backend.ml.batches import FEATURE_TYPE
+
+"""
+File containing the store of the features extracted from each article. The features of an article are only extracted
+again when the article, its labels or the extraction parameters change.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+""" The default directory of the store, which can be overridden with FEATURE_STORE_DIR in the settings. """
+path_feature_store = 'data/feature_store'
+
+
+""" The version of the stored features. Increasing it invalidates all stored features, for example when the feature
+extraction changes. """
+STORE_VERSION = 2
+
+
+def store_directory():
+    """
+    :return: string.
+        The directory of the store described by the FEATURE_STORE_DIR setting.
+    """
+    return getattr(settings, 'FEATURE_STORE_DIR', path_feature_store)
+
+
+def hash_json(value):
+    """
+    :param value: object.
+        A value that can be serialized to JSON.
+    :return: string.
+        The hash of the value.
+    """
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def poly_key(poly):
+    """
+    :param poly: sklearn.preprocessing.PolynomialFeatures
+        The feature expansion, or None.
+    :return: string.
+        A description of the feature expansion.
+    """
+    if poly is None:
+        return 'poly0'
+    return f'poly{poly.degree}{"i" if poly.interaction_only else ""}{"b" if poly.include_bias else ""}'
+
+
+class FeatureStore:
+    """
+    Stores the features and labels extracted from each article in a .npz file. Each set of features is stored in its
+    own directory, named after the extraction method, the feature expansion, the cue verbs and the language model.
+    The file of an article is in a directory named after its id, and is named after a snapshot of its text and labels,
+    so newly labeled articles are simply added to the store, and the features of relabeled articles are extracted
+    again.
+    """
+
+    def __init__(self, extraction_method, cue_verbs, poly=None, nlp=None, directory=None):
+        """
+        :param extraction_method: string.
+            The name of the features, which must identify the method used to extract them.
+        :param cue_verbs: list(string)
+            The list of all "cue verbs", which are verbs that often introduce reported speech.
+        :param poly: sklearn.preprocessing.PolynomialFeatures
+            If defined, the feature expansion applied to the features.
+        :param nlp: spaCy.Language
+            If defined, the language model used to process the articles.
+        :param directory: string.
+            The directory of the store. If None, the directory of the settings is used.
+        """
+        if directory is None:
+            directory = store_directory()
+        name = [extraction_method, poly_key(poly), f'cue{hash_json(sorted(cue_verbs))[:12]}', f'v{STORE_VERSION}']
+        if nlp is not None:
+            name.append(model_version(nlp))
+        self.directory = os.path.join(directory, '-'.join(name))
+        # The number of articles whose features were loaded from the store and extracted, respectively.
+        self.hits = 0
+        self.misses = 0
+        # The snapshot of each article whose features were loaded or extracted.
+        self.snapshots = {}
+
+    def snapshot(self, article, labels):
+        """
+        :param article: models.Article.
+            The article.
+        :param labels: object.
+            The labels of the article used to extract its features, which must be serializable to JSON.
+        :return: string.
+            The hash of the text and labels of the article, which changes when its features need to be extracted again.
+        """
+        return hash_json([text_hash(article.text), labels])
+
+    def article_path(self, article, labels):
+        """
+        :param article: models.Article.
+            The article.
+        :param labels: object.
+            The labels of the article used to extract its features, which must be serializable to JSON.
+        :return: string.
+            The file in which the features of the article are stored.
+        """
+        return os.path.join(self.directory, str(article.id), f'{self.snapshot(article, labels)}.npz')
+
+    def load(self, article, labels):
+        """
+        :param article: models.Article.
+            The article.
+        :param labels: object.
+            The labels of the article used to extract its features, which must be serializable to JSON.
+        :return: tuple
+            The features of the article as a matrix and its labels, followed by the other values returned when they
+            were extracted, or None if they aren't stored.
+        """
+        path = self.article_path(article, labels)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return (data['features'], data['labels'].tolist()) + tuple(data['info'].tolist())
+        except Exception:
+            logger.warning(f'Could not load the features of article {article.id} from {path}', exc_info=True)
+            return None
+
+    def save(self, article, labels, extracted):
+        """
+        Stores the features of an article, and removes the features stored for previous snapshots of the article.
+        Failing to write the store only means that the features will be extracted again.
+
+        :param article: models.Article.
+            The article.
+        :param labels: object.
+            The labels of the article used to extract its features, which must be serializable to JSON.
+        :param extracted: tuple
+            The features and labels of the article, followed by other integers returned when they were extracted.
+        """
+        path = self.article_path(article, labels)
+        features, article_labels, info = extracted[0], extracted[1], extracted[2:]
+
+        def write(f):
+            np.savez(f, features=np.array(features, dtype=FEATURE_TYPE),
+                     labels=np.array(article_labels, dtype=np.int64), info=np.array(info, dtype=np.int64))
+
+        try:
+            # Only the directory of the article is pruned, however large the store is.
+            write_atomic(path, write, prune=True)
+        except OSError:
+            logger.warning(f'Could not store the features of article {article.id} in {path}', exc_info=True)
+
+    def article_features(self, article, labels, extract):
+        """
+        Loads the features of an article from the store, or extracts and stores them if they aren't stored.
+
+        :param article: models.Article.
+            The article.
+        :param labels: object.
+            The labels of the article used to extract its features, which must be serializable to JSON.
+        :param extract: function
+            The function, without parameters, that extracts the features of the article. It returns the features
+            and labels of the article, possibly followed by integers.
+        :return: tuple
+            The values returned by extract.
+        """
+        self.snapshots[article.id] = self.snapshot(article, labels)
+        stored = self.load(article, labels)
+        if stored is not None:
+            self.hits += 1
+            return stored
+        self.misses += 1
+        extracted = extract()
+        self.save(article, labels, extracted)
+        return extracted
@@ -0,0 +1,138 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import multiprocessing
+import zlib
+
+import numpy as np
+from django.db import connections
+from sklearn.model_selection import KFold
+from sklearn.preprocessing import PolynomialFeatures
+
+from backend.ml import author_prediction, quote_detection
+from backend.ml.quote_detection_dataset import detection_loader, subset
+from backend.ml.scoring import Results
+from backend.ml.sgd import cross_validation_fold
+
+"""
+File containing the evaluation of models for many hyperparameters at once. Each fold of cross-validation of each
+configuration is trained in its own process, and the results are merged in the same order as a serial evaluation.
+"""
+
+
+""" The models that can be evaluated. """
+QUOTE_DETECTION = 'quote_detection'
+AUTHOR_PREDICTION = 'author_prediction'
+
+
+""" A configuration of hyperparameters of a model. """
+Configuration = namedtuple('Configuration', ['model', 'loss', 'penalty', 'alpha'])
+
+
+""" The datasets prepared for each model, which are inherited by the worker processes when they are forked. """
+_datasets = {}
+
+
+def prepare_datasets(models, nlp, cue_verbs, exp_degree):
+    """
+    Loads the datasets of the models once, before the worker processes are created.
+
+    :param models: list(string)
+        The models that are evaluated.
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param exp_degree: int
+        The degree of feature expansion for author prediction.
+    """
+    _datasets.clear()
+    if QUOTE_DETECTION in models:
+        poly = PolynomialFeatures(2, interaction_only=True, include_bias=True)
+        _datasets[QUOTE_DETECTION] = quote_detection.load_data(nlp, cue_verbs, poly)
+    if AUTHOR_PREDICTION in models:
+        poly = PolynomialFeatures(exp_degree, interaction_only=True, include_bias=True)
+        _datasets[AUTHOR_PREDICTION] = author_prediction.load_data(nlp, cue_verbs, poly)
+
+
+def unit_seed(configuration, fold):
+    """
+    :param configuration: Configuration
+        The configuration of the model.
+    :param fold: int
+        The index of the fold of cross-validation.
+    :return: int
+        The seed of the random generators for this fold of this configuration, which doesn't depend on the process
+        that trains it.
+    """
+    return zlib.crc32(f'{configuration}-{fold}'.encode('utf-8'))
+
+
+def evaluate_fold(unit):
+    """
+    Trains and evaluates a model on a single fold of cross-validation, with the prepared dataset of the model.
+
+    :param unit: (Configuration, int, int, int)
+        The configuration of the model, the index of the fold, the number of folds and the maximum number of epochs.
+    :return: tuple(dict)
+        The scores of the fold, as returned by cross_validation_fold or author_prediction_fold.
+    """
+    configuration, fold, cv_folds, max_iter = unit
+    seed = unit_seed(configuration, fold)
+    np.random.seed(seed)
+
+    split_ids, dataset = _datasets[configuration.model]
+    train_indices, test_indices = list(KFold(n_splits=cv_folds).split(split_ids))[fold]
+    # The progression of the training of each fold isn't printed, as all folds are trained at the same time.
+    with contextlib.redirect_stdout(io.StringIO()):
+        if configuration.model == QUOTE_DETECTION:
+            return cross_validation_fold(configuration.loss, configuration.penalty, split_ids[train_indices],
+                                         split_ids[test_indices], dataset, subset, detection_loader,
+                                         configuration.alpha, max_iter)
+        else:
+            return author_prediction.author_prediction_fold(configuration.loss, configuration.penalty,
+                                                            configuration.alpha, max_iter, split_ids[train_indices],
+                                                            split_ids[test_indices], dataset)
+
+
+def evaluate_configurations(configurations, nlp, cue_verbs, exp_degree, max_iter, cv_folds, jobs):
+    """
+    Evaluates many configurations of models using cross-validation, training the folds of all configurations in
+    parallel.
+
+    :param configurations: list(Configuration)
+        The configurations to evaluate.
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param exp_degree: int
+        The degree of feature expansion for author prediction.
+    :param max_iter: int
+        The maximum number of epochs to train for.
+    :param cv_folds: int
+        The number of cross-validation folds to perform.
+    :param jobs: int
+        The number of processes training folds at the same time.
+    :return: dict
+        For each configuration, the Results of each of the scores of its folds, in the order in which
+        evaluate_quote_detection or evaluate_author_prediction return them.
+    """
+    prepare_datasets({configuration.model for configuration in configurations}, nlp, cue_verbs, exp_degree)
+    units = [(configuration, fold, cv_folds, max_iter) for configuration in configurations for fold in range(cv_folds)]
+
+    # The worker processes are forked, so that they share the prepared datasets instead of loading them again. They
+    # must not reuse the connections to the database of this process.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')) as executor:
+        scores = list(executor.map(evaluate_fold, units))
+
+    # The scores are added in the order of the units, whatever the order in which the folds finished.
+    results = {}
+    for (configuration, _, _, _), fold_scores in zip(units, scores):
+        if configuration not in results:
+            results[configuration] = tuple(Results() for _ in fold_scores)
+        for result, fold_score in zip(results[configuration], fold_scores):
+            result.add_scores(fold_score)
+    return results
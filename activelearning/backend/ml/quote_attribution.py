@@ -4,6 +4,7 @@ from sklearn.model_selection import KFold
 from sklearn.preprocessing import PolynomialFeatures
 
 from backend.db_management import load_labeled_articles, load_quote_authors
+from backend.ml.feature_store import FeatureStore
 from backend.ml.helpers import extract_speaker_names, evaluate_speaker_extraction
 from backend.ml.quote_attribution_dataset import QuoteAttributionDataset, subset, subset_ovo, \
     attribution_loader
@@ -14,7 +15,8 @@ from backend.ml.sgd import train, evaluate
 
 def load_data(nlp, cue_verbs, extraction_method, ovo, poly):
     """
-    Loads the datasets to perform quote attribution.
+    Loads the datasets to perform quote attribution. Features are loaded from the feature store when possible, in
+    which case the articles aren't parsed.
 
     :param nlp: spaCy.Language
         The language model used to tokenize the text.
@@ -34,11 +36,15 @@ def load_data(nlp, cue_verbs, extraction_method, ovo, poly):
             * 'author': list(list(int)), the indices of the tokens of the author of the quote.
         * The dataset
     """
-    train_articles, train_sentences, _, _ = load_labeled_articles(nlp)
-    quote_detection_dataset = QuoteDetectionDataset(train_articles, train_sentences, cue_verbs, poly)
-    train_dicts, _ = load_quote_authors(nlp)
+    train_articles, train_sentences, _, _ = load_labeled_articles(nlp, lazy=True)
+    detection_store = FeatureStore('quote_detection', cue_verbs, poly, nlp)
+    quote_detection_dataset = QuoteDetectionDataset(train_articles, train_sentences, cue_verbs, poly,
+                                                    feature_store=detection_store)
+    train_dicts, _ = load_quote_authors(nlp, lazy=True)
+    attribution_store = FeatureStore(f'quote_attribution_{extraction_method}{"_ovo" if ovo else ""}', cue_verbs, poly,
+                                     nlp)
     quote_attribution_dataset = QuoteAttributionDataset(train_dicts, quote_detection_dataset, cue_verbs,
-                                                        extraction_method, ovo, poly)
+                                                        extraction_method, ovo, poly, feature_store=attribution_store)
 
     return np.array(train_dicts), quote_attribution_dataset
 
@@ -1,7 +1,7 @@
 import numpy as np
-from torch.utils.data import Dataset, DataLoader, Subset
-from torch.utils.data.sampler import WeightedRandomSampler
 
+from backend.ml.batches import ArrayDataset, Subset, batch_loader
+from backend.ml.feature_expansion import expand_features
 from backend.ml.helpers import find_true_author_index
 from backend.ml.quote_attribution_feature_extraction import *
 
@@ -45,6 +45,7 @@ def parse_article(article_dict, quote_dataset, extraction_method, cue_verbs, pol
         # The quote detection features for this sentence
         quote_features = quote_dataset.get_sentence_features(article_dict['article'].id, sent_index)
 
+        mention_features = []
         for j, mention in enumerate(mentions):
             article = article_dict['article']
             sentences = article_dict['sentences']
@@ -63,12 +64,15 @@ def parse_article(article_dict, quote_dataset, extraction_method, cue_verbs, pol
                 ne_features = attribution_features_baseline_expanded(article, sentences, sent_index, mention, other_quotes, other_speakers, cue_verbs)
 
             quote_mention_features = np.concatenate((quote_features, ne_features), axis=0)
-            if poly:
-                quote_mention_features = poly.fit_transform(quote_mention_features.reshape((-1, 1))).reshape((-1,))
             label = int(true_mention_index == j)
-            features.append(quote_mention_features)
+            mention_features.append(quote_mention_features)
             labels.append(label)
 
+        # Expands the features of all mentions at once
+        if poly and len(mention_features) > 0:
+            mention_features = list(expand_features(np.array(mention_features), poly))
+        features.extend(mention_features)
+
         # Create weasel feature:
         weasel_feature = np.zeros(features[-1].shape[0])
         weasel_feature[:len(quote_features)] = quote_features
@@ -143,8 +147,6 @@ def parse_article_ovo(article_dict, quote_dataset, extraction_method, cue_verbs,
                     m1_m2_features = np.concatenate((f1, f2), axis=0)
                     if use_quote_features:
                         m1_m2_features = np.concatenate((quote_features, m1_m2_features), axis=0)
-                    if poly:
-                        m1_m2_features = poly.fit_transform(m1_m2_features.reshape((-1, 1))).reshape((-1,))
 
                     if true_index == m1_index:
                         label = 0
@@ -156,13 +158,18 @@ def parse_article_ovo(article_dict, quote_dataset, extraction_method, cue_verbs,
                     features.append(m1_m2_features)
                     labels.append(label)
 
+    # Expands the features of all pairs of mentions at once
+    if poly and len(features) > 0:
+        features = list(expand_features(np.array(features), poly))
+
     return features, labels, len(article_dict['quotes']), len(mentions_with_weasel)
 
 
-class QuoteAttributionDataset(Dataset):
+class QuoteAttributionDataset(ArrayDataset):
     """ Dataset comprised of labeled articles, with features extracted for quote attribution """
 
-    def __init__(self, article_dicts, quote_dataset, cue_verbs, extraction_method, ovo=False, poly=None):
+    def __init__(self, article_dicts, quote_dataset, cue_verbs, extraction_method, ovo=False, poly=None,
+                 feature_store=None):
         """
         Initializes the dataset.
 
@@ -181,47 +188,52 @@ class QuoteAttributionDataset(Dataset):
             Whether or not to load one-vs-one features
         :param poly: sklearn.preprocessing.PolynomialFeatures
             If defined, used for feature expansion.
+        :param feature_store: backend.ml.feature_store.FeatureStore
+            If defined, the store from which the features of articles are loaded, and in which they are stored when
+            they are extracted.
         """
         self.ovo = ovo
-        self.features = []
-        self.labels = []
         # Keys: article id,
         # Values:
-        #   (first feature in the article,
-        #    last feature in the article,
-        #    number of quotes in the article,
+        #   (number of quotes in the article,
         #    number of mentions in the article (including the weasel, which is the last one))
-        self.article_features = {}
-
+        self.article_quotes = {}
+        counts = []
         for a_dict in article_dicts:
-            if ovo:
-                a_features, a_labels, a_quotes, a_mentions = parse_article_ovo(a_dict, quote_dataset, extraction_method,
-                                                                               cue_verbs, poly=poly)
+            num_quotes, num_mentions = len(a_dict['quotes']), len(a_dict['article'].people['mentions']) + 1
+            self.article_quotes[a_dict['article'].id] = (num_quotes, num_mentions)
+            counts.append(num_quotes * self.quote_datapoints(num_mentions))
+
+        # The features of each article are stored in the matrix as soon as they are extracted.
+        self.allocate_articles([a_dict['article'].id for a_dict in article_dicts], counts)
+
+        for index, a_dict in enumerate(article_dicts):
+            def extract():
+                if ovo:
+                    return parse_article_ovo(a_dict, quote_dataset, extraction_method, cue_verbs, poly=poly)
+                else:
+                    return parse_article(a_dict, quote_dataset, extraction_method, cue_verbs, poly=poly)
+
+            if feature_store is None:
+                a_features, a_labels, _, _ = extract()
             else:
-                a_features, a_labels, a_quotes, a_mentions = parse_article(a_dict, quote_dataset, extraction_method,
-                                                                           cue_verbs, poly=poly)
-            first_feature = len(self.features)
-            self.features += a_features
-            last_feature = len(self.features) - 1
-            self.labels += a_labels
-            self.article_features[a_dict['article'].id] = (first_feature, last_feature, a_quotes, a_mentions)
-
-        self.feature_dimensionality = self.features[0].shape
-        self.length = len(self.features)
-
-    def __getitem__(self, index):
-        """
-        Finds the item at a given index of the dataset.
+                a_features, a_labels, _, _ = feature_store.article_features(
+                    a_dict['article'], [a_dict['quotes'], a_dict['authors']], extract)
+            self.fill_article(index, a_features, a_labels)
 
-        :param index: int.
-            The index at which we want the data.
-        :return: np.array, np.array
-            The features and label for the datapoint
-        """
-        return self.features[index], self.labels[index]
+        self.feature_dimensionality = self.features.shape[1:]
 
-    def __len__(self):
-        return self.length
+    def quote_datapoints(self, num_mentions):
+        """
+        :param num_mentions: int
+            The number of mentions in an article, including the weasel.
+        :return: int
+            The number of datapoints of each quote of the article: one for each mention, or one for each ordered pair
+            of different mentions with one-vs-one features.
+        """
+        if self.ovo:
+            return num_mentions * (num_mentions - 1)
+        return num_mentions
 
     def get_article_indices(self, article_id):
         """
@@ -232,8 +244,7 @@ class QuoteAttributionDataset(Dataset):
         :return: list(int)
             All indices containing features for this article
         """
-        start, end, _, _ = self.article_features[article_id]
-        return list(range(start, end + 1))
+        return list(range(*self.article_range(article_id)))
 
     def get_article_features(self, article_id):
         """
@@ -245,7 +256,8 @@ class QuoteAttributionDataset(Dataset):
             The first two values are the first and last index containing a feature for this article. The next two are
             the number of quotes and the number of potential speakers in the article.
         """
-        return self.article_features[article_id]
+        start, end = self.article_range(article_id)
+        return (start, end - 1) + self.article_quotes[article_id]
 
     def get_quote_mention_features(self, article_id, quote_index):
         """
@@ -258,13 +270,10 @@ class QuoteAttributionDataset(Dataset):
         :return: list(np.array), list(int)
             The features for the sentence and each mention, and their labels
         """
-        a_start, _, num_quotes, num_mentions = self.article_features[article_id]
-        if self.ovo:
-            q_start = a_start + quote_index * num_mentions * (num_mentions - 1)
-            next_q_start = a_start + (quote_index + 1) * num_mentions * (num_mentions - 1)
-        else:
-            q_start = a_start + quote_index * num_mentions
-            next_q_start = q_start + num_mentions
+        a_start, _ = self.article_range(article_id)
+        _, num_mentions = self.article_quotes[article_id]
+        q_start = a_start + quote_index * self.quote_datapoints(num_mentions)
+        next_q_start = q_start + self.quote_datapoints(num_mentions)
         return self.features[q_start:next_q_start], self.labels[q_start:next_q_start]
 
 
@@ -278,10 +287,7 @@ def subset(dataset, article_indices):
         The indices of the articles to keep in the subset.
     :return:
     """
-    indices = []
-    for a_id in article_indices:
-        indices += dataset.get_article_indices(a_id)
-    return Subset(dataset, indices)
+    return Subset(dataset, dataset.article_indices(article_indices))
 
 
 def subset_ovo(dataset, article_indices):
@@ -291,67 +297,10 @@ def subset_ovo(dataset, article_indices):
     :param article_indices:
     :return:
     """
-    indices = []
-    for a_id in article_indices:
-        for feature_index in dataset.get_article_indices(a_id):
-            # Don't add feature vectors with no true label to the dataset.
-            if dataset[feature_index][1] < 2:
-                indices.append(feature_index)
-    return Subset(dataset, indices)
-
-
-def sampler_weights(dataset):
-    """
-    Computes the weights that need to be given to each index in the dataset for random sampling.
-
-    :param dataset: Dataset
-        The dataset to find the weights for
-    :return: list(float), int
-        The weights for each index in the dataset and the total number of samples in an epoch.
-    """
-    class_counts = [0, 0]
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        class_counts[label] += 1
-
-    divisor = 2 * class_counts[0] * class_counts[1]
-    sample_weights = (class_counts[1] / divisor, class_counts[0] / divisor)
-    weights = []
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        weights.append(sample_weights[label])
-
-    num_samples = 2 * min(class_counts[0], class_counts[1])
-    return weights, num_samples
-
-
-def sampler_weights_ovo(dataset):
-    """
-    Computes the weights that need to be given to each index in the dataset for random sampling.
-
-    :param dataset: Dataset
-        The dataset to find the weights for
-    :return: list(float), int
-        The weights for each index in the dataset and the total number of samples in an epoch.
-    """
-    # Class 0, 1, 2
-    class_counts = [0, 0, 0]
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        class_counts[label] += 1
-
-    divisor = 2 * class_counts[0] * class_counts[1]
-    sample_weights = (class_counts[1] / divisor, class_counts[0] / divisor)
-    weights = []
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        if label < 2:
-            weights.append(sample_weights[label])
-        else:
-            weights.append(0)
-
-    num_samples = 2 * min(class_counts[0], class_counts[1])
-    return weights, num_samples
+    indices = dataset.article_indices(article_indices)
+    _, labels = dataset.arrays()
+    # Don't add feature vectors with no true label to the dataset.
+    return Subset(dataset, indices[labels[indices] < 2])
 
 
 def attribution_loader(dataset, train=True, batch_size=None):
@@ -365,14 +314,7 @@ def attribution_loader(dataset, train=True, batch_size=None):
         Whether to load a training or testing dataloader.
     :param batch_size: int.
         The batch size. The default is None, where the batch size is the size of the data.
-    :return: torch.utils.data.DataLoader
-        DataLoader for quote detection.
+    :return: backend.ml.batches.BatchLoader
+        The loader of batches of the dataset.
     """
-    if batch_size is None:
-        batch_size = len(dataset)
-    if train:
-        weights, num_samples = sampler_weights(dataset)
-        sampler = WeightedRandomSampler(weights=weights, num_samples=num_samples, replacement=True)
-        return DataLoader(dataset=dataset, batch_size=batch_size, sampler=sampler)
-    else:
-        return DataLoader(dataset=dataset, batch_size=batch_size, shuffle=False)
+    return batch_loader(dataset, train, batch_size)
@@ -15,14 +15,15 @@ def speaker_information(article, speaker):
         * The indices of the tokens of the speaker in the sentence's doc.
     """
     # The index of the speaker containing the quote.
+    sentence_ends = article.sentences_array()
     sent = 0
-    while sent < len(article.sentences['sentences']) and article.sentences['sentences'][sent] < speaker['end']:
+    while sent < len(sentence_ends) and sentence_ends[sent] < speaker['end']:
         sent = sent + 1
 
     # The index of the first token in the sentence containing the speaker
     sent_start = 0
     if sent > 0:
-        sent_start = article.sentences['sentences'][sent - 1] + 1
+        sent_start = int(sentence_ends[sent - 1]) + 1
     rel_token_indices = [i - sent_start for i in range(speaker['start'], speaker['end'] + 1)]
 
     return sent, sent_start, rel_token_indices
@@ -33,7 +34,7 @@ def speaker_information_no_db(sentence_indices, speaker):
     Extracts information about the speaker and the sentence containing it.
 
     :param sentence_indices: list(int)
-        The index of the first token of each sentence in the article, as in article.sentences['sentences']
+        The index of the first token of each sentence in the article, as in article.sentences_array()
     :param speaker: dict.
         The speaker. Has keys 'name', 'full_name', 'start', 'end', as described in the database.
     :return: int, int, int
@@ -95,7 +96,7 @@ def attribution_features_baseline(article, sentences, quote_index, speaker, othe
     in_same_sentence = (quote_index == speaker_sent)
 
     def speaker_in_quotes():
-        return article.in_quotes['in_quotes'][speaker_first_token_index] == 1
+        return article.in_quotes_array()[speaker_first_token_index] == 1
 
     def speaker_with_cue_verb():
         tokens = sentences[speaker_sent]
@@ -116,7 +117,7 @@ def attribution_features_baseline(article, sentences, quote_index, speaker, othe
 
     def other_speaker_in_quote():
         for sent, start_token, _ in other_speaker_info:
-            if sent == quote_index and article.in_quotes['in_quotes'][start_token] == 0:
+            if sent == quote_index and article.in_quotes_array()[start_token] == 0:
                 return 1
         return 0
 
@@ -175,7 +176,7 @@ def attribution_features_baseline_expanded(article, sentences, quote_index, spea
     in_same_sentence = (quote_index == speaker_sent)
 
     def speaker_in_quotes():
-        return article.in_quotes['in_quotes'][speaker_first_token_index] == 1
+        return article.in_quotes_array()[speaker_first_token_index] == 1
 
     def speaker_with_cue_verb():
         tokens = sentences[speaker_sent]
@@ -198,7 +199,7 @@ def attribution_features_baseline_expanded(article, sentences, quote_index, spea
 
     def other_speaker_in_quote():
         for sent, start_token in zip(other_speaker_sentences, other_speaker_start_tokens):
-            if sent == quote_index and article.in_quotes['in_quotes'][start_token] == 0:
+            if sent == quote_index and article.in_quotes_array()[start_token] == 0:
                 return 1
         return 0
 
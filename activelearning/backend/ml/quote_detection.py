@@ -3,14 +3,17 @@ from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import PolynomialFeatures
 
 from backend.db_management import load_labeled_articles
+from backend.ml.feature_expansion import expand_features
+from backend.ml.feature_store import FeatureStore
 from backend.ml.quote_detection_dataset import QuoteDetectionDataset, detection_loader, subset
-from backend.ml.quote_detection_feature_extraction import feature_extraction
-from backend.ml.sgd import train, cross_validate
+from backend.ml.quote_detection_feature_extraction import feature_matrix
+from backend.ml.sgd import train, cross_validate, incremental_train
 
 
-def load_data(nlp, cue_verbs, poly):
+def load_data(nlp, cue_verbs, poly, feature_store=None):
     """
-    Loads all labeled articles from the database and extracts feature vectors for them.
+    Loads all labeled articles from the database and extracts feature vectors for them. Features are loaded from the
+    feature store when possible, in which case the articles aren't parsed.
 
     :param nlp: spaCy.Language
         The language model used to tokenize the text.
@@ -18,11 +21,16 @@ def load_data(nlp, cue_verbs, poly):
         The list of all "cue verbs", which are verbs that often introduce reported speech.
     :param poly: sklearn.preprocessing.PolynomialFeatures
         If defined, used to perform feature extraction.
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        The store of the features. If None, the store of the features for quote detection is used.
     :return: list(int), QuoteDetectionDataset
         The ids of all articles in the dataset, and the dataset.
     """
-    train_articles, train_sentences, _, _ = load_labeled_articles(nlp)
-    quote_detection_dataset = QuoteDetectionDataset(train_articles, train_sentences, cue_verbs, poly=poly)
+    train_articles, train_sentences, _, _ = load_labeled_articles(nlp, lazy=True)
+    if feature_store is None:
+        feature_store = FeatureStore('quote_detection', cue_verbs, poly, nlp)
+    quote_detection_dataset = QuoteDetectionDataset(train_articles, train_sentences, cue_verbs, poly=poly,
+                                                    feature_store=feature_store)
     train_article_ids = np.array(list(map(lambda a: a.id, train_articles)))
     return train_article_ids, quote_detection_dataset
 
@@ -46,13 +54,9 @@ def predict_quotes(trained_model, sentences, cue_verbs, in_quotes, proba=False,
     :return: np.array()
         The probability for each sentence.
     """
-    features = []
-    for i, sentence in enumerate(sentences):
-        sentence_features = feature_extraction(sentence, cue_verbs, in_quotes[i])
-        if poly:
-            sentence_features = poly.fit_transform(sentence_features.reshape((-1, 1))).reshape((-1,))
-        features.append(sentence_features)
-    X = np.array(features)
+    X = feature_matrix(sentences, cue_verbs, in_quotes)
+    if poly:
+        X = expand_features(X, poly)
     if proba:
         predictions = trained_model.predict_proba(X)[:, 1]
     else:
@@ -60,7 +64,7 @@ def predict_quotes(trained_model, sentences, cue_verbs, in_quotes, proba=False,
     return predictions
 
 
-def train_quote_detection(loss, penalty, alpha, max_iter, nlp, cue_verbs, exp_degree=2):
+def train_quote_detection(loss, penalty, alpha, max_iter, nlp, cue_verbs, exp_degree=2, feature_store=None):
     """
     Trains a classifier to perform quote detection, on all fully labeled articles in the training set.
 
@@ -76,12 +80,16 @@ def train_quote_detection(loss, penalty, alpha, max_iter, nlp, cue_verbs, exp_de
         The language model used to tokenize the text.
     :param cue_verbs: list(string)
         The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param exp_degree: int
+        The degree to which polynomial feature expansion should be performed.
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        The store of the features. If None, the store of the features for quote detection is used.
 
     :return: sklearn.linear_model.SGDClassifier
         The trained classifier
     """
     poly = PolynomialFeatures(exp_degree, interaction_only=True, include_bias=True)
-    article_ids, quote_detection_dataset = load_data(nlp, cue_verbs, poly=poly)
+    article_ids, quote_detection_dataset = load_data(nlp, cue_verbs, poly=poly, feature_store=feature_store)
     classifier = SGDClassifier(loss=loss, alpha=alpha, penalty=penalty)
     dataloader = detection_loader(quote_detection_dataset, train=True, batch_size=10)
     eval_dataloader = detection_loader(quote_detection_dataset, train=False, batch_size=len(quote_detection_dataset))
@@ -89,6 +97,41 @@ def train_quote_detection(loss, penalty, alpha, max_iter, nlp, cue_verbs, exp_de
     return classifier
 
 
+def update_quote_detection(classifier, max_iter, nlp, cue_verbs, trained_snapshots, feature_store, replay=2,
+                           exp_degree=2):
+    """
+    Continues training a quote detection classifier on the training articles that were labeled or relabeled since it
+    was trained, along with a sample of the other training articles.
+
+    :param classifier: sklearn.linear_model.SGDClassifier
+        The trained classifier.
+    :param max_iter: int
+        The maximum number of epochs to train for
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text.
+    :param cue_verbs: list(string)
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param trained_snapshots: dict(int, string)
+        The snapshot of each article the classifier was trained on, as computed by the feature store.
+    :param feature_store: backend.ml.feature_store.FeatureStore
+        The store of the features, which computes the snapshots of the articles.
+    :param replay: int
+        The number of articles the classifier was already trained on that are sampled for each new article.
+    :param exp_degree: int
+        The degree to which polynomial feature expansion should be performed.
+    :return: sklearn.linear_model.SGDClassifier, list(int)
+        The classifier, and the ids of the new or relabeled articles. If there are none, the classifier isn't trained.
+    """
+    poly = PolynomialFeatures(exp_degree, interaction_only=True, include_bias=True)
+    article_ids, quote_detection_dataset = load_data(nlp, cue_verbs, poly=poly, feature_store=feature_store)
+    new_ids = [article_id for article_id in article_ids
+               if trained_snapshots.get(article_id) != feature_store.snapshots[article_id]]
+    if len(new_ids) > 0:
+        classifier, _ = incremental_train(classifier, quote_detection_dataset, subset, detection_loader, article_ids,
+                                          new_ids, replay, max_iter)
+    return classifier, new_ids
+
+
 def evaluate_unlabeled_sentences(trained_model, sentences, cue_verbs, in_quotes, proba=False, exp_degree=2):
     """
     Uses a trained quote detection model to predict whether new sentences are also quotes.
@@ -1,11 +1,11 @@
-from torch.utils.data import Dataset, DataLoader, Subset
-from torch.utils.data.sampler import WeightedRandomSampler
+from backend.ml.batches import ArrayDataset, Subset, batch_loader
 
-from backend.helpers import aggregate_label
-from backend.ml.quote_detection_feature_extraction import feature_extraction
+from backend.helpers import load_consensus
+from backend.ml.feature_expansion import expand_features
+from backend.ml.quote_detection_feature_extraction import feature_matrix
 
 
-def parse_article(article, sentences, cue_verbs, poly=None):
+def parse_article(article, sentences, cue_verbs, poly=None, consensus=None):
     """
     Creates feature vectors for each sentence in the article from the raw data.
 
@@ -17,32 +17,37 @@ def parse_article(article, sentences, cue_verbs, poly=None):
         The list of all "cue verbs", which are verbs that often introduce reported speech.
     :param poly: sklearn.preprocessing.PolynomialFeatures
         If defined, used for feature expansion.
+    :param consensus: list(tuple)
+        The consensus labels, authors and consensus of each sentence in the article, as loaded by load_consensus. If
+        None, they are loaded from the database.
     """
+    if consensus is None:
+        consensus = load_consensus([article])[article.id]
     article_features = []
     article_labels = []
-    sentence_start = 0
-    for sentence_index, end in enumerate(article.sentences['sentences']):
-        # Compute sentence features
-        sentence = sentences[sentence_index]
-        in_quotes = article.in_quotes['in_quotes'][sentence_start:end + 1]
-        features = feature_extraction(sentence, cue_verbs, in_quotes)
-        if poly:
-            features = poly.fit_transform(features.reshape((-1, 1))).reshape((-1,))
+    sentence_ends = article.sentences_array().tolist()
+    sentence_starts = [0] + [end + 1 for end in sentence_ends][:-1]
+    article_in_quotes = article.in_quotes_array().tolist()
+    in_quotes = [article_in_quotes[start:end + 1] for start, end in zip(sentence_starts, sentence_ends)]
+    # Compute the features of all sentences at once
+    sentence_features = feature_matrix(sentences[:len(sentence_ends)], cue_verbs, in_quotes)
+    if poly:
+        sentence_features = expand_features(sentence_features, poly)
+    for sentence_index in range(len(sentence_ends)):
         # Compute sentence label
-        sentence_labels, sentence_authors, _ = aggregate_label(article, sentence_index)
+        sentence_labels, sentence_authors, _ = consensus[sentence_index]
         label = int(sum(sentence_labels) > 0)
         # Adds the sentence and label to the dataset
-        article_features.append(features)
+        article_features.append(sentence_features[sentence_index])
         article_labels.append(label)
-        sentence_start = end + 1
 
     return article_features, article_labels
 
 
-class QuoteDetectionDataset(Dataset):
+class QuoteDetectionDataset(ArrayDataset):
     """ Dataset comprised of labeled articles """
 
-    def __init__(self, articles, sentences, cue_verbs, poly=None):
+    def __init__(self, articles, sentences, cue_verbs, poly=None, feature_store=None):
         """
         Initializes the dataset.
 
@@ -54,35 +59,27 @@ class QuoteDetectionDataset(Dataset):
             The list of all "cue verbs", which are verbs that often introduce reported speech.
         :param poly: sklearn.preprocessing.PolynomialFeatures
             If defined, used for feature expansion.
+        :param feature_store: backend.ml.feature_store.FeatureStore
+            If defined, the store from which the features of articles are loaded, and in which they are stored when
+            they are extracted.
         """
-        self.features = []
-        self.labels = []
-        self.article_features = {}
-        total_sentences = 0
+        consensus = load_consensus(articles)
+        # The features of each article are stored in the matrix as soon as they are extracted.
+        self.allocate_articles([article.id for article in articles],
+                               [len(article.sentences_array()) for article in articles])
 
         for index, article in enumerate(articles):
-            article_features, article_labels = parse_article(article, sentences[index], cue_verbs, poly)
-            self.features += article_features
-            self.labels += article_labels
-            self.article_features[article.id] = (total_sentences, total_sentences + len(article_labels) - 1)
-            total_sentences += len(article_labels)
+            def extract():
+                return parse_article(article, sentences[index], cue_verbs, poly, consensus[article.id])
 
-        self.feature_dimensionality = self.features[0].shape
-        self.length = len(self.features)
+            if feature_store is None:
+                article_features, article_labels = extract()
+            else:
+                article_features, article_labels = feature_store.article_features(article, consensus[article.id],
+                                                                                  extract)
+            self.fill_article(index, article_features, article_labels)
 
-    def __getitem__(self, index):
-        """
-        Finds the item at a given index of the dataset.
-
-        :param index: int.
-            The index at which we want the data.
-        :return: np.array, np.array
-            The features and label for the datapoint
-        """
-        return self.features[index], self.labels[index]
-
-    def __len__(self):
-        return self.length
+        self.feature_dimensionality = self.features.shape[1:]
 
     def get_article_indices(self, article_id):
         """
@@ -93,8 +90,7 @@ class QuoteDetectionDataset(Dataset):
         :return: list(int)
             All indices containing features for this article
         """
-        start, end = self.article_features[article_id]
-        return list(range(start, end + 1))
+        return list(range(*self.article_range(article_id)))
 
     def get_sentence_features(self, article_id, sentence_index):
         """
@@ -107,7 +103,7 @@ class QuoteDetectionDataset(Dataset):
         :return: np.array
             The features for the sentence.
         """
-        return self.features[self.article_features[article_id][0] + sentence_index]
+        return self.features[self.article_range(article_id)[0] + sentence_index]
 
 
 def subset(dataset, article_indices):
@@ -120,35 +116,7 @@ def subset(dataset, article_indices):
         The indices of the articles to keep in the subset.
     :return:
     """
-    indices = []
-    for a_id in article_indices:
-        indices += dataset.get_article_indices(a_id)
-    return Subset(dataset, indices)
-
-
-def sampler_weights(dataset):
-    """
-    Computes the weights that need to be given to each index in the dataset for random sampling.
-
-    :param dataset: Dataset
-        The dataset to find the weights for
-    :return: list(float), int
-        The weights for each index in the dataset and the total number of samples in an epoch.
-    """
-    class_counts = [0, 0]
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        class_counts[label] += 1
-
-    divisor = 2 * class_counts[0] * class_counts[1]
-    sample_weights = (class_counts[1] / divisor, class_counts[0] / divisor)
-    weights = []
-    for index in range(len(dataset)):
-        _, label = dataset[index]
-        weights.append(sample_weights[label])
-
-    num_samples = 2 * min(class_counts[0], class_counts[1])
-    return weights, num_samples
+    return Subset(dataset, dataset.article_indices(article_indices))
 
 
 def detection_loader(dataset, train=True, batch_size=None):
@@ -163,14 +131,7 @@ def detection_loader(dataset, train=True, batch_size=None):
         Whether to load a training or testing dataloader.
     :param batch_size: int.
         The batch size. The default is None, where the batch size is the size of the data.
-    :return: torch.utils.data.DataLoader
-        DataLoader for quote detection.
+    :return: backend.ml.batches.BatchLoader
+        The loader of batches of the dataset.
     """
-    if batch_size is None:
-        batch_size = len(dataset)
-    if train:
-        weights, num_samples = sampler_weights(dataset)
-        sampler = WeightedRandomSampler(weights=weights, num_samples=num_samples, replacement=True)
-        return DataLoader(dataset=dataset, batch_size=batch_size, sampler=sampler)
-    else:
-        return DataLoader(dataset=dataset, batch_size=batch_size, shuffle=False)
+    return batch_loader(dataset, train, batch_size)
@@ -1,4 +1,17 @@
 import numpy as np
+from spacy.attrs import ORTH, LEMMA, LOWER, POS, DEP, ENT_IOB, ENT_TYPE
+
+
+""" The token attributes needed to compute the features of sentences, in the order of the columns of their arrays. """
+SENTENCE_ATTRIBUTES = [ORTH, LEMMA, LOWER, POS, DEP, ENT_IOB, ENT_TYPE]
+
+
+""" The number of features extracted for each sentence. """
+N_FEATURES = 13
+
+
+""" The value of ENT_IOB for the first token of a named entity. """
+ENT_IOB_BEGIN = 3
 
 
 def feature_extraction(sentence, cue_verbs, in_quotes):
@@ -73,4 +86,81 @@ def feature_extraction(sentence, cue_verbs, in_quotes):
         sentence_inside_quotes,
         inside_quote_proportion,
         contains_selon(),
-    ])
\ No newline at end of file
+    ])
+
+
+def sentence_arrays(sentences):
+    """
+    Represents the tokens of many sentences as a single matrix of token attributes.
+
+    :param sentences: list(spaCy.Doc).
+        The sentences.
+    :return: np.array, np.array
+        * The attributes in SENTENCE_ATTRIBUTES of all tokens in the sentences, with one row per token.
+        * The index of the sentence of each token.
+    """
+    arrays = [sentence.to_array(SENTENCE_ATTRIBUTES) for sentence in sentences]
+    lengths = [len(sentence) for sentence in sentences]
+    tokens = np.concatenate(arrays).reshape((-1, len(SENTENCE_ATTRIBUTES)))
+    return tokens, np.repeat(np.arange(len(sentences)), lengths)
+
+
+def feature_matrix(sentences, cue_verbs, in_quotes):
+    """
+    Computes the same features as feature_extraction for all sentences of an article at once. The token attributes of
+    all sentences are compared to the values that the features look for in a single pass over a matrix, instead of
+    iterating over the tokens of each sentence once per feature.
+
+    :param sentences: list(spaCy.Doc).
+        The sentences to extract features from.
+    :param cue_verbs: list(string).
+        The list of all "cue verbs", which are verbs that often introduce reported speech.
+    :param in_quotes: list(list(int)).
+        Whether each token in each sentence is between quotes or not.
+    :return: np.array
+        The features extracted, with one row per sentence.
+    """
+    n_sentences = len(sentences)
+    if n_sentences == 0:
+        return np.zeros((0, N_FEATURES))
+
+    strings = sentences[0].vocab.strings
+    tokens, sentence_ids = sentence_arrays(sentences)
+    orth, lemma, lower, pos, dep, ent_iob, ent_type = tokens.T
+    token_in_quotes = np.array([value for sentence_in_quotes in in_quotes for value in sentence_in_quotes])
+    if len(token_in_quotes) != len(sentence_ids):
+        raise ValueError('in_quotes must contain a value for each token of each sentence')
+
+    def count(token_values):
+        return np.bincount(sentence_ids, weights=token_values, minlength=n_sentences)
+
+    def contains(token_values):
+        return (count(token_values) > 0).astype(int)
+
+    # Only the distinct tokens need to be looked up to know if they contain a quote.
+    unique_orth, orth_index = np.unique(orth, return_inverse=True)
+    quote_orth = np.array(['"' in strings[int(o)] for o in unique_orth])
+
+    cue_verb_hashes = np.array([strings[v] for v in cue_verbs], dtype=tokens.dtype)
+    is_verb = pos == strings['VERB']
+    entity_start = ent_iob == ENT_IOB_BEGIN
+
+    sentence_length = np.array([len(sentence) for sentence in sentences])
+    tokens_inside_quote = count(token_in_quotes)
+    in_quotes_length = np.array([len(sentence_in_quotes) for sentence_in_quotes in in_quotes])
+
+    return np.column_stack([
+        sentence_length,
+        contains(quote_orth[orth_index.reshape(-1)]),
+        tokens_inside_quote,
+        contains(entity_start),
+        contains(entity_start & (ent_type == strings['PER'])),
+        contains(np.isin(lemma, cue_verb_hashes)),
+        contains(pos == strings['PRON']),
+        contains(dep == strings['parataxis']),
+        count(is_verb),
+        contains(is_verb & (token_in_quotes == 1)),
+        (in_quotes_length == tokens_inside_quote).astype(int),
+        tokens_inside_quote / in_quotes_length,
+        contains(lower == strings['selon']),
+    ]).astype(float)
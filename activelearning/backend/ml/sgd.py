@@ -12,9 +12,9 @@ def train(classifier, dataloader, eval_dataloader, max_iter, print_prefix=''):
 
     :param classifier: SGDClassifier
         The classifier to train.
-    :param dataloader: Dataloader
+    :param dataloader: BatchLoader
         The dataloader containing the data to train the classifier on.
-    :param eval_dataloader: Dataloader
+    :param eval_dataloader: BatchLoader
         The dataloader to use to evaluate the model after each epoch. Should return a single matrix.
     :param max_iter: int
         The number of epochs to run SGD for.
@@ -46,6 +46,43 @@ def train(classifier, dataloader, eval_dataloader, max_iter, print_prefix=''):
     return classifier, accuracy
 
 
+def incremental_train(classifier, dataset, subset, dataloader, article_ids, new_ids, replay, max_iter,
+                      print_prefix=''):
+    """
+    Continues training a trained classifier on new articles, along with a random sample of the articles it was already
+    trained on, so that it doesn't forget them.
+
+    :param classifier: SGDClassifier
+        The trained classifier.
+    :param dataset: backend.ml.batches.ArrayDataset
+        The dataset containing all training articles.
+    :param subset: function
+        The method, with parameters (dataset, ids), used to split the dataset into two subsets using article ids.
+    :param dataloader: function
+        The method, with parameters (dataset, train, batch_size) that returns a BatchLoader.
+    :param article_ids: list(int)
+        The ids of all articles in the dataset.
+    :param new_ids: list(int)
+        The ids of the articles the classifier wasn't trained on.
+    :param replay: int
+        The number of articles the classifier was already trained on that are sampled for each new article.
+    :param max_iter: int
+        The number of epochs to run SGD for.
+    :param print_prefix: String
+        The prefix to the string indicating the progression of the training
+    :return: SGDClassifier, list(float)
+        The trained classifier, and the accuracy on the whole dataset after each epoch.
+    """
+    new_ids = set(new_ids)
+    old_ids = [article_id for article_id in article_ids if article_id not in new_ids]
+    replayed_ids = list(np.random.permutation(old_ids)[:replay * len(new_ids)])
+    train_ids = [article_id for article_id in article_ids if article_id in new_ids] + replayed_ids
+
+    train_loader = dataloader(subset(dataset, train_ids), train=True, batch_size=10)
+    eval_loader = dataloader(dataset, train=False, batch_size=len(dataset))
+    return train(classifier, train_loader, eval_loader, max_iter, print_prefix)
+
+
 def cross_validate(loss, penalty, split_ids, dataset, subset, dataloader, alpha, max_iter, cv_folds, prefix=''):
     """
     Performs cross-validation for a model on a dataset.
@@ -56,12 +93,12 @@ def cross_validate(loss, penalty, split_ids, dataset, subset, dataloader, alpha,
         One of {'l1', 'l2}. The penalty to use for training
     :param split_ids: list(int)
         The ids of the articles in the dataset. Used to split them into subsets for cross-validation.
-    :param dataset: torch.utils.data.Dataset
+    :param dataset: backend.ml.batches.ArrayDataset
         The dataset to use for cross-validation.
     :param subset: function
         The method, with parameters (dataset, ids), used to split the dataset into two subsets using article ids.
     :param dataloader: function
-        The method, with parameters (dataset, train, batch_size) that returns a Dataloader.
+        The method, with parameters (dataset, train, batch_size) that returns a BatchLoader.
     :param alpha: float
         The regularization term.
     :param max_iter: int
@@ -78,25 +115,57 @@ def cross_validate(loss, penalty, split_ids, dataset, subset, dataloader, alpha,
 
     for n, (train_indices, test_indices) in enumerate(kf.split(split_ids)):
         new_prefix = prefix + f'{int(100 * n/cv_folds)}% {10 * n // cv_folds * "█"}'.ljust(20)
-        # Create the model
-        classifier = SGDClassifier(loss=loss, alpha=alpha, penalty=penalty, warm_start=True)
+        train_scores, test_scores = cross_validation_fold(loss, penalty, split_ids[train_indices],
+                                                          split_ids[test_indices], dataset, subset, dataloader, alpha,
+                                                          max_iter, new_prefix)
+        train_results.add_scores(train_scores)
+        test_results.add_scores(test_scores)
+
+    return train_results, test_results
+
 
-        # Split the dataset into train and test
-        train_ids = split_ids[train_indices]
-        train_dataset = subset(dataset, train_ids)
-        train_loader = dataloader(train_dataset, train=True, batch_size=10)
+def cross_validation_fold(loss, penalty, train_ids, test_ids, dataset, subset, dataloader, alpha, max_iter,
+                          prefix=''):
+    """
+    Trains and evaluates a model on a single fold of cross-validation.
 
-        test_ids = split_ids[test_indices]
-        test_dataset = subset(dataset, test_ids)
-        test_loader = dataloader(test_dataset, train=False, batch_size=len(test_dataset))
+    :param loss: string
+        One of {'log', 'hinge'}. The loss function to use.
+    :param penalty: string
+        One of {'l1', 'l2}. The penalty to use for training
+    :param train_ids: list(int)
+        The ids of the articles of the dataset used for training.
+    :param test_ids: list(int)
+        The ids of the articles of the dataset used for testing.
+    :param dataset: backend.ml.batches.ArrayDataset
+        The dataset to use for cross-validation.
+    :param subset: function
+        The method, with parameters (dataset, ids), used to split the dataset into two subsets using article ids.
+    :param dataloader: function
+        The method, with parameters (dataset, train, batch_size) that returns a BatchLoader.
+    :param alpha: float
+        The regularization term.
+    :param max_iter: int
+        The maximum number of epochs to train on.
+    :param prefix: String
+        The prefix to the string indicating the progression of the training
+    :return: dict, dict
+        The scores on the training and test sets, as returned by evaluate.
+    """
+    # Create the model
+    classifier = SGDClassifier(loss=loss, alpha=alpha, penalty=penalty, warm_start=True)
 
-        classifier, _ = train(classifier, train_loader, test_loader, max_iter, new_prefix)
+    # Split the dataset into train and test
+    train_dataset = subset(dataset, train_ids)
+    train_loader = dataloader(train_dataset, train=True, batch_size=10)
 
-        train_loader = dataloader(train_dataset, train=False, batch_size=len(train_dataset))
-        train_results.add_scores(evaluate(classifier, train_loader))
-        test_results.add_scores(evaluate(classifier, test_loader))
+    test_dataset = subset(dataset, test_ids)
+    test_loader = dataloader(test_dataset, train=False, batch_size=len(test_dataset))
 
-    return train_results, test_results
+    classifier, _ = train(classifier, train_loader, test_loader, max_iter, prefix)
+
+    train_loader = dataloader(train_dataset, train=False, batch_size=len(train_dataset))
+    return evaluate(classifier, train_loader), evaluate(classifier, test_loader)
 
 
 def evaluate(classifier, dataloader):
@@ -105,7 +174,7 @@ def evaluate(classifier, dataloader):
 
     :param classifier: SGDClassifier
         The classifier to evaluate.
-    :param dataloader: Dataloader
+    :param dataloader: BatchLoader
         The dataloader containing the data to evaluate the classifier on.
     :return: dict
         A dictionary containing the scores of the classifier on the dataset contained in the dataloader. Keys:
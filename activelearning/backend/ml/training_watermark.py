@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+
+from django.conf import settings
+
+from backend.atomic_files import write_atomic
+from backend.ml.feature_store import hash_json
+
+"""
+File containing the watermark of the trained models: the snapshot of the labels of each article each model was trained
+on, and the articles that were scored with the current quote detection model. It allows the models to be trained only
+on newly labeled articles, and only the articles whose scores can have changed to be scored again.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+""" The default path of the watermark, which can be overridden with TRAINING_WATERMARK_PATH in the settings. """
+path_training_watermark = 'data/training_watermark.json'
+
+
+""" The key of the articles scored with the quote detection model in the watermark. """
+CONFIDENCE = 'confidence'
+
+
+def watermark_path():
+    """
+    :return: string.
+        The path of the watermark described by the TRAINING_WATERMARK_PATH setting.
+    """
+    return getattr(settings, 'TRAINING_WATERMARK_PATH', path_training_watermark)
+
+
+def load_watermark(path=None):
+    """
+    :param path: string.
+        The path of the watermark. If None, the path of the settings is used.
+    :return: dict.
+        The watermark, which is empty if no model was trained yet or if it can't be read.
+    """
+    if path is None:
+        path = watermark_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logger.warning(f'Could not load the training watermark from {path}', exc_info=True)
+        return {}
+
+
+def save_watermark(watermark, path=None):
+    """
+    Saves the watermark. Failing to write it only means that the models will be trained again from scratch.
+
+    :param watermark: dict.
+        The watermark.
+    :param path: string.
+        The path of the watermark. If None, the path of the settings is used.
+    """
+    if path is None:
+        path = watermark_path()
+    try:
+        write_atomic(path, lambda f: json.dump(watermark, f), binary=False)
+    except OSError:
+        logger.warning(f'Could not save the training watermark in {path}', exc_info=True)
+
+
+def trained_snapshots(watermark, model, parameters):
+    """
+    :param watermark: dict.
+        The watermark.
+    :param model: string.
+        The name of the model.
+    :param parameters: dict.
+        The parameters of the model and of its features, which must be serializable to JSON.
+    :return: dict(int, string).
+        The snapshot of each article the saved model was trained on, or None if it was trained with other parameters.
+    """
+    trained = watermark.get(model)
+    if trained is None or trained['parameters'] != parameters:
+        return None
+    return {int(article_id): snapshot for article_id, snapshot in trained['articles'].items()}
+
+
+def model_version(watermark, model):
+    """
+    :param watermark: dict.
+        The watermark.
+    :param model: string.
+        The name of the model.
+    :return: int.
+        The number of times the model was trained, which is 0 if it was never trained.
+    """
+    return watermark.get(model, {}).get('version', 0)
+
+
+def set_trained(watermark, model, parameters, snapshots, updated):
+    """
+    Records the articles a model was trained on in the watermark.
+
+    :param watermark: dict.
+        The watermark.
+    :param model: string.
+        The name of the model.
+    :param parameters: dict.
+        The parameters of the model and of its features, which must be serializable to JSON.
+    :param snapshots: dict(int, string).
+        The snapshot of each article the model was trained on.
+    :param updated: boolean.
+        Whether the model was trained, or was kept as it was.
+    """
+    watermark[model] = {
+        'parameters': parameters,
+        'version': model_version(watermark, model) + int(updated),
+        'articles': {str(article_id): snapshot for article_id, snapshot in snapshots.items()},
+    }
+
+
+def scoring_snapshot(article):
+    """
+    :param article: models.Article.
+        An article that isn't fully labeled.
+    :return: string.
+        The hash of the labels of the sentences of the article, which are used to compute its confidences.
+    """
+    return hash_json(article.labeled['labeled'])
+
+
+def scored_articles(watermark, version):
+    """
+    :param watermark: dict.
+        The watermark.
+    :param version: int.
+        The version of the quote detection model.
+    :return: dict(int, string), float
+        The scoring snapshot of each article scored with this version of the model, and the largest hinge value used to
+        normalize their confidences. Both are empty if the articles were scored with another version.
+    """
+    scored = watermark.get(CONFIDENCE)
+    if scored is None or scored['version'] != version:
+        return {}, 0
+    return {int(article_id): snapshot for article_id, snapshot in scored['articles'].items()}, scored['max_hinge_value']
+
+
+def set_scored(watermark, version, snapshots, max_hinge_value):
+    """
+    Records the articles scored with a version of the quote detection model in the watermark.
+
+    :param watermark: dict.
+        The watermark.
+    :param version: int.
+        The version of the quote detection model.
+    :param snapshots: dict(int, string).
+        The scoring snapshot of each article scored with this version of the model.
+    :param max_hinge_value: float.
+        The largest hinge value used to normalize the confidences.
+    """
+    watermark[CONFIDENCE] = {
+        'version': version,
+        'max_hinge_value': float(max_hinge_value),
+        'articles': {str(article_id): snapshot for article_id, snapshot in snapshots.items()},
+    }
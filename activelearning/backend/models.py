@@ -1,27 +1,35 @@
 from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models.fields import TextField, IntegerField, BooleanField, CharField
+from django.db.models.fields import TextField, IntegerField, BooleanField, CharField, FloatField, BinaryField
+
+from backend.encoding import encode_ints, decode_ints, encode_bits, decode_bits, encode_tokens, decode_tokens
 
 
 class Article(models.Model):
     """
     Represents an article table
     """
+    # The large fields that never change once the article is added. Queries that only need the status of articles
+    # should defer them.
+    PAYLOAD_FIELDS = ['text', 'people', 'tokens_data', 'in_quotes_data']
+
     name = CharField(max_length=200)
     # String representation of the article's XML file.
     text = TextField()
     # List of unique people cited in the article
     people = JSONField()
-    # Article text surrounded by a list of tokens
-    tokens = JSONField()
-    # List of all sentence indices that are the ends of paragraphs
-    paragraphs = JSONField()
-    # List of all token indices that are the ends of sentences
-    sentences = JSONField()
+    # The arrays of the article never change once it is added, so they are only stored in compact binary encodings,
+    # which are read without parsing JSON using the accessors below.
+    # The tokens of the article text, as a length-prefixed buffer
+    tokens_data = BinaryField()
+    # The index of the last sentence of each paragraph, as 32-bit integers
+    paragraphs_data = BinaryField()
+    # The index of the last token of each sentence, as 32-bit integers
+    sentences_data = BinaryField()
     # List of boolean values {0, 1} representing if a sentence is fully labeled or
     labeled = JSONField()
-    # List of boolean values {0, 1} representing if a token is in between quotes or not
-    in_quotes = JSONField()
+    # Boolean values {0, 1} representing if a token is in between quotes or not, packed 8 per byte
+    in_quotes_data = BinaryField()
     # List of values, where value j is in (0, 1) representing the confidence of the current ML models predictions in
     # deciding if sentence j is a quote or not. 1 means absolute confidence, while 0 means completely unsure.
     confidence = JSONField()
@@ -32,6 +40,57 @@ class Article(models.Model):
     # Date of instance creation
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @staticmethod
+    def encode_arrays(tokens, paragraphs, sentences, in_quotes):
+        """
+        :param tokens: list(string).
+            The tokens of the article.
+        :param paragraphs: list(int).
+            The index of the last sentence of each paragraph.
+        :param sentences: list(int).
+            The index of the last token of each sentence.
+        :param in_quotes: list(int).
+            For each token, 1 if it's in between quotes, 0 if it's not.
+        :return: dict.
+            The binary fields of an article with these arrays, to create it.
+        """
+        return {
+            'tokens_data': encode_tokens(tokens),
+            'paragraphs_data': encode_ints(paragraphs),
+            'sentences_data': encode_ints(sentences),
+            'in_quotes_data': encode_bits(in_quotes),
+        }
+
+    def _decoded(self, field, decode):
+        """ Decodes a binary field once, as it never changes. """
+        decoded = self.__dict__.setdefault('_decoded_arrays', {})
+        if field not in decoded:
+            decoded[field] = decode(getattr(self, field))
+        return decoded[field]
+
+    def token_list(self, start=0, end=None):
+        """
+        :param start: int.
+            The index of the first token.
+        :param end: int.
+            The index after the last token. If None, all tokens until the end of the article are returned.
+        :return: list(string).
+            The tokens of the article from start to end. Only these tokens are decoded.
+        """
+        return decode_tokens(self.tokens_data, start, end)
+
+    def in_quotes_array(self):
+        """ :return: np.array. Whether each token is between quotes or not. """
+        return self._decoded('in_quotes_data', decode_bits)
+
+    def sentences_array(self):
+        """ :return: np.array. The index of the last token of each sentence. """
+        return self._decoded('sentences_data', decode_ints)
+
+    def paragraphs_array(self):
+        """ :return: np.array. The index of the last sentence of each paragraph. """
+        return self._decoded('paragraphs_data', decode_ints)
+
     def __str__(self):
         return f'Article id: {self.id}'
 
@@ -55,6 +114,102 @@ class UserLabel(models.Model):
     # Date of instance creation
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_id', 'article', 'sentence_index'], name='userlabel_session_idx'),
+        ]
+
     def __str__(self):
         return f'Label id: {self.id}, Session id: {self.session_id}, {self.article}, Sentence Number: ' \
                f'{self.sentence_index}'
+
+
+class SentenceConsensus(models.Model):
+    """
+    The consensus of the user labels of a sentence, updated every time a user labels the sentence.
+    """
+    # Each consensus is for a sentence in a particular article
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    # The index of the sentence in the article
+    sentence_index = IntegerField()
+    # The labels for each token that most users agree on
+    labels = JSONField()
+    # The token indices of the author that most users agree on
+    authors = JSONField()
+    # The proportion of users that agree on the labels and authors, between 0 and 1
+    consensus = FloatField()
+    # The number of user labels for the sentence, not counting the ones of users who didn't know how to label it
+    count = IntegerField()
+    # If one of the user labels was added by an admin user
+    has_admin = BooleanField()
+    # The number of user labels of each distinct labels and authors, which is updated with every new user label
+    tally = JSONField(default=dict)
+
+    class Meta:
+        unique_together = ('article', 'sentence_index')
+
+    def __str__(self):
+        return f'Consensus for {self.article}, Sentence Number: {self.sentence_index}'
+
+
+class LabellingTask(models.Model):
+    """
+    A sentence or paragraph that still needs to be labelled, kept up to date every time the labels or the confidences
+    of its article change, so that the next task of a user can be found with a single query.
+    """
+    PARAGRAPH = 'paragraph'
+    SENTENCE = 'sentence'
+    # Paragraph tasks come first in alphabetical order, so they are served before the sentence task of their first
+    # sentence.
+    TASK_TYPES = [(PARAGRAPH, 'Paragraph'), (SENTENCE, 'Sentence')]
+
+    # Each task is for some sentences in a particular article
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    # The index of the first sentence of the task
+    first_sentence = IntegerField()
+    # The index of the last sentence of the task
+    last_sentence = IntegerField()
+    # The index of the paragraph, for paragraph tasks
+    paragraph_index = IntegerField(null=True)
+    # If the whole paragraph or only some sentences need to be labelled
+    task_type = CharField(max_length=10, choices=TASK_TYPES)
+    # The minimum confidence of the article. Tasks with the lowest priority are labelled first.
+    priority = FloatField()
+    # The newspaper in which the article was published
+    source = CharField(max_length=200)
+
+    class Meta:
+        unique_together = ('article', 'first_sentence', 'task_type')
+        indexes = [
+            models.Index(fields=['priority', 'article', 'first_sentence', 'task_type'], name='task_priority_idx'),
+            models.Index(fields=['source', 'priority', 'article', 'first_sentence', 'task_type'],
+                         name='task_source_priority_idx'),
+        ]
+
+    def __str__(self):
+        return f'Task: {self.task_type}, {self.article}, Sentences: {self.first_sentence}-{self.last_sentence}'
+
+
+class TaskLease(models.Model):
+    """
+    Reserves a sentence for a user for a short time, so that the labelling tasks containing it aren't given to other
+    users at the same time.
+    """
+    # Each lease is for a sentence in a particular article
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    # The index of the leased sentence
+    sentence_index = IntegerField()
+    # The session id of the user who holds the lease
+    session_id = CharField(max_length=50)
+    # The date at which the tasks can be given to other users again
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('article', 'sentence_index')
+        indexes = [
+            models.Index(fields=['expires_at'], name='lease_expires_idx'),
+            models.Index(fields=['session_id'], name='lease_session_idx'),
+        ]
+
+    def __str__(self):
+        return f'Lease: {self.session_id}, {self.article}, Sentence Number: {self.sentence_index}'
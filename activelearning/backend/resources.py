@@ -0,0 +1,264 @@
+import csv
+import hashlib
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+
+from backend.xml_parsing.helpers import load_nlp
+
+""" File containing the registry of resources that are loaded once per worker and shared by all requests. """
+
+logger = logging.getLogger(__name__)
+
+
+""" The path to the file containing the cue verbs. """
+path_cue_verbs = 'data/cue_verbs.csv'
+
+
+class Resource:
+    """ A resource that is loaded once, and kept in memory until it is reloaded. """
+
+    def __init__(self, name, loader, path=None):
+        """
+        Creates a new resource, without loading it.
+
+        :param name: string
+            The name of the resource in the registry.
+        :param loader: function
+            The function, without parameters, that loads the resource.
+        :param path: string
+            The file from which the resource is loaded, if there is one. Used to reload the resource when it changes.
+        """
+        self.name = name
+        self.loader = loader
+        self.path = path
+        self.value = None
+        self.loaded = False
+        # The time it took to load the resource, in seconds.
+        self.load_time = 0
+        # The memory allocated while loading the resource, in bytes, or None if it wasn't measured.
+        self.memory = None
+        # The modification time of the file when the resource was loaded.
+        self.mtime = None
+        # A hash of the content of the file when the resource was loaded.
+        self.fingerprint = None
+
+    def load(self, profile_memory=False):
+        """
+        Loads the resource, measuring how long it takes.
+
+        :param profile_memory: boolean
+            Whether to also measure how much memory is allocated while loading the resource. Tracing the allocations
+            makes loading much slower, so it should only be done when the worker starts.
+        """
+        trace = profile_memory and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0] if profile_memory else 0
+        start = time.perf_counter()
+        try:
+            value = self.loader()
+        finally:
+            self.load_time = time.perf_counter() - start
+            memory_after = tracemalloc.get_traced_memory()[0] if profile_memory else 0
+            if trace:
+                tracemalloc.stop()
+        self.memory = max(memory_after - memory_before, 0) if profile_memory else None
+        self.mtime = file_mtime(self.path)
+        self.fingerprint = file_fingerprint(self.path)
+        self.value = value
+        self.loaded = True
+        logger.info(f'Loaded resource {self.name} in {self.load_time:.3f}s ({format_memory(self.memory)})')
+
+
+""" All registered resources, by name. """
+_registry = {}
+
+""" Lock ensuring that a resource is only loaded once, even if multiple threads need it at the same time. """
+_lock = threading.RLock()
+
+
+def format_memory(memory):
+    """
+    :param memory: int
+        A number of bytes, or None if it wasn't measured.
+    :return: string
+        The number of megabytes.
+    """
+    if memory is None:
+        return '-'
+    return f'{memory / 2 ** 20:.1f} MB'
+
+
+def file_mtime(path):
+    """
+    Finds the last modification time of a file.
+
+    :param path: string
+        The path to the file.
+    :return: float
+        The modification time, or None if there is no path or the file doesn't exist.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    return os.path.getmtime(path)
+
+
+def file_fingerprint(path):
+    """
+    Hashes the content of a file.
+
+    :param path: string
+        The path to the file.
+    :return: string
+        The hash of the file, or None if there is no path or the file doesn't exist.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def register(name, loader, path=None):
+    """
+    Adds a resource to the registry. It is only loaded the first time it is needed. Registering a resource a second
+    time with the same name replaces it.
+
+    :param name: string
+        The name of the resource.
+    :param loader: function
+        The function, without parameters, that loads the resource.
+    :param path: string
+        The file from which the resource is loaded, if there is one.
+    """
+    with _lock:
+        _registry[name] = Resource(name, loader, path)
+
+
+def unregister(name):
+    """
+    Removes a resource from the registry.
+
+    :param name: string
+        The name of the resource.
+    """
+    with _lock:
+        _registry.pop(name, None)
+
+
+def get(name, profile_memory=False):
+    """
+    Returns a resource, loading it if it wasn't loaded yet. The resource is shared by all callers, and must not be
+    modified.
+
+    :param name: string
+        The name of the resource.
+    :param profile_memory: boolean
+        Whether to measure the memory allocated while loading the resource, if it is loaded.
+    :return: object
+        The resource.
+    """
+    resource = _registry[name]
+    if not resource.loaded:
+        with _lock:
+            if not resource.loaded:
+                resource.load(profile_memory)
+    return resource.value
+
+
+def fingerprint(name):
+    """
+    Identifies the content of the file a resource was loaded from, loading the resource if it wasn't loaded yet.
+
+    :param name: string
+        The name of the resource.
+    :return: string
+        The hash of the file, or None if the resource wasn't loaded from a file.
+    """
+    get(name)
+    return _registry[name].fingerprint
+
+
+def preload(names=None):
+    """
+    Loads resources ahead of the first request that needs them. The memory allocated while loading them is only
+    measured if PROFILE_RESOURCE_MEMORY is set in the settings.
+
+    :param names: list(string)
+        The names of the resources to load. If None, all registered resources are loaded.
+    """
+    if names is None:
+        names = list(_registry.keys())
+    profile_memory = getattr(settings, 'PROFILE_RESOURCE_MEMORY', False)
+    for name in names:
+        get(name, profile_memory)
+    logger.info(f'Resources loaded:\n{report()}')
+
+
+def reload(name=None):
+    """
+    Loads a resource again, for example after the file it is loaded from changed.
+
+    :param name: string
+        The name of the resource to reload. If None, all resources that were already loaded are reloaded.
+    """
+    with _lock:
+        if name is None:
+            names = [n for n, resource in _registry.items() if resource.loaded]
+        else:
+            names = [name]
+        for n in names:
+            _registry[n].load()
+
+
+def reload_if_modified():
+    """
+    Reloads all loaded resources for which the file they were loaded from changed since they were loaded. Only the
+    modification times of the files are checked, so it can be called before handling each request.
+
+    :return: list(string)
+        The names of the resources that were reloaded.
+    """
+    modified = [name for name, resource in _registry.items()
+                if resource.loaded and resource.path is not None and file_mtime(resource.path) != resource.mtime]
+    for name in modified:
+        reload(name)
+    return modified
+
+
+def report():
+    """
+    Describes how long each loaded resource took to load and how much memory was allocated while loading it, if it was
+    measured.
+
+    :return: string
+        A table with a row for each loaded resource.
+    """
+    base = '{:<30} | {:>14} | {:>12}'
+    lines = [base.format('Resource', 'Load time (s)', 'Memory'), 62 * '-']
+    for name, resource in _registry.items():
+        if resource.loaded:
+            lines.append(base.format(name, f'{resource.load_time:.3f}', format_memory(resource.memory)))
+    return '\n'.join(lines)
+
+
+def load_cue_verbs(path=path_cue_verbs):
+    """
+    Loads the list of cue verbs, which are verbs that often introduce reported speech.
+
+    :param path: string
+        The path to the csv file containing the cue verbs.
+    :return: frozenset(string)
+        The cue verbs.
+    """
+    with open(path, 'r') as f:
+        reader = csv.reader(f)
+        return frozenset(list(reader)[0])
+
+
+register('nlp', load_nlp)
+register('cue_verbs', load_cue_verbs, path=path_cue_verbs)
@@ -0,0 +1,189 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+""" File containing the cache for the results of the API, keyed by the content of the request. """
+
+
+""" The default configuration of the result cache, which can be overridden with RESULT_CACHE in the settings. """
+DEFAULT_CONFIG = {
+    # Either 'local' (a cache in the memory of each worker) or 'django' (the Django cache framework).
+    'BACKEND': 'local',
+    # The maximum number of results kept by the local backend.
+    'MAX_SIZE': 4096,
+    # The number of seconds after which a result expires.
+    'TTL': 24 * 60 * 60,
+    # The Django cache used by the django backend.
+    'ALIAS': 'default',
+}
+
+
+class LocalBackend:
+    """ A least recently used cache, in the memory of the worker. """
+
+    def __init__(self, max_size, ttl):
+        """
+        :param max_size: int
+            The maximum number of results in the cache. The least recently used one is evicted when it is full.
+        :param ttl: float
+            The number of seconds after which a result expires.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DjangoBackend:
+    """ A cache shared by all workers, using one of the caches of the Django cache framework. """
+
+    def __init__(self, alias, ttl):
+        """
+        :param alias: string
+            The name of the cache in the CACHES setting.
+        :param ttl: float
+            The number of seconds after which a result expires.
+        """
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, timeout=self.ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResultCache:
+    """ Caches the results of the API, and counts how many requests were answered from the cache. """
+
+    def __init__(self, backend, prefix='results'):
+        """
+        :param backend: LocalBackend or DjangoBackend
+            Where the results are stored.
+        :param prefix: string
+            Prepended to all keys, so that the results don't collide with other entries of a shared cache.
+        """
+        self.backend = backend
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text, gender_overrides, model_version):
+        """
+        Computes the key of a request, which only depends on its content.
+
+        :param text: string
+            The normalized text of the article.
+        :param gender_overrides: dict
+            The lowercase first names whose gender is given by the request, mapped to their gender.
+        :param model_version: string
+            Identifies the models and resources used to compute the result.
+        :return: string
+            The key of the result.
+        """
+        content = json.dumps([text, sorted(gender_overrides.items()), model_version])
+        return f'{self.prefix}:{hashlib.sha256(content.encode("utf-8")).hexdigest()}'
+
+    def get(self, key):
+        """
+        Finds a result in the cache.
+
+        :param key: string
+            The key of the result.
+        :return: object
+            The result, or None if it isn't in the cache.
+        """
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Finds a result in the cache, or computes it and adds it to the cache if it isn't there.
+
+        :param key: string
+            The key of the result.
+        :param compute: function
+            The function, without parameters, that computes the result.
+        :return: object
+            The result.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """
+        :return: dict
+            The number of hits and misses since the worker started, and the proportion of hits.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0,
+        }
+
+
+def create_result_cache():
+    """
+    Creates the result cache described by the RESULT_CACHE setting.
+
+    :return: ResultCache
+        The result cache.
+    """
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'RESULT_CACHE', {}))
+    if config['BACKEND'] == 'local':
+        backend = LocalBackend(config['MAX_SIZE'], config['TTL'])
+    elif config['BACKEND'] == 'django':
+        backend = DjangoBackend(config['ALIAS'], config['TTL'])
+    else:
+        raise ValueError(f'Unknown result cache backend: {config["BACKEND"]}')
+    return ResultCache(backend)
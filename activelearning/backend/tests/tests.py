@@ -1,12 +1,15 @@
-import random
+from datetime import timedelta
 
 import spacy
 from django.test import TestCase
+from django.utils import timezone
 
-from backend.db_management import add_user_label_to_db, add_article_to_db, load_hardest_articles
+from backend.db_management import add_user_label_to_db, add_user_labels_to_db, add_article_to_db, \
+    request_labelling_task, request_labelling_tasks
 from backend.frontend_parsing.frontend_to_postgre import *
 from backend.frontend_parsing.postgre_to_frontend import *
 from backend.helpers import *
+from backend.models import TaskLease
 
 # Load the language model
 nlp = spacy.load('fr_core_news_md')
@@ -42,6 +45,18 @@ class HelperTestCase(TestCase):
         self.assertEquals(author, [62, 63, 64])
         self.assertEquals(cons, (4 + 3) / (2 * len(labels)))
 
+    def test_label_tally(self):
+        """ Tests that a tally updated with each new label gives the same consensus as label_consensus """
+        labels = [[0, 1, 1, 0], [0, 1, 1, 1], [0, 1, 1, 0], [1, 1, 1, 1], [0, 1, 1, 1]]
+        authors = [[3], [3], [], [3], [2]]
+        tally = LabelTally()
+        for i in range(len(labels)):
+            tally.add(labels[i], authors[i])
+            self.assertEquals(tally.consensus(), label_consensus(labels[:i + 1], authors[:i + 1]))
+            tally = LabelTally.from_json(tally.to_json())
+        self.assertEquals(tally.count, len(labels))
+        self.assertEquals(LabelTally().consensus(), ([], [], 0))
+
     def test_change_confidence(self):
         article = Article.objects.get(id=self.a1.id)
         # Changing confidences
@@ -226,6 +241,61 @@ class TaskParsingTestCase(TestCase):
         self.assertEquals(label_1.sentence_index, sentence_index_1)
         self.assertEquals(label_1.author_index['author_index'], author_index_1)
 
+    def test_sentence_consensus(self):
+        """ Tests that the consensus table is kept up to date with the user labels """
+        article_id = self.a1.id
+        add_user_label_to_db('0000', article_id, 0, [0, 0, 1, 1], [0], admin=False)
+        add_user_label_to_db('0001', article_id, 0, [0, 0, 1, 1], [0], admin=False)
+        add_user_label_to_db('0002', article_id, 0, [0, 0, 0, 1], [1], admin=False)
+        add_user_label_to_db('0003', article_id, 0, [], [], admin=False)
+        add_user_label_to_db('0004', article_id, 2, [1, 1, 1, 1], [], admin=True)
+
+        row = SentenceConsensus.objects.get(article_id=article_id, sentence_index=0)
+        self.assertEquals(row.count, 3)
+        self.assertFalse(row.has_admin)
+        self.assertTrue(SentenceConsensus.objects.get(article_id=article_id, sentence_index=2).has_admin)
+
+        article = Article.objects.get(id=article_id)
+        consensus = load_consensus([article])[article_id]
+        self.assertEquals(len(consensus), len(article.sentences_array()))
+        for sentence_index in range(len(consensus)):
+            self.assertEquals(consensus[sentence_index], aggregate_label(article, sentence_index))
+
+    def test_add_user_labels_to_db(self):
+        """ Tests that the labels of several sentences are added at once """
+        sentence_labels = [
+            {'index': 0, 'labels': [0, 0, 1, 1], 'authors': [0]},
+            {'index': 1, 'labels': [], 'authors': []},
+            {'index': 2, 'labels': [1, 1, 1, 1], 'authors': []},
+        ]
+        userlabels = add_user_labels_to_db('0000', self.a1.id, sentence_labels, admin=True)
+        self.assertEquals([userlabel.sentence_index for userlabel in userlabels], [0, 1, 2])
+        self.assertEquals(UserLabel.objects.filter(article_id=self.a1.id).count(), 3)
+        article = Article.objects.get(id=self.a1.id)
+        self.assertEquals(article.labeled['labeled'][:3], [1, 0, 1])
+        consensus = load_consensus([article])[self.a1.id]
+        for sentence_index in range(3):
+            self.assertEquals(consensus[sentence_index], aggregate_label(article, sentence_index))
+        self.assertIsNone(add_user_labels_to_db('0000', -1, sentence_labels, admin=False))
+
+    def test_aggregate_labels_bulk(self):
+        """ Tests that the consensus of all sentences loaded at once is the same as sentence by sentence, and as the
+        consensus stored in the SentenceConsensus table """
+        self.a2 = add_article_to_db('../data/article02clean.xml', nlp, 'Heidi.News')
+        add_user_label_to_db('0000', self.a1.id, 0, [0, 0, 1, 1], [0], admin=False)
+        add_user_label_to_db('0001', self.a1.id, 0, [0, 0, 0, 1], [1], admin=False)
+        add_user_label_to_db('0002', self.a1.id, 1, [], [], admin=False)
+        add_user_label_to_db('0003', self.a2.id, 1, [1, 1, 1, 1], [2], admin=True)
+
+        consensus = aggregate_labels_bulk([self.a1.id, self.a2.id])
+        self.assertEquals(set(consensus.keys()), {self.a1.id, self.a2.id})
+        for article_id in [self.a1.id, self.a2.id]:
+            article = Article.objects.get(id=article_id)
+            self.assertEquals(len(consensus[article_id]), len(article.sentences_array()))
+            for sentence_index in range(len(consensus[article_id])):
+                self.assertEquals(consensus[article_id][sentence_index], aggregate_label(article, sentence_index))
+        self.assertEquals(load_consensus(Article.objects.filter(id__in=[self.a1.id, self.a2.id])), consensus)
+
 
 class TaskLoadingTestCase(TestCase):
 
@@ -235,6 +305,81 @@ class TaskLoadingTestCase(TestCase):
         self.a2 = add_article_to_db('../data/article02clean.xml', nlp, 'Heidi.News')
         self.a3 = add_article_to_db('../data/article03clean.xml', nlp, 'Heidi.News')
 
+    def test_request_labelling_task(self):
+        """ Tests that tasks are served from the hardest article, skipping the sentences already labelled by the user """
+        self.assertEquals(LabellingTask.objects.filter(article=self.a1, task_type='sentence').count(),
+                          len(self.a1.sentences_array()))
+        task = request_labelling_task('0000')
+        self.assertEquals(task['article_id'], self.a1.id)
+        self.assertEquals(task['task'], 'sentence')
+        self.assertEquals(task['sentence_id'][0], 0)
+
+        add_user_label_to_db('0000', self.a1.id, 0, [], [], admin=False)
+        self.assertEquals(request_labelling_task('0000')['sentence_id'][0], 1)
+        self.assertEquals(request_labelling_task('0001')['sentence_id'][0], 0)
+
+        # Sentences labelled by an admin don't need to be labelled anymore, and sentence 1 is leased to 0000
+        add_user_label_to_db('0002', self.a1.id, 0, len(task['data']) * [0], [], admin=True)
+        self.assertEquals(request_labelling_task('0001')['sentence_id'][0], 2)
+
+    def test_refresh_labelling_tasks(self):
+        """ Tests that refreshing only the tasks of the labelled sentences gives the tasks of the whole article """
+        sentence_ends = self.a1.sentences_array().tolist()
+        add_user_label_to_db('0000', self.a1.id, 1, (sentence_ends[1] - sentence_ends[0]) * [0], [], admin=True)
+        article = Article.objects.get(id=self.a1.id)
+        expected = {(task.first_sentence, task.task_type, task.last_sentence)
+                    for task in article_labelling_tasks(article)}
+        stored = set(LabellingTask.objects.filter(article=article)
+                     .values_list('first_sentence', 'task_type', 'last_sentence'))
+        self.assertEquals(stored, expected)
+        self.assertNotIn((1, 'sentence'), {(first, task_type) for first, task_type, _ in stored})
+
+    def test_task_leases(self):
+        """ Tests that tasks given to a user aren't given to other users until their lease expires """
+        tasks = request_labelling_tasks('0000', 2)
+        self.assertEquals([task['sentence_id'][0] for task in tasks], [0, 1])
+        self.assertEquals(request_labelling_task('0001')['sentence_id'][0], 2)
+
+        # Submitting a label releases the lease of the sentence
+        add_user_label_to_db('0000', self.a1.id, 0, [], [], admin=False)
+        self.assertEquals(request_labelling_task('0002')['sentence_id'][0], 0)
+
+        # Expired leases are ignored
+        TaskLease.objects.update(expires_at=timezone.now())
+        self.assertEquals(request_labelling_task('0003')['sentence_id'][0], 0)
+
+    def test_overlapping_task_leases(self):
+        """ Tests that a task isn't given if any of its sentences is leased, or with tasks that overlap it """
+        par_ends = [-1] + self.a1.paragraphs_array().tolist()
+        index = next(i for i in range(len(par_ends) - 1) if par_ends[i + 1] - par_ends[i] > 2)
+        first_sentence, last_sentence = par_ends[index] + 1, par_ends[index + 1]
+        LabellingTask.objects.create(article=self.a1, first_sentence=first_sentence, last_sentence=last_sentence,
+                                     paragraph_index=index, task_type=LabellingTask.PARAGRAPH, priority=-1,
+                                     source=self.a1.source)
+
+        # The paragraph is skipped while one of its sentences is leased
+        TaskLease.objects.create(article=self.a1, sentence_index=last_sentence, session_id='0001',
+                                 expires_at=timezone.now() + timedelta(minutes=5))
+        self.assertEquals(request_labelling_task('0000')['task'], 'sentence')
+
+        # The sentences of the paragraph aren't given with it
+        TaskLease.objects.all().delete()
+        tasks = request_labelling_tasks('0000', 2)
+        self.assertEquals([task['task'] for task in tasks], ['paragraph', 'sentence'])
+        self.assertEquals(tasks[0]['sentence_id'], list(range(first_sentence, last_sentence + 1)))
+        self.assertNotIn(tasks[1]['sentence_id'][0], tasks[0]['sentence_id'])
+        self.assertEquals(set(TaskLease.objects.values_list('sentence_index', flat=True)),
+                          set(tasks[0]['sentence_id'] + tasks[1]['sentence_id']))
+
+    def test_deferred_payload(self):
+        """ Tests that saving articles loaded without their payload doesn't change the payload """
+        article = Article.objects.get(id=self.a1.id)
+        add_user_label_to_db('0000', self.a1.id, 0, len(article.token_list()) * [0], [], admin=True)
+        updated = Article.objects.get(id=self.a1.id)
+        self.assertEquals(updated.labeled['labeled'][0], 1)
+        for field in Article.PAYLOAD_FIELDS:
+            self.assertEquals(getattr(updated, field), getattr(article, field))
+
     def test_load_paragraph_above(self):
         data = load_paragraph_above(self.a1.id, 0)
         self.assertEquals(data['data'], [])
@@ -282,23 +427,45 @@ class TaskLoadingTestCase(TestCase):
                                          ". ", "Comme ", "camouflage ", "vis-à-vis ", "des ", "proies", ", ", "il ",
                                          "y ", "a ", "mieux", "!"])
 
-    def test_load_hardest_articles(self):
-        """Checks that the method to extract the hardest articles to predict works"""
-        # Generate new confidence numbers, between 0 and 10000
-        # (It will be between 0 and 100 in reality but more variance is needed here)
-        confidences = []
-        for (i, a) in enumerate(Article.objects.all()):
-            old_confidences = a.confidence['confidence']
-            new_confidences = [random.randint(0, 10000) for _ in old_confidences]
-            min_confidence = min(new_confidences)
-            a.confidence = {'confidence': new_confidences, 'min_confidence': min_confidence}
-            a.save()
-            confidences.append(min_confidence)
-
-        confidences.sort(key=lambda x: x)
-        confidences = confidences[:2]
-
-        for i, a in enumerate(load_hardest_articles(2)):
-            min_conf = a.confidence['min_confidence']
-            self.assertEquals(min_conf, confidences[i])
-        return
+    def test_load_context(self):
+        """ Checks that loading several paragraphs at once is the same as loading them one by one """
+        n_sentences = len(self.a1.sentences_array())
+        for sentence_id in range(n_sentences):
+            for n_paragraphs in [1, 2, 3]:
+                context = load_context(self.a1.id, sentence_id, sentence_id, n_paragraphs)
+                above = {'data': [], 'first_sentence': sentence_id, 'last_sentence': -1}
+                below = {'data': [], 'first_sentence': -1, 'last_sentence': sentence_id}
+                for _ in range(n_paragraphs):
+                    data = load_paragraph_above(self.a1.id, above['first_sentence'])
+                    if data['first_sentence'] >= 0:
+                        above = {'data': data['data'] + above['data'], 'first_sentence': data['first_sentence'],
+                                 'last_sentence': max(above['last_sentence'], data['last_sentence'])}
+                    data = load_paragraph_below(self.a1.id, below['last_sentence'])
+                    if data['last_sentence'] >= 0:
+                        below = {'data': below['data'] + data['data'], 'last_sentence': data['last_sentence'],
+                                 'first_sentence': data['first_sentence'] if below['first_sentence'] < 0
+                                 else below['first_sentence']}
+                if above['last_sentence'] < 0:
+                    above['first_sentence'] = -1
+                if below['first_sentence'] < 0:
+                    below['last_sentence'] = -1
+                self.assertEquals(context, {'above': above, 'below': below})
+        self.assertIsNone(load_context(-1, 0, 0, 1))
+
+    def test_context_cache_headers(self):
+        """ Checks that only the successful context responses can be stored by browsers and proxies """
+        response = self.client.get('/api/loadContext/', {'article_id': self.a1.id, 'first_sentence': 0,
+                                                         'last_sentence': 0})
+        self.assertTrue(response.json()['Success'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response.has_header('ETag'))
+
+        response = self.client.get('/api/loadContext/', {'article_id': self.a1.id})
+        self.assertEquals(response.json()['reason'], 'KeyError')
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertFalse(response.has_header('ETag'))
+
+        response = self.client.get('/api/loadContext/', {'article_id': -1, 'first_sentence': 0, 'last_sentence': 0})
+        self.assertEquals(response.json()['reason'], 'Invalid Article ID')
+        self.assertNotIn('public', response['Cache-Control'])
@@ -563,13 +563,13 @@ class SingleUserTestCase(TestCase):
         def check_article(article, name, data):
             self.assertEquals(article.name, name)
             self.assertEquals(article.text, data['input_xml'])
-            self.assertEquals(article.tokens['tokens'], [token for sentence_tokens in data['tokens']
-                                                         for token in sentence_tokens])
-            self.assertEquals(article.sentences['sentences'], data['sentence_ends'])
-            self.assertEquals(article.paragraphs['paragraphs'], data['paragraph_ends'])
+            self.assertEquals(article.token_list(), [token for sentence_tokens in data['tokens']
+                                                     for token in sentence_tokens])
+            self.assertEquals(article.sentences_array().tolist(), data['sentence_ends'])
+            self.assertEquals(article.paragraphs_array().tolist(), data['paragraph_ends'])
             self.assertEquals(article.labeled['labeled'], len(data['sentence_ends']) * [0])
-            self.assertEquals(article.in_quotes['in_quotes'], [in_quote for sentence_in_quote in data['in_quotes']
-                                                               for in_quote in sentence_in_quote])
+            self.assertEquals(article.in_quotes_array().tolist(), [in_quote for sentence_in_quote in data['in_quotes']
+                                                                   for in_quote in sentence_in_quote])
             self.assertEquals(article.confidence['confidence'], len(data['sentence_ends']) * [0])
             self.assertEquals(article.confidence['min_confidence'], 0)
             self.assertEquals(article.admin_article, False)
@@ -27,28 +27,28 @@ class ArticleParsingTestCase(TestCase):
             parsed_article = json.load(file)
         article = Article.objects.all()[0]
         tokens = parsed_article['tokens']
-        self.assertEqual(article.tokens['tokens'], tokens)
+        self.assertEqual(article.token_list(), tokens)
 
     def test_articles_paragraph_ends(self):
         with open('../data/article01Parsed.txt', 'r') as file:
             parsed_article = json.load(file)
         article = Article.objects.all()[0]
         paragraphs = parsed_article['paragraphs']
-        self.assertEqual(article.paragraphs['paragraphs'], paragraphs)
+        self.assertEqual(article.paragraphs_array().tolist(), paragraphs)
 
     def test_articles_sentence_ends(self):
         with open('../data/article01Parsed.txt', 'r') as file:
             parsed_article = json.load(file)
         article = Article.objects.all()[0]
         sentences = parsed_article['sentences']
-        self.assertEqual(article.sentences['sentences'], sentences)
+        self.assertEqual(article.sentences_array().tolist(), sentences)
 
     def test_articles_in_quotes(self):
         with open('../data/article01Parsed.txt', 'r') as file:
             parsed_article = json.load(file)
         article = Article.objects.all()[0]
         in_quotes = parsed_article['in_quotes']
-        self.assertEqual(article.in_quotes['in_quotes'], in_quotes)
+        self.assertEqual(article.in_quotes_array().tolist(), in_quotes)
 
     def test_articles_confidence(self):
         with open('../data/article01Parsed.txt', 'r') as file:
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from backend.atomic_files import write_atomic
+
+
+class AtomicFilesTestCase(TestCase):
+    """ Test class for the writing of files through temporary files """
+
+    def test_0_write(self):
+        """ Tests that the file is written in its directory, without leaving temporary files """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'article', 'a.txt')
+            write_atomic(path, lambda f: f.write('content'), binary=False)
+            with open(path, 'r') as f:
+                self.assertEquals(f.read(), 'content')
+            self.assertEquals(os.listdir(os.path.dirname(path)), ['a.txt'])
+
+    def test_1_prune(self):
+        """ Tests that pruning removes the other files of the directory, except temporary files """
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ['a.bin', 'b.bin', 'c.bin.1.tmp']:
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(b'old')
+            write_atomic(os.path.join(directory, 'b.bin'), lambda f: f.write(b'new'), prune=True)
+            self.assertEquals(sorted(os.listdir(directory)), ['b.bin', 'c.bin.1.tmp'])
+
+    def test_2_failure(self):
+        """ Tests that a failed write keeps the previous file and removes the temporary file """
+        def write(f):
+            f.write(b'partial')
+            raise OSError('disk full')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'a.bin')
+            write_atomic(path, lambda f: f.write(b'old'))
+            with self.assertRaises(OSError):
+                write_atomic(path, write, prune=True)
+            with open(path, 'rb') as f:
+                self.assertEquals(f.read(), b'old')
+            self.assertEquals(os.listdir(directory), ['a.bin'])
@@ -0,0 +1,74 @@
+import numpy as np
+from django.test import TestCase
+
+from backend.ml.batches import FEATURE_TYPE, ArrayDataset, Subset, balanced_weights, batch_loader
+
+
+class FakeDataset(ArrayDataset):
+    """ Dataset with a single feature, equal to the index of each datapoint, with two datapoints per article """
+
+    def __init__(self, labels):
+        article_ids = list(range(len(labels) // 2))
+        features = [[np.array([2 * a_id]), np.array([2 * a_id + 1])] for a_id in article_ids]
+        self.set_articles(article_ids, features, [labels[2 * a_id:2 * a_id + 2] for a_id in article_ids])
+
+
+class BatchLoaderTestCase(TestCase):
+    """ Test class for the loading of batches of datasets """
+
+    def setUp(self):
+        self.dataset = FakeDataset([0, 0, 0, 1, 0, 1, 0, 2])
+
+    def test_0_balanced_weights(self):
+        """ Tests that both classes are sampled as often, and that other classes are never sampled """
+        weights, num_samples = balanced_weights(self.dataset.arrays()[1])
+        self.assertEquals(num_samples, 4)
+        self.assertAlmostEqual(weights.sum(), 1)
+        self.assertAlmostEqual(weights[[0, 1, 2, 4, 6]].sum(), 0.5)
+        self.assertAlmostEqual(weights[[3, 5]].sum(), 0.5)
+        self.assertEquals(weights[7], 0)
+
+    def test_1_evaluation_batches(self):
+        """ Tests that evaluation batches contain all datapoints in order """
+        loader = batch_loader(self.dataset, train=False, batch_size=3)
+        self.assertEquals(len(loader), 3)
+        features = np.concatenate([X for X, _ in loader])
+        labels = np.concatenate([y for _, y in loader])
+        np.testing.assert_array_equal(features[:, 0], np.arange(8))
+        np.testing.assert_array_equal(labels, self.dataset.labels)
+
+    def test_2_training_batches(self):
+        """ Tests that training batches are sampled from the subset, with the labels of the sampled datapoints """
+        subset = Subset(self.dataset, [0, 1, 3, 5, 7])
+        loader = batch_loader(subset, train=True, batch_size=3)
+        self.assertEquals(len(loader), 2)
+        for X, y in loader:
+            self.assertLessEqual(len(y), 3)
+            for index, label in zip(X[:, 0], y):
+                self.assertIn(index, [0, 1, 3, 5])
+                self.assertEquals(label, self.dataset.labels[int(index)])
+
+    def test_3_contiguous_arrays(self):
+        """ Tests that the datapoints are stored in a single matrix, and that contiguous subsets aren't copied """
+        self.assertEquals(self.dataset.features.shape, (8, 1))
+        self.assertEquals(self.dataset.features.dtype, FEATURE_TYPE)
+        np.testing.assert_array_equal(self.dataset.article_indices([2, 0]), [4, 5, 0, 1])
+        contiguous = Subset(self.dataset, self.dataset.article_indices([1, 2]))
+        features, labels = contiguous.arrays()
+        np.testing.assert_array_equal(features[:, 0], [2, 3, 4, 5])
+        self.assertTrue(np.shares_memory(features, self.dataset.features))
+        features, labels = Subset(self.dataset, self.dataset.article_indices([0, 3])).arrays()
+        np.testing.assert_array_equal(features[:, 0], [0, 1, 6, 7])
+        np.testing.assert_array_equal(labels, [0, 0, 0, 2])
+
+    def test_4_fill_articles(self):
+        """ Tests that articles are filled in the rows allocated for them, including articles without datapoints """
+        dataset = ArrayDataset()
+        dataset.allocate_articles([5, 6, 7], [2, 0, 1])
+        dataset.fill_article(2, [np.array([4, 5])], [1])
+        dataset.fill_article(1, [], [])
+        dataset.fill_article(0, [np.array([0, 1]), np.array([2, 3])], [0, 2])
+        np.testing.assert_array_equal(dataset.features, [[0, 1], [2, 3], [4, 5]])
+        np.testing.assert_array_equal(dataset.labels, [0, 2, 1])
+        self.assertEquals(dataset.article_range(6), (2, 2))
+        self.assertEquals(dataset.article_range(7), (2, 3))
@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+import spacy
+from django.test import TestCase
+
+from backend.doc_cache import cache_path, cached_parsed_article, load_paragraph_docs, store_paragraph_docs
+from backend.models import Article
+from backend.xml_parsing.xml_to_postgre import ParsedArticle, parse_paragraphs
+
+
+class DocCacheTestCase(TestCase):
+    """ Test class for the cache of the parsed paragraphs of articles """
+
+    # Load the language model
+    nlp = spacy.load('fr_core_news_md')
+
+    def setUp(self):
+        with open('../data/article01.xml', 'r') as file:
+            self.text = file.read().replace('&', '&amp;')
+        self.article = Article(id=1, text=self.text)
+
+    def test_0_roundtrip(self):
+        """ Tests that cached paragraphs have the same tokens, sentences and entities """
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(load_paragraph_docs(1, self.text, self.nlp, directory))
+            docs = parse_paragraphs(self.text, self.nlp)
+            store_paragraph_docs(1, self.text, docs, self.nlp, directory)
+            cached = load_paragraph_docs(1, self.text, self.nlp, directory)
+            self.assertEquals([doc.text for doc in cached], [doc.text for doc in docs])
+            self.assertEquals([[s.text for s in doc.sents] for doc in cached],
+                              [[s.text for s in doc.sents] for doc in docs])
+            self.assertEquals([[(e.start, e.end, e.label_) for e in doc.ents] for doc in cached],
+                              [[(e.start, e.end, e.label_) for e in doc.ents] for doc in docs])
+            self.assertEquals([[t.lemma_ for t in doc] for doc in cached], [[t.lemma_ for t in doc] for doc in docs])
+
+    def test_1_cached_parsed_article(self):
+        """ Tests that an article parsed from the cache is the same as an article parsed by the language model """
+        with tempfile.TemporaryDirectory() as directory:
+            parsed = cached_parsed_article(self.article, self.nlp, directory)
+            self.assertTrue(os.path.exists(cache_path(1, self.text, self.nlp, directory)))
+            cached = cached_parsed_article(self.article, self.nlp, directory)
+            expected = ParsedArticle(self.text, self.nlp)
+            for result in [parsed, cached]:
+                self.assertEquals(result.tokens, expected.tokens)
+                self.assertEquals(result.sentences, expected.sentences)
+                self.assertEquals(result.in_quotes, expected.in_quotes)
+                self.assertEquals(result.people, expected.people)
+                self.assertEquals([s.text for s in result.sentence_docs], [s.text for s in expected.sentence_docs])
+
+    def test_2_changed_text(self):
+        """ Tests that the paragraphs of a previous text of an article aren't used, and are removed from the cache """
+        with tempfile.TemporaryDirectory() as directory:
+            cached_parsed_article(self.article, self.nlp, directory)
+            old_path = cache_path(1, self.text, self.nlp, directory)
+            self.article.text = self.text.replace('</p>', ' Fin.</p>', 1)
+            self.assertIsNone(load_paragraph_docs(1, self.article.text, self.nlp, directory))
+            cached_parsed_article(self.article, self.nlp, directory)
+            self.assertFalse(os.path.exists(old_path))
+            self.assertTrue(os.path.exists(cache_path(1, self.article.text, self.nlp, directory)))
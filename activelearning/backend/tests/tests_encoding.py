@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from backend.encoding import encode_ints, decode_ints, encode_floats, decode_floats, encode_bits, decode_bits, \
+    encode_tokens, decode_tokens
+from backend.models import Article
+
+
+class EncodingTestCase(TestCase):
+    """ Test class for the binary encodings of article arrays """
+
+    def test_0_ints(self):
+        values = [12, 34, 45, 92, 110]
+        self.assertEquals(decode_ints(encode_ints(values)).tolist(), values)
+        self.assertEquals(len(encode_ints(values)), 4 * len(values))
+
+    def test_1_floats(self):
+        values = [0, 0.5, 0.25, 1]
+        self.assertEquals(decode_floats(encode_floats(values)).tolist(), values)
+
+    def test_2_bits(self):
+        """ Tests that bits are packed 8 per byte, and that the number of values is kept """
+        values = [0, 1, 1, 1, 0, 0, 0, 0, 1, 1]
+        self.assertEquals(decode_bits(encode_bits(values)).tolist(), values)
+        self.assertEquals(len(encode_bits(values)), 4 + 2)
+        self.assertEquals(decode_bits(encode_bits([])).tolist(), [])
+
+    def test_3_tokens(self):
+        """ Tests that all tokens or only a range of tokens can be decoded """
+        tokens = ['L’', 'énigme ', 'était ', '', 'cachée ', '"']
+        encoded = encode_tokens(tokens)
+        self.assertEquals(decode_tokens(encoded), tokens)
+        self.assertEquals(decode_tokens(memoryview(encoded), 1, 3), tokens[1:3])
+        self.assertEquals(decode_tokens(encoded, 4), tokens[4:])
+        self.assertEquals(decode_tokens(encoded, 6), [])
+
+    def test_4_articles(self):
+        """ Tests that the arrays of articles are decoded from their binary fields once they are stored """
+        Article.objects.bulk_create([Article(
+            name='Article',
+            text='',
+            people={'people': [], 'mentions': []},
+            labeled={'labeled': [0, 0], 'fully_labeled': 0},
+            confidence={'confidence': [0.5, 0.5], 'predictions': [0, 0], 'min_confidence': 0.5},
+            admin_article=False,
+            source='Heidi.News',
+            **Article.encode_arrays(['Il ', 'a ', 'dit. ', '"Oui"'], [1], [2, 3], [0, 0, 0, 1]),
+        )])
+        article = Article.objects.get(name='Article')
+        self.assertEquals(article.token_list(), ['Il ', 'a ', 'dit. ', '"Oui"'])
+        self.assertEquals(article.token_list(1, 3), ['a ', 'dit. '])
+        self.assertEquals(article.paragraphs_array().tolist(), [1])
+        self.assertEquals(article.sentences_array().tolist(), [2, 3])
+        self.assertEquals(article.in_quotes_array().tolist(), [0, 0, 0, 1])
@@ -0,0 +1,33 @@
+import numpy as np
+from django.test import TestCase
+from sklearn.preprocessing import PolynomialFeatures
+
+from backend.ml.feature_expansion import expand_features
+
+
+class FeatureExpansionTestCase(TestCase):
+    """ Test class for the polynomial expansion of feature vectors """
+
+    def setUp(self):
+        self.features = np.array([[0, 1, 2, 3], [1, 0, 5, 1], [2, 2, 0, 7]])
+
+    def expand_each(self, poly, features):
+        return np.array([poly.fit_transform(vector.reshape((-1, 1))).reshape((-1,)) for vector in features])
+
+    def test_0_same_features(self):
+        """ Tests that the features are the same as when expanding each vector with PolynomialFeatures """
+        for poly in [PolynomialFeatures(2, interaction_only=True, include_bias=True),
+                     PolynomialFeatures(5, interaction_only=True, include_bias=True),
+                     PolynomialFeatures(2, interaction_only=False, include_bias=True),
+                     PolynomialFeatures(3, interaction_only=False, include_bias=False)]:
+            for features in [self.features, self.features / 3, self.features.astype(np.float32)]:
+                expected = self.expand_each(poly, features)
+                expanded = expand_features(features, poly)
+                self.assertEquals(expanded.dtype, expected.dtype)
+                np.testing.assert_array_equal(expanded, expected)
+                np.testing.assert_array_equal(expand_features(features[1], poly), expected[1])
+
+    def test_1_no_vectors(self):
+        """ Tests that a matrix without feature vectors is expanded to the number of expanded features """
+        poly = PolynomialFeatures(2, interaction_only=False, include_bias=True)
+        self.assertEquals(expand_features(np.zeros((0, 4)), poly).shape, (0, 12))
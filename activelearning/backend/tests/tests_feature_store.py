@@ -0,0 +1,70 @@
+from collections import namedtuple
+import os
+import tempfile
+
+import numpy as np
+from django.test import TestCase
+from sklearn.preprocessing import PolynomialFeatures
+
+from backend.ml.feature_store import FeatureStore
+
+""" The fields of articles used by the feature store. """
+FakeArticle = namedtuple('FakeArticle', ['id', 'text'])
+
+
+class FeatureStoreTestCase(TestCase):
+    """ Test class for the store of the features extracted from articles """
+
+    def setUp(self):
+        self.article = FakeArticle(1, '<article><p>Texte</p></article>')
+        self.labels = [[[0, 1], [], 0.75], [[0, 0], [], 1.0]]
+        self.extracted = ([np.array([1., 2., 3.]), np.array([4., 5., 6.])], [1, 0], 2, 3)
+        self.calls = 0
+
+    def extract(self):
+        self.calls += 1
+        return self.extracted
+
+    def assertExtracted(self, result):
+        features, labels, *info = result
+        self.assertEquals(len(features), 2)
+        for stored, expected in zip(features, self.extracted[0]):
+            np.testing.assert_array_equal(stored, expected)
+        self.assertEquals(labels, [1, 0])
+        self.assertEquals(info, [2, 3])
+
+    def test_0_hit(self):
+        """ Tests that stored features are loaded instead of being extracted again """
+        with tempfile.TemporaryDirectory() as directory:
+            store = FeatureStore('quote_detection', {'dire'}, PolynomialFeatures(2), directory=directory)
+            self.assertExtracted(store.article_features(self.article, self.labels, self.extract))
+            self.assertExtracted(store.article_features(self.article, self.labels, self.extract))
+            self.assertEquals(self.calls, 1)
+            self.assertEquals((store.hits, store.misses), (1, 1))
+            self.assertEquals(store.snapshots, {self.article.id: store.snapshot(self.article, self.labels)})
+
+    def test_1_snapshot(self):
+        """ Tests that the features are extracted again when the labels of the article change """
+        with tempfile.TemporaryDirectory() as directory:
+            store = FeatureStore('quote_detection', {'dire'}, directory=directory)
+            store.article_features(self.article, self.labels, self.extract)
+            old_path = store.article_path(self.article, self.labels)
+            new_labels = [[[0, 1], [], 0.75], [[1, 1], [], 1.0]]
+            store.article_features(self.article, new_labels, self.extract)
+            self.assertEquals(self.calls, 2)
+            self.assertFalse(os.path.exists(old_path))
+            self.assertTrue(os.path.exists(store.article_path(self.article, new_labels)))
+
+    def test_2_parameters(self):
+        """ Tests that features extracted with other parameters are stored separately """
+        with tempfile.TemporaryDirectory() as directory:
+            stores = [
+                FeatureStore('quote_detection', {'dire'}, directory=directory),
+                FeatureStore('quote_detection', {'dire', 'affirmer'}, directory=directory),
+                FeatureStore('quote_detection', {'dire'}, PolynomialFeatures(2), directory=directory),
+                FeatureStore('author_prediction', {'dire'}, directory=directory),
+            ]
+            self.assertEquals(len({store.directory for store in stores}), len(stores))
+            for store in stores:
+                store.article_features(self.article, self.labels, self.extract)
+            self.assertEquals(self.calls, len(stores))
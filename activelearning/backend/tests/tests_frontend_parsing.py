@@ -127,19 +127,21 @@ class PostgreToFrontendTestCase(TestCase):
             name=TEST_ARTICLE['name'],
             text=TEST_ARTICLE['text'],
             people={'people': []},
-            tokens={'tokens': [token for sentence_tokens in TEST_ARTICLE['tokens'] for token in sentence_tokens]},
-            paragraphs={'paragraphs': TEST_ARTICLE['paragraph_ends']},
-            sentences={'sentences': TEST_ARTICLE['sentence_ends']},
             labeled={
                 'labeled': len(TEST_ARTICLE['sentence_ends']) * [0],
                 'fully_labeled': 0,
             },
-            in_quotes={'in_quotes': TEST_ARTICLE['in_quotes']},
             confidence={
                 'confidence': len(TEST_ARTICLE['sentence_ends']) * [0],
                 'min_confidence': 0,
             },
             admin_article=False,
+            **Article.encode_arrays(
+                [token for sentence_tokens in TEST_ARTICLE['tokens'] for token in sentence_tokens],
+                TEST_ARTICLE['paragraph_ends'],
+                TEST_ARTICLE['sentence_ends'],
+                TEST_ARTICLE['in_quotes'],
+            ),
         )
 
     def check_keys_form(self, data):
@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from backend.gender import GenderResolver, gender_overrides
+
+
+class FakeDetector:
+    """ Detector with the same interface as gender_guesser, for a few names """
+
+    names = {
+        'Marie': {'female': ''},
+        'Jean': {'male': ''},
+        'Camille': {'male': '', 'female': ''},
+        'Andrea': {'mostly_female': ''},
+        'Xyz': {'unknown': ''},
+    }
+
+    def get_gender(self, name):
+        if name not in self.names:
+            return 'unknown'
+        genders = list(self.names[name].keys())
+        return 'andy' if len(genders) > 1 else genders[0]
+
+
+class GenderResolverTestCase(TestCase):
+    """ Test class for the resolution of genders from first names """
+
+    resolver = GenderResolver.compile(FakeDetector())
+
+    def test_0_compile(self):
+        """ Tests that the compiled table gives the same genders as the detector """
+        detector = FakeDetector()
+        for name in ['Marie', 'jean', 'CAMILLE', 'andrea', 'Xyz', 'Nobody']:
+            self.assertEquals(self.resolver.gender(name), detector.get_gender(name.capitalize()))
+        self.assertNotIn('Xyz', self.resolver.table)
+
+    def test_1_overrides(self):
+        """ Tests that overrides take precedence, and that male overrides win over female ones """
+        overrides = gender_overrides({'m': ['Marie', 'Alex'], 'f': ['Jean', 'alex']})
+        self.assertEquals(overrides, {'marie': 'male', 'jean': 'female', 'alex': 'male'})
+        self.assertEquals(self.resolver.genders(['Marie', 'Jean', 'Alex', 'Camille'], overrides),
+                          ['male', 'female', 'male', 'andy'])
+
+    def test_2_people_genders_many(self):
+        """ Tests that people of many articles are sorted by the gender of their first name """
+        results = self.resolver.people_genders_many([['Marie Curie', 'Camille Claudel'], ['Jean Moulin', 'Zoe X']])
+        self.assertEquals(results[0]['female'], ['Marie Curie'])
+        self.assertEquals(results[0]['androgyne'], ['Camille Claudel'])
+        self.assertEquals(results[1]['male'], ['Jean Moulin'])
+        self.assertEquals(results[1]['unknown'], ['Zoe X'])
+        self.assertEquals(self.resolver.people_genders(['Marie Curie', 'Camille Claudel']), results[0])
+
+    def test_3_snapshot(self):
+        """ Tests that a saved snapshot loads the same table """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gender_lookup.json')
+            self.assertIsNone(GenderResolver.load(path))
+            self.resolver.save(path)
+            self.assertEquals(GenderResolver.load(path).table, self.resolver.table)
+
+            # A partially written snapshot is treated as a missing one
+            with open(path, 'w') as f:
+                f.write('{"version": ')
+            self.assertIsNone(GenderResolver.load(path))
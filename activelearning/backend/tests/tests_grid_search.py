@@ -0,0 +1,85 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from backend.ml import grid_search
+from backend.ml.batches import ArrayDataset
+from backend.ml.grid_search import QUOTE_DETECTION, Configuration, evaluate_configurations, evaluate_fold, unit_seed
+
+
+class FakeDataset(ArrayDataset):
+    """ Dataset with four noisy datapoints per article, whose first feature is close to their label """
+
+    def __init__(self, article_ids):
+        state = np.random.RandomState(0)
+        labels = [[0, 1, 0, 1] for _ in article_ids]
+        features = [[state.normal(size=3) + [label, 0, 0] for label in article_labels] for article_labels in labels]
+        self.set_articles(article_ids, features, labels)
+
+
+class GridSearchTestCase(SimpleTestCase):
+    """ Test class for the evaluation of configurations in parallel. It doesn't use the database, as the datasets of
+    the models are replaced with a fake dataset, so that the worker processes can be forked during the test. """
+
+    def setUp(self):
+        self.split_ids = np.arange(10, 22)
+        self.configurations = [Configuration(QUOTE_DETECTION, 'log', 'l2', 0.01),
+                               Configuration(QUOTE_DETECTION, 'hinge', 'l1', 0.1),
+                               Configuration(QUOTE_DETECTION, 'log', 'l1', 0.01)]
+        self.cv_folds = 3
+        self.max_iter = 3
+
+        def prepare_datasets(models, nlp, cue_verbs, exp_degree):
+            grid_search._datasets.clear()
+            grid_search._datasets[QUOTE_DETECTION] = (self.split_ids, FakeDataset(self.split_ids.tolist()))
+
+        patcher = mock.patch.object(grid_search, 'prepare_datasets', prepare_datasets)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(grid_search._datasets.clear)
+
+    def evaluate(self, jobs):
+        results = evaluate_configurations(self.configurations, None, [], 2, self.max_iter, self.cv_folds, jobs)
+        return [(configuration, [result.__dict__ for result in configuration_results])
+                for configuration, configuration_results in results.items()]
+
+    def test_0_same_results(self):
+        """ Tests that the results merged from many jobs are the same, in the same order, as with a single job """
+        serial = self.evaluate(1)
+        self.assertEquals([configuration for configuration, _ in serial], self.configurations)
+        for _, (train_results, test_results) in serial:
+            self.assertEquals(len(train_results['f1']), self.cv_folds)
+            self.assertEquals(len(test_results['f1']), self.cv_folds)
+        self.assertEquals(self.evaluate(4), serial)
+
+        # The folds are also the same as when they are evaluated one after the other in this process
+        grid_search.prepare_datasets([QUOTE_DETECTION], None, [], 2)
+        for configuration, (train_results, test_results) in serial:
+            for fold in range(self.cv_folds):
+                train_scores, test_scores = evaluate_fold((configuration, fold, self.cv_folds, self.max_iter))
+                self.assertEquals(train_scores['f1'], train_results['f1'][fold])
+                self.assertEquals(test_scores['f1'], test_results['f1'][fold])
+
+    def test_1_fold_split(self):
+        """ Tests that each fold is trained on the articles that aren't in its test set, and that the test sets of the
+        folds cover every article once """
+        grid_search.prepare_datasets([QUOTE_DETECTION], None, [], 2)
+        configuration = self.configurations[0]
+        test_ids = []
+        with mock.patch.object(grid_search, 'cross_validation_fold',
+                               lambda loss, penalty, train, test, *args: (train, test)):
+            for fold in range(self.cv_folds):
+                train, test = evaluate_fold((configuration, fold, self.cv_folds, self.max_iter))
+                self.assertEquals(sorted(train.tolist() + test.tolist()), self.split_ids.tolist())
+                self.assertEquals(len(test), len(self.split_ids) // self.cv_folds)
+                test_ids += test.tolist()
+        self.assertEquals(test_ids, self.split_ids.tolist())
+
+    def test_2_unit_seed(self):
+        """ Tests that each fold of each configuration has its own seed, which is always the same """
+        seeds = {unit_seed(configuration, fold) for configuration in self.configurations
+                 for fold in range(self.cv_folds)}
+        self.assertEquals(len(seeds), len(self.configurations) * self.cv_folds)
+        self.assertEquals(unit_seed(self.configurations[0], 1),
+                          unit_seed(Configuration(QUOTE_DETECTION, 'log', 'l2', 0.01), 1))
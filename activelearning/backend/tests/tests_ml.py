@@ -1,13 +1,18 @@
 import csv
 
+import numpy as np
 from django.test import TestCase
 
 from backend.db_management import add_article_to_db, add_user_label_to_db, \
     load_sentence_labels, load_unlabeled_sentences
 from backend.helpers import change_confidence
+from backend.ml.author_prediction_feature_extraction import attribution_feature_matrix, \
+    attribution_features_baseline_no_db
 from backend.ml.quote_detection import evaluate_quote_detection, train_quote_detection, predict_quotes
+from backend.ml.quote_detection_feature_extraction import feature_extraction, feature_matrix
 from backend.models import Article
 from backend.xml_parsing.helpers import load_nlp
+from backend.xml_parsing.xml_to_postgre import ParsedArticle
 
 """ The content and annotation of the first article. """
 TEST_1 = {
@@ -380,4 +385,48 @@ class QuoteDetectionTestCase(TestCase):
             print(f'\nConfidences for article 3: {article_3.confidence["confidence"]}\n'
                   f'Minimum Confidence: {conf}\n')
 
-        print('\nFinished Test 1\n\n\n')
\ No newline at end of file
+        print('\nFinished Test 1\n\n\n')
+
+class QuoteDetectionFeaturesTestCase(TestCase):
+    """ Test class for the feature extraction of quote detection """
+
+    def test_0_feature_matrix(self):
+        """ Tests that the features of all sentences computed at once are the same as when computed one by one. """
+        cue_verbs = ['affirmer', 'penser', 'dire', 'informer']
+        for test in [TEST_1, TEST_2, TEST_3]:
+            parsed = ParsedArticle(test['input_xml'], nlp)
+            in_quotes = parsed.sentence_in_quotes()
+            expected = np.array([feature_extraction(sentence, cue_verbs, sentence_in_quotes)
+                                 for sentence, sentence_in_quotes in zip(parsed.sentence_docs, in_quotes)])
+            features = feature_matrix(parsed.sentence_docs, cue_verbs, in_quotes)
+            self.assertEquals(features.shape, expected.shape)
+            self.assertTrue(np.array_equal(features, expected))
+
+    def test_1_feature_matrix_empty(self):
+        """ Tests that an article without sentences has no features. """
+        self.assertEquals(feature_matrix([], [], []).shape, (0, 13))
+
+
+class AuthorPredictionFeaturesTestCase(TestCase):
+    """ Test class for the feature extraction of author prediction """
+
+    def test_0_attribution_feature_matrix(self):
+        """ Tests that the features of all speakers computed at once are the same as when computed one by one. """
+        cue_verbs = ['affirmer', 'penser', 'dire', 'informer']
+        for test in [TEST_1, TEST_2, TEST_3]:
+            parsed = ParsedArticle(test['input_xml'], nlp)
+            mentions = parsed.mentions
+            for quotes in [[], [0], [1, 3], list(range(len(parsed.sentences)))]:
+                expected = np.array([
+                    attribution_features_baseline_no_db(parsed.sentences, parsed.in_quotes, parsed.sentence_docs,
+                                                        quotes, speaker, mentions[:i] + mentions[i + 1:], cue_verbs)
+                    for i, speaker in enumerate(mentions)
+                ])
+                features = attribution_feature_matrix(parsed.sentences, parsed.in_quotes, parsed.sentence_docs, quotes,
+                                                      mentions, cue_verbs)
+                self.assertEquals(features.shape, expected.shape)
+                self.assertTrue(np.array_equal(features, expected))
+
+    def test_1_attribution_feature_matrix_no_speakers(self):
+        """ Tests that an article without speakers has no features. """
+        self.assertEquals(attribution_feature_matrix([], [], [], [], [], []).shape, (0, 20))
@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from backend import resources
+
+
+class ResourcesTestCase(TestCase):
+    """ Test class for the resources registry """
+
+    def setUp(self):
+        self.calls = 0
+
+    def tearDown(self):
+        resources.unregister('test_counter')
+        resources.unregister('test_cue_verbs')
+
+    def loader(self):
+        self.calls += 1
+        return self.calls
+
+    def test_0_loaded_once(self):
+        """ Tests that a resource is only loaded the first time it is needed """
+        resources.register('test_counter', self.loader)
+        self.assertEquals(self.calls, 0)
+        self.assertEquals(resources.get('test_counter'), 1)
+        self.assertEquals(resources.get('test_counter'), 1)
+        self.assertEquals(self.calls, 1)
+        self.assertIn('test_counter', resources.report())
+
+    def test_1_reload(self):
+        """ Tests that reloading a resource calls its loader again """
+        resources.register('test_counter', self.loader)
+        resources.get('test_counter')
+        resources.reload('test_counter')
+        self.assertEquals(resources.get('test_counter'), 2)
+
+    def test_2_memory(self):
+        """ Tests that the memory used by a resource is only measured when it is asked for """
+        resources.register('test_counter', lambda: list(range(1000)))
+        resources.get('test_counter')
+        self.assertIsNone(resources._registry['test_counter'].memory)
+        resources.register('test_counter', lambda: list(range(1000)))
+        resources.get('test_counter', profile_memory=True)
+        self.assertGreater(resources._registry['test_counter'].memory, 0)
+
+    def test_3_reload_if_modified(self):
+        """ Tests that only resources whose file changed are reloaded """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('dire,affirmer')
+        try:
+            resources.register('test_cue_verbs', lambda: resources.load_cue_verbs(f.name), path=f.name)
+            self.assertEquals(resources.get('test_cue_verbs'), frozenset(['dire', 'affirmer']))
+            self.assertEquals(resources.reload_if_modified(), [])
+
+            with open(f.name, 'w') as f_new:
+                f_new.write('dire')
+            mtime = resources.file_mtime(f.name) + 1
+            os.utime(f.name, (mtime, mtime))
+            self.assertEquals(resources.reload_if_modified(), ['test_cue_verbs'])
+            self.assertEquals(resources.get('test_cue_verbs'), frozenset(['dire']))
+        finally:
+            os.remove(f.name)
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from backend.result_cache import LocalBackend, ResultCache
+
+
+class ResultCacheTestCase(TestCase):
+    """ Test class for the result cache of the API """
+
+    def test_0_key(self):
+        """ Tests that the key only depends on the content of the request """
+        cache = ResultCache(LocalBackend(10, 60))
+        overrides = {'jean': 'male', 'marc': 'male', 'marie': 'female'}
+        key = cache.key('text', overrides, 'v1')
+        self.assertEquals(key, cache.key('text', {'marie': 'female', 'marc': 'male', 'jean': 'male'}, 'v1'))
+        self.assertNotEqual(key, cache.key('other text', overrides, 'v1'))
+        self.assertNotEqual(key, cache.key('text', {'jean': 'female', 'marc': 'female', 'marie': 'male'}, 'v1'))
+        self.assertNotEqual(key, cache.key('text', overrides, 'v2'))
+
+    def test_1_hits_and_misses(self):
+        """ Tests that results are only computed once, and that hits and misses are counted """
+        cache = ResultCache(LocalBackend(10, 60))
+        compute = mock.Mock(return_value={'people': []})
+        self.assertEquals(cache.get_or_compute('a', compute), {'people': []})
+        self.assertEquals(cache.get_or_compute('a', compute), {'people': []})
+        self.assertEquals(compute.call_count, 1)
+        self.assertEquals(cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_2_lru_eviction(self):
+        """ Tests that the least recently used result is evicted when the cache is full """
+        cache = ResultCache(LocalBackend(2, 60))
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEquals(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEquals(cache.get('c'), 3)
+
+    def test_3_ttl(self):
+        """ Tests that results expire after the TTL """
+        cache = ResultCache(LocalBackend(10, 60))
+        with mock.patch('backend.result_cache.time.monotonic', return_value=0):
+            cache.set('a', 1)
+        with mock.patch('backend.result_cache.time.monotonic', return_value=59):
+            self.assertEquals(cache.get('a'), 1)
+        with mock.patch('backend.result_cache.time.monotonic', return_value=61):
+            self.assertIsNone(cache.get('a'))
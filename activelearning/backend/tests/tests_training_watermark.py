@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from backend.ml.training_watermark import load_watermark, save_watermark, trained_snapshots, model_version, \
+    set_trained, scored_articles, set_scored
+
+
+class TrainingWatermarkTestCase(TestCase):
+    """ Test class for the watermark of the articles the models were trained on """
+
+    def setUp(self):
+        self.parameters = {'loss': 'log', 'penalty': 'l2', 'alpha': 0.01, 'features': 'quote_detection-poly2ib'}
+        self.snapshots = {1: 'a', 2: 'b'}
+
+    def test_0_saved(self):
+        """ Tests that the snapshots of the trained articles are loaded as they were saved """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'watermark.json')
+            self.assertEquals(load_watermark(path), {})
+            watermark = {}
+            set_trained(watermark, 'quote_detection', self.parameters, self.snapshots, True)
+            save_watermark(watermark, path)
+            watermark = load_watermark(path)
+            self.assertEquals(trained_snapshots(watermark, 'quote_detection', self.parameters), self.snapshots)
+            self.assertEquals(model_version(watermark, 'quote_detection'), 1)
+
+    def test_1_parameters(self):
+        """ Tests that a model trained with other parameters or never trained has no snapshots """
+        watermark = {}
+        set_trained(watermark, 'quote_detection', self.parameters, self.snapshots, True)
+        other_parameters = dict(self.parameters, alpha=0.1)
+        self.assertIsNone(trained_snapshots(watermark, 'quote_detection', other_parameters))
+        self.assertIsNone(trained_snapshots(watermark, 'author_prediction', self.parameters))
+
+    def test_2_scored(self):
+        """ Tests that scored articles are only kept for the version of the model that scored them """
+        watermark = {}
+        set_trained(watermark, 'quote_detection', self.parameters, self.snapshots, True)
+        set_scored(watermark, model_version(watermark, 'quote_detection'), {3: 'c'}, 2.5)
+        set_trained(watermark, 'quote_detection', self.parameters, self.snapshots, False)
+        self.assertEquals(scored_articles(watermark, model_version(watermark, 'quote_detection')), ({3: 'c'}, 2.5))
+        set_trained(watermark, 'quote_detection', self.parameters, self.snapshots, True)
+        self.assertEquals(scored_articles(watermark, model_version(watermark, 'quote_detection')), ({}, 0))
@@ -1,5 +1,6 @@
 from django.test import TestCase
 
+from backend.extraction_pipeline import extract_people_quoted_baseline
 from backend.management.commands.addarticle import set_custom_boundaries
 from backend.xml_parsing.helpers import *
 from backend.xml_parsing.postgre_to_xml import *
@@ -221,19 +222,16 @@ class PostgreToXMLTestCase(TestCase):
             name='Example article',
             text=text,
             people={'people': ['John', 'Phil Neville', 'Gary']},
-            tokens={'tokens': tokens},
-            paragraphs={'paragraphs': [4]},
-            sentences={'sentences': [5, 14, 22, 33, 41]},
             labeled={
                 'labeled': [1, 1, 1, 1, 1],
                 'fully_labeled': 1,
             },
-            in_quotes={'in_quotes': []},
             confidence={
                 'confidence': [0, 0, 0, 0, 0],
                 'min_confidence': 0,
             },
             admin_article=False,
+            **Article.encode_arrays(tokens, [4], [5, 14, 22, 33, 41], []),
         )
         returned_text = database_to_xml(a, labels, authors)
         self.assertEquals(returned_text, xml_text)
@@ -272,19 +270,16 @@ class PostgreToXMLTestCase(TestCase):
             name='Example article',
             text=text,
             people={'people': ['John', 'Phil Neville', 'Gary']},
-            tokens={'tokens': tokens},
-            paragraphs={'paragraphs': [2, 4]},
-            sentences={'sentences': [5, 14, 22, 33, 41]},
             labeled={
                 'labeled': [1, 1, 1, 1, 1],
                 'fully_labeled': 1,
             },
-            in_quotes={'in_quotes': []},
             confidence={
                 'confidence': [0, 0, 0, 0, 0],
                 'min_confidence': 0,
             },
             admin_article=False,
+            **Article.encode_arrays(tokens, [2, 4], [5, 14, 22, 33, 41], []),
         )
         returned_text = database_to_xml(a, labels, authors)
         self.assertEquals(returned_text, xml_text)
@@ -375,3 +370,97 @@ class XMLToPostgreTestCase(TestCase):
         # Doesn't detect Steven. Hmmmmm
         self.assertEquals(parsed['people'], [(16, 18), (35, 36)])
         self.assertEquals(parsed['in_quotes'], in_quotes)
+
+    def test_parsed_article_1(self):
+        """ Tests that a single parse gives the sentence docs and the in_quotes values for each sentence. """
+        article_text = \
+            '<?xml version="1.0"?>\n' \
+            '<article>\n' \
+            '\t<titre>Example article</titre>\n' \
+            '\t<p>My friend Steven hates Mondays. He said "I\'m just like Garfield". Phil Neville told him he ' \
+            'loves them.</p>\n' \
+            '\t<p>That made him say "what a dumb idea". Gary told them he hates them too.</p>\n' \
+            '</article>'
+
+        parsed = ParsedArticle(article_text, self.nlp)
+        self.assertEquals(parsed.sentences, [5, 15, 23, 34, 42])
+        self.assertEquals(parsed.paragraphs, [2, 4])
+        self.assertEquals(parsed.sentence_starts(), [0, 6, 16, 24, 35])
+        self.assertEquals(len(parsed.sentence_docs), len(parsed.sentences))
+        for doc, sentence_in_quotes in zip(parsed.sentence_docs, parsed.sentence_in_quotes()):
+            self.assertEquals(len(doc), len(sentence_in_quotes))
+        self.assertEquals([doc.text for doc in parsed.sentence_docs],
+                          [doc.text for doc in extract_sentence_spans(article_text, self.nlp)])
+
+    def test_parse_articles_1(self):
+        """ Tests that parsing articles in a batch gives the same results as parsing them one by one. """
+        article_texts = [
+            '<?xml version="1.0"?>\n'
+            '<article>\n'
+            '\t<titre>Example article</titre>\n'
+            '\t<p>My friend Steven hates Mondays. He said "I\'m just like Garfield".</p>\n'
+            '\t<p>That made him say "what a dumb idea". Gary told them he hates them too.</p>\n'
+            '</article>',
+            '<?xml version="1.0"?>\n'
+            '<article>\n'
+            '\t<titre>Second article</titre>\n'
+            '\t<p>Phil Neville told him he loves them.</p>\n'
+            '</article>',
+        ]
+        for parsed, article_text in zip(parse_articles(article_texts, self.nlp, batch_size=2), article_texts):
+            expected = ParsedArticle(article_text, self.nlp)
+            self.assertEquals(parsed.name, expected.name)
+            self.assertEquals(parsed.tokens, expected.tokens)
+            self.assertEquals(parsed.sentences, expected.sentences)
+            self.assertEquals(parsed.paragraphs, expected.paragraphs)
+            self.assertEquals(parsed.in_quotes, expected.in_quotes)
+            self.assertEquals(parsed.mentions, expected.mentions)
+
+    def test_quote_candidates_1(self):
+        """ Tests that paragraphs are candidates if and only if they contain tokens in between quotes. """
+        paragraphs = [
+            'My friend Steven hates Mondays.',
+            'He said "I\'m just like Garfield".',
+            'He said "I\'m',
+            'just like Garfield".',
+            'Nothing to see here.',
+        ]
+        docs = [self.nlp.make_doc(p) for p in paragraphs]
+        self.assertEquals(quote_candidates(docs), [False, True, True, True, False])
+
+    def test_parse_articles_two_tier_1(self):
+        """ Tests that parsing articles in two tiers gives the same tokens, quotes and people as a complete parse. """
+        article_texts = [
+            '<?xml version="1.0"?>\n'
+            '<article>\n'
+            '\t<titre>Example article</titre>\n'
+            '\t<p>My friend Steven Gerrard hates Mondays. Gary Neville told them he hates them too.</p>\n'
+            '\t<p>Gerrard said "I\'m just like Garfield". That made him say "what a dumb idea".</p>\n'
+            '\t<p>Phil Neville told him he loves them.</p>\n'
+            '</article>',
+        ]
+        for parsed, article_text in zip(parse_articles(article_texts, self.nlp, two_tier=True), article_texts):
+            expected = ParsedArticle(article_text, self.nlp)
+            self.assertEquals(parsed.tokens, expected.tokens)
+            self.assertEquals(parsed.in_quotes, expected.in_quotes)
+            self.assertEquals(parsed.mentions, expected.mentions)
+            self.assertEquals(parsed.people, expected.people)
+            # The sentences containing quotes are split in the same way.
+            self.assertEquals([doc.text for doc in parsed.sentence_docs if '"' in doc.text],
+                              [doc.text for doc in expected.sentence_docs if '"' in doc.text])
+
+    def test_extract_people_quoted_two_tier_1(self):
+        """ Tests that the lazy baseline finds the same people when articles are parsed in two tiers. """
+        article_text = (
+            '<?xml version="1.0"?>\n'
+            '<article>\n'
+            '\t<titre>Example article</titre>\n'
+            '\t<p>Le ministre Bruno Le Maire était à Paris mardi.</p>\n'
+            '\t<p>"Nous allons réduire les impôts des ménages", a déclaré Le Maire devant les députés.</p>\n'
+            '\t<p>Selon Marie Dupont, "cette réforme ne changera rien pour les retraités".</p>\n'
+            '\t<p>La réforme sera votée en juin.</p>\n'
+            '</article>'
+        )
+        cue_verbs = ['déclarer', 'dire', 'affirmer']
+        self.assertEquals(sorted(extract_people_quoted_baseline(article_text, self.nlp, cue_verbs, two_tier=True)),
+                          sorted(extract_people_quoted_baseline(article_text, self.nlp, cue_verbs, two_tier=False)))
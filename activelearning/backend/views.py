@@ -1,5 +1,5 @@
 from collections import defaultdict
-import csv
+from functools import wraps
 import json
 import logging
 import sys
@@ -7,23 +7,28 @@ import traceback
 import uuid
 from xml.sax.saxutils import escape
 
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import JsonResponse, QueryDict
+from django.utils.cache import add_never_cache_headers, patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-
-import gender_guesser.detector as gender_detector
+from django.views.decorators.http import condition
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_api_key.permissions import HasAPIKey
 
-from backend.db_management import add_user_label_to_db, request_labelling_task
-from backend.extraction_pipeline import extract_people_quoted
+from backend.db_management import add_user_labels_to_db, request_labelling_tasks, PREFETCH_TASKS
+from backend.extraction_pipeline import extract_people_quoted, extract_people_quoted_many
 from backend.frontend_parsing.frontend_to_postgre import clean_user_labels
-from backend.frontend_parsing.postgre_to_frontend import load_paragraph_above, load_paragraph_below
+from backend.gender import gender_overrides, load_gender_resolver, path_gender_snapshot
+from backend.frontend_parsing.postgre_to_frontend import article_content, load_paragraph_above, load_paragraph_below, \
+    load_context as load_context_window
 from backend.helpers import change_confidence
-from backend.xml_parsing.helpers import load_nlp
+from backend.result_cache import create_result_cache
+from backend import resources
+from backend.xml_parsing.xml_to_postgre import PARAGRAPH_BATCH_SIZE
 from .models import Article
 
 
@@ -36,6 +41,9 @@ COOKIE_LIFE_SPAN = 1 * 60 * 60
 # The key needed to become an admin
 ADMIN_SECRET_KEY = 'i_want_to_be_admin'
 
+# The number of seconds during which browsers and proxies can reuse the context of a task
+CONTEXT_MAX_AGE = getattr(settings, 'CONTEXT_MAX_AGE', 24 * 60 * 60)
+
 
 def load_content(request):
     """
@@ -51,21 +59,85 @@ def load_content(request):
 
     If the task is 'None', then the article ID is -1 and both the sentence id and data are empty lists.
 
+    The Json also contains 'next', the list of the next tasks of the user in the same format, which are reserved for the
+    user so that they can be shown without waiting for the next request.
+
     :param request: HTTP GET Request
-        The request with the
+        The request with the session of the user.
     :return: JsonResponse
-        A Json file containing the 'article_id', 'sentence_id', 'data', 'task' and 'admin'.
+        A Json file containing the 'article_id', 'sentence_id', 'data', 'task', 'admin' and 'next'.
     """
     user_id, quote_count, admin_tagger = session_load(request)
-    labelling_task = request_labelling_task(user_id)
-    if labelling_task is not None:
+    labelling_tasks = request_labelling_tasks(user_id, 1 + PREFETCH_TASKS)
+    if len(labelling_tasks) > 0:
+        labelling_task = labelling_tasks[0]
         labelling_task['admin'] = admin_tagger
         labelling_task['quote_count'] = quote_count
+        labelling_task['next'] = labelling_tasks[1:]
         return JsonResponse(labelling_task)
     else:
         return JsonResponse({'article_id': -1, 'sentence_id': [], 'data': [], 'task': 'None', 'admin': admin_tagger})
 
 
+def error_response(reason):
+    """
+    :param reason: string
+        The reason why the request failed.
+    :return: JsonResponse
+        A Json file containing 'Success' false and the reason, which browsers and proxies must not store, so that it
+        isn't reused once the request succeeds.
+    """
+    response = JsonResponse({'Success': False, 'reason': reason})
+    add_never_cache_headers(response)
+    return response
+
+
+def cache_successful_responses(max_age):
+    """
+    Decorator that lets browsers and proxies reuse the responses of a view for some time, except the error responses,
+    which are marked as never cached by error_response.
+
+    :param max_age: int
+        The number of seconds during which the responses can be reused.
+    :return: function
+        The decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.has_header('Cache-Control'):
+                # Error responses can't be revalidated either.
+                if response.has_header('ETag'):
+                    del response['ETag']
+            else:
+                patch_cache_control(response, public=True, max_age=max_age)
+            return response
+        return cached_view
+    return decorator
+
+
+def context_etag(request):
+    """
+    Identifies the content of the article whose context is requested, which never changes once it is added. Browsers
+    and proxies can reuse the responses as long as it stays the same.
+
+    :param request: HTTP GET Request
+        The user request, containing the key 'article_id'.
+    :return: string
+        The ETag of the content of the article, or None if it doesn't exist.
+    """
+    try:
+        content = article_content(int(request.GET['article_id']))
+    except (KeyError, ValueError):
+        return None
+    if content is None:
+        return None
+    return content.etag
+
+
+@cache_successful_responses(CONTEXT_MAX_AGE)
+@condition(etag_func=context_etag)
 def load_above(request):
     """
     Loads the tokens of the paragraph above a given sentence, or the whole paragraph if the sentence is in a paragraph
@@ -94,10 +166,12 @@ def load_above(request):
             data['Success'] = True
             return JsonResponse(data)
         except KeyError:
-            return JsonResponse({'Success': False, 'reason': 'KeyError'})
-    return JsonResponse({'Success': False, 'reason': 'not GET'})
+            return error_response('KeyError')
+    return error_response('not GET')
 
 
+@cache_successful_responses(CONTEXT_MAX_AGE)
+@condition(etag_func=context_etag)
 def load_below(request):
     """
     Loads the tokens of the paragraph below a given sentence, or the whole paragraph if the sentence is in a paragraph
@@ -126,8 +200,45 @@ def load_below(request):
             data['Success'] = True
             return JsonResponse(data)
         except KeyError:
-            return JsonResponse({'Success': False, 'reason': 'KeyError'})
-    return JsonResponse({'Success': False, 'reason': 'not GET'})
+            return error_response('KeyError')
+    return error_response('not GET')
+
+
+@cache_successful_responses(CONTEXT_MAX_AGE)
+@condition(etag_func=context_etag)
+def load_context(request):
+    """
+    Loads the tokens of several paragraphs above and below some sentences at once. Forms a Json file that always
+    contains the key 'Success'.
+
+    If the value of 'Success' is true, then the Json also contains 'above' and 'below', which contain the tokens above
+    and below the sentences, in the same format as the responses of load_above and load_below.
+
+    If the value of 'Success' is false, then the Json also contains the 'reason' key, which has as a value either
+    'KeyError' (if one of the required parameters of the GET request wasn't there), 'Invalid Article ID' or 'not GET'
+    (if the request wasn't a GET request).
+
+    :param request: HTTP GET Request
+        The user request, with the keys 'article_id', 'first_sentence', 'last_sentence' and optionally 'paragraphs',
+        the number of paragraphs to load above and below the sentences (1 by default).
+    :return: JsonResponse
+        A Json file containing the tokens above and below the sentences.
+    """
+    if request.method == 'GET':
+        try:
+            data = dict(request.GET)
+            article_id = int(data['article_id'][0])
+            first_sentence = int(data['first_sentence'][0])
+            last_sentence = int(data['last_sentence'][0])
+            n_paragraphs = int(data.get('paragraphs', [1])[0])
+            data = load_context_window(article_id, first_sentence, last_sentence, n_paragraphs)
+            if data is None:
+                return error_response('Invalid Article ID')
+            data['Success'] = True
+            return JsonResponse(data)
+        except KeyError:
+            return error_response('KeyError')
+    return error_response('not GET')
 
 
 @csrf_exempt
@@ -165,14 +276,14 @@ def submit_tags(request):
             task = data['task']
 
             try:
-                article = Article.objects.get(id=article_id)
+                article = Article.objects.defer(*Article.PAYLOAD_FIELDS).get(id=article_id)
             except ObjectDoesNotExist:
                 return JsonResponse({'success': False, 'reason': 'Invalid Article ID'})
 
             if labels == []:
                 # The user didn't know how to annotate the sentence.
-                for s in sent_id:
-                    add_user_label_to_db(user_id, article_id, s, [], [], False)
+                add_user_labels_to_db(user_id, article_id, [{'index': s, 'labels': [], 'authors': []} for s in sent_id],
+                                      False)
             else:
                 # The user knew how to annotate the sentence.
                 if task == 'paragraph' and sum(labels) > 0:
@@ -182,15 +293,11 @@ def submit_tags(request):
                     sentence_confidences[first_sent:last_sent + 1] = (last_sent - first_sent + 1) * [0]
                     change_confidence(article_id, sentence_confidences, article.confidence['predictions'])
                 else:
-                    sentence_ends = article.sentences['sentences']
+                    sentence_ends = article.sentences_array().tolist()
                     clean_labels = clean_user_labels(sentence_ends, sent_id, first_sent, last_sent, labels, authors)
                     logger.warn(clean_labels)
-                    found_quote = False
-                    for sentence in clean_labels:
-                        if sum(sentence['labels']) > 0:
-                            found_quote = True
-                        add_user_label_to_db(user_id, article_id, sentence['index'], sentence['labels'],
-                                             sentence['authors'], admin_tagger)
+                    found_quote = any(sum(sentence['labels']) > 0 for sentence in clean_labels)
+                    add_user_labels_to_db(user_id, article_id, clean_labels, admin_tagger)
                     if found_quote:
                         request.session['quote_count'] += 1
             return JsonResponse({'success': True})
@@ -269,21 +376,82 @@ def become_admin(request):
     return JsonResponse({'Success': False})
 
 
-nlp = load_nlp()
-detector = gender_detector.Detector()
+resources.register('gender_resolver', load_gender_resolver, path=path_gender_snapshot)
+# Load everything the API needs once per worker, instead of on the first request. The trained models are only written
+# by the train command, and aren't needed by the API, so they stay loaded lazily.
+resources.preload(['nlp', 'cue_verbs', 'gender_resolver'])
 
-class GetCounts(APIView):
-    def post(self, request):
-        with open('data/cue_verbs.csv', 'r') as f:
-            reader = csv.reader(f)
-            cue_verbs = set(list(reader)[0])
 
-        template = """<?xml version='1.0' encoding='utf-8'?>
+""" Template used to turn a raw text sent to the API into an article in XML format. """
+ARTICLE_TEMPLATE = """<?xml version='1.0' encoding='utf-8'?>
             <article>
                <titre></titre>
                <p>{}</p>
             </article>"""
 
+
+""" Cache for the results of GetCounts and GetCountsBatch. """
+result_cache = create_result_cache()
+
+
+""" The maximum number of texts that can be sent in a single batch request. """
+MAX_BATCH_TEXTS = 200
+
+
+def text_to_xml(t):
+    """
+    Cleans a raw text sent to the API, and wraps it into an article in XML format.
+
+    :param t: string
+        The raw text.
+    :return: string
+        The article in XML format.
+    """
+    clean_t = t.replace("\n", " ")
+    clean_t = clean_t.replace("\\n", " ")
+    clean_t = clean_t.replace("\\\n", " ")
+    clean_t = clean_t.replace("\t", " ")
+    clean_t = clean_t.replace("\\t", " ")
+    clean_t = clean_t.replace("\\\t", " ")
+    return ARTICLE_TEMPLATE.format(escape(clean_t))
+
+
+def model_version():
+    """
+    Identifies the models and resources used to find the people cited in a text, so that cached results are not used
+    after one of them changes.
+
+    :return: string
+        The version of the models.
+    """
+    nlp = resources.get('nlp')
+    return f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}:{resources.fingerprint('cue_verbs')}:" \
+           f"{resources.fingerprint('gender_resolver')}:baseline"
+
+
+def extra_names(data):
+    """
+    Loads the optional gender dictionary of a request, which overrides the gender of some first names.
+
+    :param data: dict
+        The request data.
+    :return: dict
+        The lowercase first names whose gender is given, mapped to either 'male' or 'female'.
+    """
+    if "gender_dict" in data:
+        gender_dict = data["gender_dict"]
+        if "m" in gender_dict and "f" in gender_dict:
+            return gender_overrides(gender_dict)
+    return {}
+
+
+class GetCounts(APIView):
+    def post(self, request):
+        # Uses the new version of the resources whose files changed, for example after the models were trained.
+        resources.reload_if_modified()
+        nlp = resources.get('nlp')
+        cue_verbs = resources.get('cue_verbs')
+
         # Clean article text
         if "text" not in request.data:
             # Check if data was passed through the form
@@ -296,48 +464,68 @@ class GetCounts(APIView):
             if type("hello") != str:
                 raise ValueError(f'No text after text key. Write <"text": "example text">')
 
-        clean_t = t.replace("\n", " ")
-        clean_t = clean_t.replace("\\n", " ")
-        clean_t = clean_t.replace("\\\n", " ")
-        clean_t = clean_t.replace("\t", " ")
-        clean_t = clean_t.replace("\\t", " ")
-        clean_t = clean_t.replace("\\\t", " ")
-        xml_text = template.format(escape(clean_t))
-
-        # Get default genders
-        people = extract_people_quoted(xml_text, nlp, cue_verbs, lazy_baseline=True)
-        first_names = [p.split(" ")[0] for p in people]
-        
-        people_genders = {
-            'female': [],
-            'mostly_female': [],
-            'mostly_male': [],
-            'male': [],
-            'androgyne': [],
-            'unknown': [],
-        }
-
-        extra_names_m = []
-        extra_names_f = []
+        xml_text = text_to_xml(t)
 
         # Check for optional gender dictionary
-        if "gender_dict" in request.data:
-            gender_dict = request.data["gender_dict"]
-            if "m" in gender_dict and "f" in gender_dict:
-                # Lowercase the strings
-                extra_names_m = [name.lower() for name in gender_dict["m"]]
-                extra_names_f = [name.lower() for name in gender_dict["f"]]
-
-        for n, p in zip(first_names, people):
-            if n.lower() in extra_names_m:
-                people_genders['male'].append(p)
-            elif n.lower() in extra_names_f:
-                people_genders['female'].append(p)
-            else:
-                g = detector.get_gender(n.capitalize())
-                if g == 'andy':
-                    people_genders['androgyne'].append(p)
-                else:
-                    people_genders[g].append(p)
+        overrides = extra_names(request.data)
+
+        key = result_cache.key(xml_text, overrides, model_version())
+        result = result_cache.get(key)
+        if result is None:
+            # Get default genders
+            people = extract_people_quoted(xml_text, nlp, cue_verbs, lazy_baseline=True,
+                                           two_tier=settings.TWO_TIER_NLP)
+            result = {"people": resources.get('gender_resolver').people_genders(people, overrides)}
+            result_cache.set(key, result)
+        logger.debug(f'Result cache: {result_cache.stats()}')
+
+        return Response(result)
 
-        return Response({"people": people_genders})
+
+class GetCountsBatch(APIView):
+    def post(self, request):
+        """
+        Same as GetCounts, but for a list of texts. The request data must contain the key 'texts' (a list of strings),
+        and can contain the keys 'gender_dict' (applied to all texts) and 'batch_size' (the number of paragraphs the
+        language model processes at once).
+
+        The response contains the key 'results', a list with for each text a dict with the key 'people', in the same
+        format as the response of GetCounts.
+        """
+        resources.reload_if_modified()
+        nlp = resources.get('nlp')
+        cue_verbs = resources.get('cue_verbs')
+
+        texts = request.data.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return Response({'reason': 'key "texts" must be a list of strings'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(texts) > MAX_BATCH_TEXTS:
+            return Response({'reason': f'at most {MAX_BATCH_TEXTS} texts can be sent at once'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        batch_size = request.data.get("batch_size", PARAGRAPH_BATCH_SIZE)
+        if isinstance(batch_size, bool) or not isinstance(batch_size, int) or batch_size < 1:
+            return Response({'reason': 'key "batch_size" must be a positive integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        xml_texts = [text_to_xml(t) for t in texts]
+
+        # Check for optional gender dictionary
+        overrides = extra_names(request.data)
+
+        version = model_version()
+        keys = [result_cache.key(xml_text, overrides, version) for xml_text in xml_texts]
+        results = [result_cache.get(key) for key in keys]
+
+        # Only the texts that aren't in the cache are processed by the language model.
+        missing = [i for i, result in enumerate(results) if result is None]
+        people_per_text = extract_people_quoted_many([xml_texts[i] for i in missing], nlp, cue_verbs,
+                                                     lazy_baseline=True, batch_size=batch_size,
+                                                     two_tier=settings.TWO_TIER_NLP)
+        genders_per_text = resources.get('gender_resolver').people_genders_many(people_per_text, overrides)
+        for i, genders in zip(missing, genders_per_text):
+            results[i] = {"people": genders}
+            result_cache.set(keys[i], results[i])
+        logger.debug(f'Result cache: {result_cache.stats()}')
+
+        return Response({"results": results})
@@ -71,11 +71,12 @@ def database_to_xml(article, labels, authors):
     text = '<?xml version="1.0"?>\n<article>\n'
     if article.name != 'No article title':
         text += f'\t<titre>{article.name}</titre>\n'
-    tokens = add_tags_to_tokens(article.tokens['tokens'], labels, authors)
+    tokens = add_tags_to_tokens(article.token_list(), labels, authors)
+    sentence_ends = article.sentences_array().tolist()
     first_token_of_paragraph = 0
-    for p_end in article.paragraphs['paragraphs']:
+    for p_end in article.paragraphs_array().tolist():
         last_sentence_of_paragraph = p_end
-        last_token_of_paragraph = article.sentences['sentences'][last_sentence_of_paragraph]
+        last_token_of_paragraph = sentence_ends[last_sentence_of_paragraph]
         text += '\t<p>' + ''.join(tokens[first_token_of_paragraph:last_token_of_paragraph+1]) + '</p>\n'
         first_token_of_paragraph = last_token_of_paragraph + 1
 
@@ -5,6 +5,10 @@ from backend.xml_parsing.named_entity_linking import extract_person_mentions
 """ File containing all methods to parse XML files into representations that can be stored in the database. """
 
 
+""" The number of paragraphs the language model processes at once when parsing many articles. """
+PARAGRAPH_BATCH_SIZE = 64
+
+
 """ Quote characters that need to be unified to a single quote character. """
 QUOTES = ["«", "»", "“", "”", "„", "‹", "›", "‟", "〝", "〞"]
 
@@ -79,6 +83,213 @@ def extract_people(doc, start_index):
     return people
 
 
+def parse_paragraphs(article_text, nlp, root=None):
+    """
+    Processes each paragraph of an article with the language model.
+
+    :param article_text: string.
+        The article in XML format stored as a string
+    :param nlp: spaCy.Language
+        The language model used to process the paragraphs
+    :param root: ET.Element.
+        If defined, the root element of the already parsed XML article.
+    :return: list(spaCy.Doc).
+        The processed paragraphs.
+    """
+    if root is None:
+        root = ET.fromstring(article_text)
+    return [nlp(p) for p in extract_paragraphs(root)]
+
+
+class ParsedArticle:
+    """
+    Representation of an article produced by a single pass of the language model over its paragraphs. Holds everything
+    that is needed both to store the article in the database and to run the extraction pipeline on it.
+    """
+
+    def __init__(self, article_text, nlp, paragraph_docs=None):
+        """
+        Parses an article stored as an XML file.
+
+        :param article_text: string.
+            The article in XML format stored as a string
+        :param nlp: spaCy.Language
+            The language model used to tokenize the text
+        :param paragraph_docs: list(spaCy.Doc)
+            If defined, the paragraphs of the article already processed by the language model, which is then not run
+            again.
+        """
+        root = ET.fromstring(article_text)
+        # Tries to extract the article title
+        title_elements = list(root.findall('titre'))
+        if len(title_elements) > 0:
+            self.name = get_element_text(title_elements[0])
+        else:
+            self.name = 'No article title'
+
+        # Extracts the article as a list of paragraphs, processed only once by the language model.
+        if paragraph_docs is None:
+            paragraphs = parse_paragraphs(article_text, nlp, root=root)
+        else:
+            paragraphs = paragraph_docs
+
+        # The full text as a list of tokens
+        self.tokens = []
+        # A list of indices of sentences at which paragraphs end
+        self.paragraphs = []
+        # A list of indices of tokens at which sentences end
+        self.sentences = []
+        # For each token, 1 if it's in between quotes, 0 if it's not
+        self.in_quotes = []
+        # A spaCy.Doc for each sentence in the article
+        self.sentence_docs = []
+
+        in_quote = 0
+        # The token index at which the previous sentence ended
+        prev_sent_index = -1
+        # The sentence index at which the previous paragraph ended
+        prev_par_index = -1
+        for p in paragraphs:
+            for s in p.sents:
+                for token in s:
+                    self.in_quotes.append(in_quote)
+                    if '"' in token.text and in_quote == 0:
+                        in_quote = 1
+                    elif '"' in token.text:
+                        in_quote = 0
+                        self.in_quotes[-1] = 0
+                    self.tokens.append(token.text_with_ws)
+                # The sentence docs are copied before named entities are corrected, as they always have been.
+                self.sentence_docs.append(s.as_doc())
+                prev_sent_index += len(s)
+                self.sentences.append(prev_sent_index)
+                prev_par_index += 1
+            self.paragraphs.append(prev_par_index)
+
+        self.people, self.mentions = extract_person_mentions(paragraphs)
+
+    def sentence_starts(self):
+        """
+        Computes the index of the first token of each sentence in the article.
+
+        :return: list(int).
+            The index of the first token of each sentence.
+        """
+        return [0] + [end + 1 for end in self.sentences][:-1]
+
+    def sentence_in_quotes(self):
+        """
+        Splits the in_quotes values of the article into a list for each sentence.
+
+        :return: list(list(int)).
+            For each sentence, whether each of its tokens is in between quotes or not.
+        """
+        return [self.in_quotes[start:end + 1] for start, end in zip(self.sentence_starts(), self.sentences)]
+
+
+def quote_candidates(paragraph_docs):
+    """
+    Finds the paragraphs of an article that contain at least one token in between quotes, using only their tokens. The
+    tokens are considered in between quotes exactly as in ParsedArticle, so that quotes that span many paragraphs are
+    taken into account.
+
+    :param paragraph_docs: list(spaCy.Doc).
+        The paragraphs of the article, which only need to be tokenized.
+    :return: list(boolean).
+        For each paragraph, whether it contains a token in between quotes.
+    """
+    candidates = []
+    in_quote = 0
+    for doc in paragraph_docs:
+        candidate = False
+        for token in doc:
+            if '"' in token.text:
+                in_quote = 1 - in_quote
+            elif in_quote == 1:
+                candidate = True
+        candidates.append(candidate)
+    return candidates
+
+
+def parse_paragraphs_two_tier(article_paragraphs, nlp, batch_size=PARAGRAPH_BATCH_SIZE):
+    """
+    Processes the paragraphs of many articles in two tiers. All paragraphs are first only tokenized. Only the
+    paragraphs that contain tokens in between quotes are then processed by the whole language model. The other
+    paragraphs are only processed by the named entity recognizer, which is needed to find all the people mentioned in
+    the article, and are considered to be a single sentence.
+
+    Sentences without tokens in between quotes are never predicted to contain a quote by the lazy baseline, so it
+    finds the same people as when all paragraphs are processed by the whole language model.
+
+    :param article_paragraphs: list(list(string)).
+        For each article, the text of its paragraphs.
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text
+    :param batch_size: int.
+        The number of paragraphs the language model processes at once.
+    :return: list(list(spaCy.Doc)).
+        For each article, its processed paragraphs.
+    """
+    article_docs = [[nlp.make_doc(p) for p in paragraphs] for paragraphs in article_paragraphs]
+    full_docs = []
+    ner_docs = []
+    for docs in article_docs:
+        for doc, candidate in zip(docs, quote_candidates(docs)):
+            # Paragraphs with less than two tokens can't be marked as a single sentence without the parser.
+            if candidate or len(doc) < 2:
+                full_docs.append(doc)
+            else:
+                ner_docs.append(doc)
+
+    # The components set their annotations on the docs, which are modified in place.
+    for name, component in nlp.pipeline:
+        if hasattr(component, 'pipe'):
+            for _ in component.pipe(full_docs, batch_size=batch_size):
+                pass
+        else:
+            for doc in full_docs:
+                component(doc)
+    for _ in nlp.get_pipe('ner').pipe(ner_docs, batch_size=batch_size):
+        pass
+    for doc in ner_docs:
+        doc[0].is_sent_start = True
+        for token in doc[1:]:
+            token.is_sent_start = False
+
+    return article_docs
+
+
+def parse_articles(article_texts, nlp, batch_size=PARAGRAPH_BATCH_SIZE, two_tier=False):
+    """
+    Parses many articles stored as XML files at once. The paragraphs of all articles are streamed through the language
+    model in batches, instead of being processed one by one.
+
+    :param article_texts: list(string).
+        The articles in XML format stored as strings
+    :param nlp: spaCy.Language
+        The language model used to tokenize the text
+    :param batch_size: int.
+        The number of paragraphs the language model processes at once.
+    :param two_tier: boolean.
+        If only the paragraphs that contain quotes should be processed by the whole language model (see
+        parse_paragraphs_two_tier). The other paragraphs are then not split into sentences.
+    :return: list(ParsedArticle).
+        The parsed articles, in the same order as the texts.
+    """
+    article_paragraphs = [extract_paragraphs(ET.fromstring(text)) for text in article_texts]
+    if two_tier:
+        docs = iter([doc for docs in parse_paragraphs_two_tier(article_paragraphs, nlp, batch_size) for doc in docs])
+    else:
+        all_paragraphs = [p for paragraphs in article_paragraphs for p in paragraphs]
+        docs = nlp.pipe(all_paragraphs, batch_size=batch_size)
+
+    parsed_articles = []
+    for text, paragraphs in zip(article_texts, article_paragraphs):
+        paragraph_docs = [next(docs) for _ in paragraphs]
+        parsed_articles.append(ParsedArticle(text, nlp, paragraph_docs=paragraph_docs))
+    return parsed_articles
+
+
 def process_article(article_text, nlp):
     """
     Processes an article stored as an XML file, and returns all the information necessary
@@ -95,57 +306,15 @@ def process_article(article_text, nlp):
         'people': list(tuple). The first and last token of all Person Named Entities in the article.
         'in_quotes': list(int). For each token, 1 if it's in between quotes, 0 if it's note.
     """
-    root = ET.fromstring(article_text)
-    # Tries to extract the article title
-    title_elements = list(root.findall('titre'))
-    if len(title_elements) > 0:
-        article_name = get_element_text(title_elements[0])
-    else:
-        article_name = 'No article title'
-
-    # Extracts the article as a list of paragraphs
-    paragraphs = extract_paragraphs(root)
-    paragraphs = [nlp(p) for p in paragraphs]
-
-    # The full text as a list of tokens
-    article_tokens = []
-    # A list of indices of sentences at which paragraphs end
-    paragraph_indices = []
-    # A list of indices of tokens at which sentences end
-    sentence_indices = []
-    # A list of all quotation mark indices in the article
-    in_quote = 0
-    in_quotes = []
-
-    # The token index at which the previous sentence ended
-    prev_sent_index = -1
-    # The sentence index at which the previous paragraph ended
-    prev_par_index = -1
-    for p in paragraphs:
-        for s in p.sents:
-            for token in s:
-                in_quotes.append(in_quote)
-                if '"' in token.text and in_quote == 0:
-                    in_quote = 1
-                elif '"' in token.text:
-                    in_quote = 0
-                    in_quotes[-1] = 0
-                article_tokens.append(token.text_with_ws)
-            prev_sent_index += len(s)
-            sentence_indices.append(prev_sent_index)
-            prev_par_index += 1
-        paragraph_indices.append(prev_par_index)
-
-    people, mentions_found = extract_person_mentions(paragraphs)
-
+    parsed = ParsedArticle(article_text, nlp)
     return {
-        'name': article_name,
-        'tokens': article_tokens,
-        'p': paragraph_indices,
-        's': sentence_indices,
-        'people': people,
-        'mentions': mentions_found,
-        'in_quotes': in_quotes,
+        'name': parsed.name,
+        'tokens': parsed.tokens,
+        'p': parsed.paragraphs,
+        's': parsed.sentences,
+        'people': parsed.people,
+        'mentions': parsed.mentions,
+        'in_quotes': parsed.in_quotes,
     }
 
 
@@ -160,8 +329,4 @@ def extract_sentence_spans(article_text, nlp):
     :return: list(spaCy.Doc)
         A Doc object for each sentence in the article.
     """
-    root = ET.fromstring(article_text)
-    # Extracts the article as a list of paragraphs
-    paragraphs = [nlp(p) for p in extract_paragraphs(root)]
-    sentences = [sent.as_doc() for p in paragraphs for sent in p.sents]
-    return sentences
+    return ParsedArticle(article_text, nlp).sentence_docs